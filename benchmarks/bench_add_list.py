@@ -0,0 +1,57 @@
+"""
+Measures add-list throughput (URLs/sec) against a local fake aria2c server.
+
+Compares one `aria2.addUri` round trip per URL with batched
+`system.multicall` requests.
+
+Usage:
+    python benchmarks/bench_add_list.py [URL_COUNT]
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tests.fake_aria2 import FakeAria2Server  # noqa: E402
+
+from pydownloader import bulk  # noqa: E402
+
+
+def _client(server):
+    import aria2p
+
+    return aria2p.Client(host="http://127.0.0.1", port=server.port, secret="secret")
+
+
+def _urls(count):
+    return ((i, f"http://example.com/file/{i}") for i in range(1, count + 1))
+
+
+def _rate(label, count, func):
+    server = FakeAria2Server(secret="secret").start()
+    try:
+        started = time.perf_counter()
+        func(_client(server), _urls(count))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.stop()
+    print(f"{label:<28} {count / elapsed:10.0f} URLs/sec")
+
+
+def main(count: int = 20000):
+    def serial(client, urls):
+        for _, url in urls:
+            client.add_uri([url])
+
+    _rate("serial addUri", min(count, 2000), serial)
+    for batch_size, in_flight in ((100, 1), (500, 4), (1000, 8)):
+        _rate(
+            f"multicall {batch_size} x {in_flight} in flight",
+            count,
+            lambda client, urls: bulk.add_urls(client, urls, batch_size=batch_size, max_in_flight=in_flight),
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
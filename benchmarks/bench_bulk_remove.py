@@ -0,0 +1,57 @@
+"""
+Measures how long `remove --status error` takes against a local fake aria2c
+server holding many failed downloads.
+
+Compares one `aria2.removeDownloadResult` round trip per download with a
+field-projected selection followed by batched `system.multicall` requests.
+
+Usage:
+    python benchmarks/bench_bulk_remove.py [DOWNLOAD_COUNT]
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tests.fake_aria2 import FakeAria2Server  # noqa: E402
+
+from pydownloader import bulk, controller  # noqa: E402
+
+
+def _client(server):
+    import aria2p
+
+    return aria2p.Client(host="http://127.0.0.1", port=server.port, secret="secret")
+
+
+def _time(label, count, func):
+    server = FakeAria2Server(secret="secret").start()
+    for i in range(count):
+        server.aria2.add(f"http://example.com/file/{i}", status="error")
+    try:
+        started = time.perf_counter()
+        func(_client(server))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.stop()
+    assert not server.aria2.downloads
+    print(f"{label:<28} {count:>7} downloads in {elapsed:7.2f}s")
+
+
+def main(count: int = 100000):
+    def serial(client):
+        for download in client.tell_stopped(0, count, keys=["gid"]):
+            client.remove_download_result(download["gid"])
+
+    def batched(client):
+        ctl = controller.AsyncController(client)
+        selected = controller.run(bulk.select(ctl, bulk.make_selector({"error"}), bulk.ACTIONS["remove"]))
+        bulk.apply_action(client, bulk.ACTIONS["remove"], (download for _, download in selected))
+
+    _time("one call per download", min(count, 2000), serial)
+    _time("select + multicall", count, batched)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
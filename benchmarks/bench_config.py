@@ -0,0 +1,48 @@
+"""
+Compares cold and cached `load_settings` times.
+
+Usage:
+    python benchmarks/bench_config.py [ITERATIONS]
+"""
+import os
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+from pydownloader import config
+
+CONFIG_CONTENT = """
+[settings]
+dest_folder = /downloads
+connections = 8
+max_download_speed = 10M
+log_file =
+rpc_host = localhost
+rpc_port = 6800
+rpc_secret = secret
+
+[schedules]
+s1 = 09:00-17:00-2M
+s2 = 17:00-22:00-8M
+s3 = 22:00-06:00-0
+"""
+
+
+def main(iterations: int = 2000):
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        os.environ["XDG_CACHE_HOME"] = str(tmp_path / "cache")
+        (tmp_path / "config.ini").write_text(CONFIG_CONTENT)
+        search_paths = [tmp_path]
+
+        cold = timeit.timeit(lambda: config.load_settings(search_paths, use_cache=False), number=iterations)
+        config.load_settings(search_paths)
+        cached = timeit.timeit(lambda: config.load_settings(search_paths), number=iterations)
+
+    print(f"cold:   {cold / iterations * 1e6:8.1f} us/load")
+    print(f"cached: {cached / iterations * 1e6:8.1f} us/load ({cold / cached:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,86 @@
+"""
+Measures history store inserts and queries over many archived downloads.
+
+Fills a fresh SQLite store with synthetic results in purge-sized batches,
+then times the filtered searches and per-host aggregates of `history`.
+
+Usage:
+    python benchmarks/bench_history.py [ROW_COUNT]
+"""
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from pydownloader import history  # noqa: E402
+from pydownloader.bulk import DEFAULT_BATCH_SIZE  # noqa: E402
+
+HOSTS = [f"host{i}.example" for i in range(200)]
+STATUSES = ["complete"] * 8 + ["error", "removed"]
+# The synthetic results finish over the last year
+SPAN = 365 * 86400
+
+
+def _downloads(count, now):
+    rng = random.Random(0)
+    for i in range(count):
+        size = rng.randrange(1, 1 << 30)
+        status = rng.choice(STATUSES)
+        finished = now - rng.random() * SPAN
+        download = {
+            "gid": f"{i:016x}",
+            "status": status,
+            "totalLength": str(size),
+            "completedLength": str(size if status == "complete" else 0),
+            "files": [{"path": f"/downloads/{i}", "uris": [{"uri": f"http://{rng.choice(HOSTS)}/file/{i}"}]}],
+        }
+        yield download, (finished - rng.uniform(1, 600), finished)
+
+
+def _time(label, func, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<40} {best * 1000:9.2f} ms  ({len(result)} rows)")
+
+
+def main(count: int = 1_000_000):
+    now = time.time()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "history.sqlite3"
+        with history.HistoryStore(path) as store:
+            started = time.perf_counter()
+            batch, timings = [], {}
+            for download, timing in _downloads(count, now):
+                batch.append(download)
+                timings[download["gid"]] = timing
+                if len(batch) == DEFAULT_BATCH_SIZE:
+                    store.add(batch, now, timings)
+                    batch, timings = [], {}
+            store.add(batch, now, timings)
+            elapsed = time.perf_counter() - started
+            print(f"{'insert':<40} {count / elapsed:9.0f} rows/sec")
+            # Closing refreshes the planner statistics, as after a purge
+            store.search(history.HistoryQuery(since=now - 86400), limit=1)
+            store.host_stats(history.HistoryQuery(since=now - 86400))
+
+        # Each `history` command opens the store afresh
+        with history.HistoryStore(path) as store:
+            week = history.HistoryQuery(since=now - 7 * 86400, hosts=(HOSTS[0],))
+            day = history.HistoryQuery(since=now - 86400)
+            _time("latest 50", lambda: store.search(limit=50))
+            _time("last day", lambda: store.search(day, limit=50))
+            _time("one host, last week", lambda: store.search(week, limit=50))
+            _time("errors, last day", lambda: store.search(day._replace(statuses=("error",))))
+            _time("over 1 GiB", lambda: store.search(history.HistoryQuery(min_size=(1 << 30) - (1 << 20)), limit=50))
+            _time("per-host stats, last day", lambda: store.host_stats(day))
+            _time("per-host stats, all time", lambda: store.host_stats(), repeat=1)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
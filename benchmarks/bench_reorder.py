@@ -0,0 +1,56 @@
+"""
+Measures how long planning a reorder of a large waiting queue takes.
+
+Compares replaying every move on a Python list, which costs O(n) per move,
+with `plan_moves`, which finds each destination with a Fenwick tree.
+
+Usage:
+    python benchmarks/bench_reorder.py [DOWNLOAD_COUNT]
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from pydownloader import reorder  # noqa: E402
+
+
+def replay(current, target):
+    rank = {gid: position for position, gid in enumerate(target)}
+    kept = {current[i] for i in reorder.longest_increasing_subsequence([rank[gid] for gid in current])}
+    queue = list(current)
+    moves = []
+    for position, gid in enumerate(target):
+        if gid in kept:
+            continue
+        queue.remove(gid)
+        destination = queue.index(target[position - 1]) + 1 if position else 0
+        queue.insert(destination, gid)
+        moves.append((gid, destination))
+    return moves
+
+
+def _time(label, count, func, current, target):
+    started = time.perf_counter()
+    moves = func(current, target)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<20} {count:>7} downloads, {len(moves):>7} moves in {elapsed:7.2f}s")
+    return moves
+
+
+def main(count: int = 100000):
+    current = [f"{i:016x}" for i in range(count)]
+    target = current[:]
+    random.Random(0).shuffle(target)
+    rank = {gid: position for position, gid in enumerate(target)}
+    small = min(count, 20000)
+    small_target = sorted(current[:small], key=rank.__getitem__)
+    expected = _time("list replay", small, replay, current[:small], small_target)
+    assert reorder.plan_moves(current[:small], small_target) == expected
+    _time("fenwick tree", count, reorder.plan_moves, current, target)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
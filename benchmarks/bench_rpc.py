@@ -0,0 +1,47 @@
+"""
+Measures RPC calls/sec with pooled keep-alive vs. per-call connections.
+
+Usage:
+    python benchmarks/bench_rpc.py [CALLS]
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tests.fake_aria2 import FakeAria2Server  # noqa: E402
+
+from pydownloader import rpc  # noqa: E402
+
+
+class _Settings:
+    rpc_host = "127.0.0.1"
+    rpc_secret = "secret"
+    rpc_timeout = 10.0
+
+    def __init__(self, port):
+        self.rpc_port = port
+
+
+def main(calls: int = 2000):
+    server = FakeAria2Server(secret="secret").start()
+    try:
+        settings = _Settings(server.port)
+        for label, pooled in (("unpooled (aria2p)", False), ("pooled keep-alive", True)):
+            client = rpc.connect(settings, pooled=pooled)
+            connections = server.connections
+            started = time.perf_counter()
+            for _ in range(calls):
+                client.get_version()
+            elapsed = time.perf_counter() - started
+            print(
+                f"{label:<20} {calls / elapsed:8.0f} calls/sec "
+                f"({server.connections - connections} connections)"
+            )
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,69 @@
+"""
+Measures warm-restart cost with a large saved session.
+
+Always times the work pydownloader does before launching aria2c (counting
+the entries and writing the backup). If aria2c is on PATH, also times a real
+start, from launch until the RPC interface answers, with the session loaded.
+
+Usage:
+    python benchmarks/bench_session.py [ENTRIES]
+"""
+import shutil
+import sys
+import tempfile
+import time
+from configparser import ConfigParser
+from pathlib import Path
+
+from pydownloader import daemon
+
+# A port unlikely to clash with a running daemon
+BENCH_PORT = 16800
+
+
+def write_session(path: Path, entries: int):
+    with open(path, "w") as f:
+        for i in range(entries):
+            f.write(f"http://mirror{i % 50}.example.com/files/{i}.bin\n")
+            f.write(f" gid={i + 1:016x}\n")
+            f.write(" pause=true\n")
+
+
+def main(entries: int = 100_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        session = tmp_path / "session-0.txt"
+        write_session(session, entries)
+        size_mb = session.stat().st_size / 1e6
+
+        started = time.perf_counter()
+        restored = daemon.prepare_session(session)
+        prepare_ms = (time.perf_counter() - started) * 1e3
+        print(f"session: {restored} entries, {size_mb:.1f} MB")
+        print(f"prepare (count + atomic backup): {prepare_ms:8.1f} ms")
+
+        if shutil.which("aria2c") is None:
+            print("aria2c not found; skipping the real start")
+            return
+
+        config = ConfigParser()
+        config.read_dict(
+            {
+                "settings": {
+                    "dest_folder": str(tmp_path / "downloads"),
+                    "rpc_port": str(BENCH_PORT),
+                    "session_dir": str(tmp_path),
+                    "save_session_interval": "0",
+                }
+            }
+        )
+        pid_file = tmp_path / "daemon.pid"
+        try:
+            (ready,) = daemon.start(config, pid_file, ready_timeout=600)
+            print(f"start until RPC ready:           {ready * 1e3:8.1f} ms")
+        finally:
+            daemon.stop(pid_file)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
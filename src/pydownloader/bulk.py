@@ -0,0 +1,366 @@
+import logging
+import re
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import AbstractSet, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Pattern, Set, Tuple
+from urllib.parse import urlsplit
+
+from pydownloader.utils import first_uri
+
+logger = logging.getLogger(__name__)
+
+# Number of calls packed into one system.multicall request
+DEFAULT_BATCH_SIZE = 500
+# Number of multicall requests allowed to be outstanding at once
+DEFAULT_MAX_IN_FLIGHT = 4
+
+ADD_URI = "aria2.addUri"
+STOPPED_STATUSES = frozenset({"complete", "error", "removed"})
+
+
+class LineFailure(NamedTuple):
+    """A URL from a list that aria2c did not accept."""
+
+    line: int
+    url: str
+    message: str
+
+
+@dataclass
+class AddListReport:
+    """The outcome of a bulk add."""
+
+    added: int = 0
+    failures: List[LineFailure] = field(default_factory=list)
+
+
+def batched(items: Iterable, size: int) -> Iterator[list]:
+    """
+    Splits an iterable into lists of at most `size` items, lazily.
+
+    Args:
+        items: The items to split.
+        size: The maximum batch size.
+
+    Yields:
+        Consecutive batches.
+    """
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def fault_message(result) -> Optional[str]:
+    """
+    Returns the error of a single system.multicall result, if it failed.
+
+    aria2c answers each call of a multicall with either a one-item list
+    holding the return value or a struct with `faultCode`/`faultString`.
+
+    Args:
+        result: One element of a multicall response.
+
+    Returns:
+        The fault string, or None if the call succeeded.
+    """
+    if isinstance(result, dict) and "faultCode" in result:
+        return result.get("faultString", "unknown error")
+    return None
+
+
+def _add_batch(client, batch: List[Tuple[int, str]], options: Dict[str, str]) -> AddListReport:
+    report = AddListReport()
+    calls = [(ADD_URI, [[url], options]) for _, url in batch]
+    try:
+        results = client.multicall2(calls)
+    except Exception as error:
+        # The whole request failed (e.g. connection lost): report every line
+        report.failures.extend(LineFailure(line, url, str(error)) for line, url in batch)
+        return report
+    for (line, url), result in zip(batch, results):
+        message = fault_message(result)
+        if message is None:
+            report.added += 1
+        else:
+            report.failures.append(LineFailure(line, url, message))
+    return report
+
+
+def add_urls(
+    client,
+    urls: Iterable[Tuple[int, str]],
+    options: Optional[Dict[str, str]] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+) -> AddListReport:
+    """
+    Adds many URLs to the daemon using batched `system.multicall` requests.
+
+    URLs are consumed lazily, so memory use is bounded by
+    `batch_size * max_in_flight` regardless of the list length. A URL rejected
+    by aria2c is reported as a failure without affecting the rest of its batch.
+
+    Args:
+        client: An aria2p client.
+        urls: (line number, URL) pairs, e.g. from `utils.iter_url_list`.
+        options: aria2c options applied to every download.
+        batch_size: Number of addUri calls per multicall request.
+        max_in_flight: Maximum number of concurrent multicall requests.
+
+    Returns:
+        The number of URLs added and the per-line failures, in line order.
+    """
+    options = options or {}
+    report = AddListReport()
+    pending: Set[Future] = set()
+
+    def collect(done: Iterable[Future]):
+        for future in done:
+            result = future.result()
+            report.added += result.added
+            report.failures.extend(result.failures)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for batch in batched(urls, batch_size):
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(executor.submit(_add_batch, client, batch, options))
+        collect(pending)
+
+    report.failures.sort()
+    logger.info("Added %d URLs, %d failed", report.added, len(report.failures))
+    return report
+
+
+class Action(NamedTuple):
+    """A per-download RPC method applied by a bulk command."""
+
+    # The method for downloads that are still queued or running
+    method: str
+    # The statuses the action applies to; others are left out of the selection
+    statuses: FrozenSet[str]
+    # The method for stopped downloads, if it differs
+    stopped_method: Optional[str] = None
+
+
+ACTIONS: Dict[str, Action] = {
+    "remove": Action(
+        "aria2.remove", frozenset({"active", "waiting", "paused"}) | STOPPED_STATUSES, "aria2.removeDownloadResult"
+    ),
+    "pause": Action("aria2.pause", frozenset({"active", "waiting"})),
+    "unpause": Action("aria2.unpause", frozenset({"paused"})),
+}
+
+
+def parse_rows(spec: str) -> List[Tuple[int, Optional[int]]]:
+    """
+    Parses a row selection such as "10-500,600,700-".
+
+    Args:
+        spec: Comma-separated row numbers and ranges; a range without an end
+            runs to the last row.
+
+    Returns:
+        (first, last) pairs; `last` is None for an open range.
+
+    Raises:
+        ValueError: If the selection is malformed.
+    """
+    ranges = []
+    for part in spec.split(","):
+        first, dash, last = part.strip().partition("-")
+        try:
+            start = int(first)
+            end = (int(last) if last else None) if dash else start
+        except ValueError:
+            raise ValueError(f"Invalid row selection '{part.strip()}'") from None
+        if start < 1 or (end is not None and end < start):
+            raise ValueError(f"Invalid row selection '{part.strip()}'")
+        ranges.append((start, end))
+    return ranges
+
+
+@dataclass
+class Selector:
+    """
+    Which downloads a bulk command acts on. All given criteria must match;
+    several statuses, hosts or row ranges match any of them.
+    """
+
+    statuses: Optional[AbstractSet[str]] = None
+    # Host names; each also matches its subdomains
+    hosts: Tuple[str, ...] = ()
+    # Searched in the first URI of a download
+    pattern: Optional[Pattern] = None
+    rows: List[Tuple[int, Optional[int]]] = field(default_factory=list)
+
+    @property
+    def keys(self) -> List[str]:
+        """The status keys needed to evaluate the selector."""
+        return ["gid", "status", "files"] if self.hosts or self.pattern else ["gid", "status"]
+
+    def _in_rows(self, row: int) -> bool:
+        return any(start <= row and (end is None or row <= end) for start, end in self.rows)
+
+    def matches(self, row: int, download: dict) -> bool:
+        """
+        Checks one download.
+
+        Args:
+            row: Its row number, as shown by `list`.
+            download: Its status dict, fetched with `keys`.
+
+        Returns:
+            True if it is selected.
+        """
+        if self.statuses is not None and download["status"] not in self.statuses:
+            return False
+        if self.rows and not self._in_rows(row):
+            return False
+        if self.hosts or self.pattern:
+            uri = first_uri(download)
+            if self.hosts:
+                host = urlsplit(uri).hostname or ""
+                if not any(host == h or host.endswith("." + h) for h in self.hosts):
+                    return False
+            if self.pattern and not self.pattern.search(uri):
+                return False
+        return True
+
+
+def make_selector(
+    statuses: Optional[AbstractSet[str]] = None,
+    hosts: Iterable[str] = (),
+    match: Optional[str] = None,
+    rows: Optional[str] = None,
+) -> Selector:
+    """
+    Builds a selector from command-line values.
+
+    Args:
+        statuses: Download statuses to select.
+        hosts: Host names to select.
+        match: A regular expression searched in the first URI.
+        rows: A row selection for `parse_rows`.
+
+    Returns:
+        The selector.
+
+    Raises:
+        ValueError: If the regular expression or row selection is invalid.
+    """
+    try:
+        pattern = re.compile(match) if match is not None else None
+    except re.error as error:
+        raise ValueError(f"Invalid pattern '{match}': {error}") from None
+    return Selector(
+        statuses=frozenset(statuses) if statuses is not None else None,
+        hosts=tuple(host.lower().rstrip(".") for host in hosts),
+        pattern=pattern,
+        rows=parse_rows(rows) if rows else [],
+    )
+
+
+async def select(
+    ctl, selector: Selector, action: Optional[Action] = None, keys: Optional[List[str]] = None
+) -> List[Tuple[int, dict]]:
+    """
+    Finds the downloads a bulk command acts on.
+
+    The queue is paged with only the status keys the selector needs, and
+    parts of the queue that no selected status lives in are not fetched.
+    Without a status filter, rows before the first selected row are skipped
+    without fetching them.
+
+    Args:
+        ctl: An AsyncController or ControllerGroup.
+        selector: The selection.
+        action: Leave out downloads the action does not apply to.
+        keys: The status keys to fetch; defaults to `selector.keys`.
+
+    Returns:
+        The selected (row number, download) pairs, in row order.
+    """
+    statuses = selector.statuses
+    if action is not None:
+        statuses = action.statuses if statuses is None else statuses & action.statuses
+    offset, limit = 0, None
+    if selector.rows and statuses is None:
+        # Unfiltered rows are numbered from the offset, so whole ranges can be skipped
+        first = min(start for start, _ in selector.rows)
+        ends = [end for _, end in selector.rows]
+        offset = first - 1
+        limit = None if None in ends else max(ends) - offset
+    selected = []
+    async for rows in ctl.iter_rows(offset=offset, limit=limit, statuses=statuses, keys=keys or selector.keys):
+        selected.extend((row, download) for row, download in rows if selector.matches(row, download))
+    return selected
+
+
+@dataclass
+class ActionReport:
+    """The outcome of a bulk action."""
+
+    done: int = 0
+    requests: int = 0
+    failures: List[Tuple[str, str]] = field(default_factory=list)
+
+
+def _action_batch(client, batch: List[Tuple[str, list]]) -> ActionReport:
+    report = ActionReport(requests=1)
+    try:
+        results = client.multicall2(batch)
+    except Exception as error:
+        report.failures.extend((params[0], str(error)) for _, params in batch)
+        return report
+    for (_, params), result in zip(batch, results):
+        message = fault_message(result)
+        if message is None:
+            report.done += 1
+        else:
+            report.failures.append((params[0], message))
+    return report
+
+
+def apply_action(
+    client,
+    action: Action,
+    downloads: Iterable[dict],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+) -> ActionReport:
+    """
+    Applies an action to many downloads using batched `system.multicall` requests.
+
+    A call rejected by aria2c (e.g. a download that finished in the
+    meantime) is reported without affecting the rest of its batch.
+
+    Args:
+        client: An aria2p client or `pool.DaemonPool`; a pool routes each call
+            to the instance that owns the download.
+        action: One of ACTIONS.
+        downloads: Status dicts with `gid` and `status`.
+        batch_size: Calls per multicall request.
+        max_in_flight: Maximum number of concurrent multicall requests.
+
+    Returns:
+        The number of downloads acted on, the requests sent and the
+        per-GID failures.
+    """
+    stopped_method = action.stopped_method or action.method
+    calls = (
+        (stopped_method if d["status"] in STOPPED_STATUSES else action.method, [d["gid"]]) for d in downloads
+    )
+    report = ActionReport()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for result in executor.map(lambda batch: _action_batch(client, batch), batched(calls, batch_size)):
+            report.done += result.done
+            report.requests += result.requests
+            report.failures.extend(result.failures)
+    logger.info("Applied %s to %d downloads, %d failed", action.method, report.done, len(report.failures))
+    return report
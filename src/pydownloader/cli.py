@@ -0,0 +1,835 @@
+"""
+Command-line interface.
+
+Only typer is imported at module level. Every command imports the modules it
+needs inside its body, so that e.g. `status` never loads rich or aria2p and
+stays fast enough to be polled from scripts and monitoring.
+"""
+from typing import List, Optional
+
+import typer
+
+app = typer.Typer(help="A controller for the aria2c download utility.")
+
+
+def _fail(message: str):
+    typer.echo(f"Error: {message}", err=True)
+    raise typer.Exit(code=1)
+
+
+def _load_config():
+    from pydownloader import config
+
+    try:
+        return config.load_config()
+    except (FileNotFoundError, ValueError) as error:
+        _fail(str(error))
+
+
+def _load_settings():
+    from pydownloader import config
+
+    try:
+        return config.load_settings()
+    except (FileNotFoundError, ValueError) as error:
+        _fail(str(error))
+
+
+def _download_options(settings) -> dict:
+    if settings.username and settings.password:
+        return {"http-user": settings.username, "http-passwd": settings.password}
+    return {}
+
+
+@app.callback()
+def callback():
+    """A controller for the aria2c download utility."""
+
+
+@app.command()
+def start(
+    explain: bool = typer.Option(False, "--explain", help="Show the tuned aria2c options and why they were chosen."),
+):
+    """Starts the aria2c daemon in the background and waits until it is ready."""
+    from pydownloader import daemon
+
+    config = _load_config()
+    if explain:
+        _explain_profile(config)
+    try:
+        restored = sum(
+            daemon.count_session_entries(daemon.session_file(config, index))
+            for index in range(daemon.instance_count(config))
+        )
+        if restored:
+            typer.echo(f"Restoring {restored} downloads from the saved session.")
+        ready_times = daemon.start(config)
+    except FileNotFoundError:
+        _fail("aria2c is not installed or not in PATH.")
+    except (OSError, RuntimeError, ValueError) as error:
+        _fail(str(error))
+    typer.echo(f"Daemon started (ready in {max(ready_times):.2f}s).")
+
+
+def _explain_profile(config):
+    from pydownloader import daemon
+    from pydownloader.utils import format_size
+
+    facts = daemon.host_facts(config.get("settings", "dest_folder"))
+    try:
+        profile = daemon.tune(config, facts)
+    except ValueError as error:
+        _fail(str(error))
+    typer.echo(
+        f"Host: {facts.fs_type or 'unknown'} file system, {format_size(facts.available_memory)} available, "
+        f"{facts.cpus} CPUs"
+    )
+    width = max(len(option) for option in profile) + 2
+    for option, tuned in profile.items():
+        typer.echo(f"  --{option:<{width}} {tuned.value:<8} {tuned.reason}")
+
+
+@app.command()
+def stop():
+    """Saves the queue and stops the aria2c daemon."""
+    from pydownloader import config, daemon
+
+    try:
+        # Without a readable config the daemon is still stopped, just unsaved
+        loaded = config.load_config()
+    except (FileNotFoundError, ValueError):
+        loaded = None
+    results = daemon.stop(config=loaded)
+    if not results:
+        typer.echo("Daemon stopped.")
+    for result in results:
+        typer.echo(f"Daemon stopped (PID {result.pid}, {result.method} after {result.seconds:.2f}s).")
+
+
+@app.command()
+def status(
+    fleet: bool = typer.Option(False, "--fleet", help="Check the health and load of every node in [nodes]."),
+):
+    """Reports whether the daemon is running."""
+    if fleet:
+        _fleet_status()
+        return
+    from pydownloader import daemon
+
+    state, pid = daemon.get_status()
+    typer.echo(f"{state} (PID {pid})" if pid else state)
+    group = daemon.get_group_status()
+    if len(group) > 1:
+        for index, (pid, alive) in enumerate(group):
+            typer.echo(f"  instance {index}: PID {pid} {'running' if alive else 'stopped'}")
+
+
+def _fleet_status():
+    from pydownloader import fleet
+    from pydownloader.utils import format_size
+
+    settings = _load_settings()
+    if not settings.nodes:
+        _fail("no [nodes] are configured.")
+    stats = fleet.connect(settings).sample()
+    for node_stats in stats:
+        node = node_stats.node
+        if not node_stats.healthy:
+            typer.echo(f"{node.name}: DOWN ({node.url}): {node_stats.error}")
+            continue
+        line = (
+            f"{node.name}: up ({node.url}), {format_size(node_stats.download_speed)}/s, "
+            f"{node_stats.num_active} active, {node_stats.num_waiting} waiting"
+        )
+        if node_stats.capacity:
+            line += f", {format_size(max(node_stats.spare_bandwidth, 0))}/s spare"
+        if node_stats.spare_disk is not None:
+            line += f", {format_size(max(node_stats.spare_disk, 0))} disk free"
+        typer.echo(line)
+    healthy = sum(1 for node_stats in stats if node_stats.healthy)
+    typer.echo(f"{healthy} of {len(stats)} nodes healthy.")
+    if healthy < len(stats):
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def supervise():
+    """Runs the daemon under a watchdog that restarts it if it crashes (until interrupted)."""
+    from pydownloader import scheduler as scheduler_module
+    from pydownloader import supervisor
+    from pydownloader.utils import setup_logger
+
+    config = _load_config()
+    settings = _load_settings()
+    setup_logger(settings.log_file)
+
+    def restore_speed_limit(index: int):
+        scheduler_module.run_once(settings)
+
+    watchdog = supervisor.Supervisor(config, on_restart=restore_speed_limit)
+    typer.echo("Supervising aria2c; press Ctrl+C to stop.")
+    try:
+        watchdog.run()
+    except FileNotFoundError:
+        _fail("aria2c is not installed or not in PATH.")
+    except (TimeoutError, RuntimeError, ValueError) as error:
+        _fail(str(error))
+    typer.echo(f"Daemon stopped after {watchdog.restarts} restarts.")
+
+
+@app.command()
+def add(url: str):
+    """Adds a single download URL to the queue."""
+    from aria2p import ClientException
+
+    from pydownloader import pool
+
+    settings = _load_settings()
+    try:
+        gid = pool.connect(settings).add_uri([url], options=_download_options(settings))
+    except (OSError, ClientException) as error:
+        _fail(f"could not reach aria2c: {error}")
+    typer.echo(f"Added {url} (GID {gid})")
+
+
+@app.command("add-list")
+def add_list(
+    path: str = typer.Argument(..., help="Text file with one URL per line (gzip/xz/zstd ok), or - for stdin."),
+    batch_size: int = typer.Option(500, min=1, help="URLs per system.multicall request."),
+    max_in_flight: int = typer.Option(4, min=1, help="Maximum concurrent multicall requests."),
+):
+    """Adds all URLs from a text file to the queue."""
+    from pydownloader import bulk, pool
+    from pydownloader.utils import iter_url_list
+
+    settings = _load_settings()
+    try:
+        report = bulk.add_urls(
+            pool.connect(settings),
+            iter_url_list(path),
+            options=_download_options(settings),
+            batch_size=batch_size,
+            max_in_flight=max_in_flight,
+        )
+    except (OSError, ValueError) as error:
+        _fail(str(error))
+    for failure in report.failures:
+        typer.echo(f"Line {failure.line}: {failure.url}: {failure.message}", err=True)
+    typer.echo(f"Added {report.added} URLs, {len(report.failures)} failed.")
+    if report.failures:
+        raise typer.Exit(code=1)
+
+
+def _controller(settings):
+    from pydownloader import controller, pool, rpc
+
+    if settings.nodes:
+        fleet = pool.connect(settings)
+        healthy = fleet.healthy()
+        for node_stats in fleet.stats:
+            if not node_stats.healthy:
+                typer.echo(f"Warning: node {node_stats.node.name} is unreachable, skipping it.", err=True)
+        if not healthy.clients:
+            _fail("no node is reachable.")
+        return controller.ControllerGroup(healthy, timeout=settings.rpc_timeout)
+    if settings.instances > 1:
+        return controller.ControllerGroup(pool.connect(settings), timeout=settings.rpc_timeout)
+    return controller.AsyncController(rpc.connect(settings), timeout=settings.rpc_timeout)
+
+
+def _fetch_downloads(ctl) -> list:
+    from aria2p import ClientException
+
+    from pydownloader import controller
+
+    try:
+        return controller.run(ctl.list_downloads())
+    except (OSError, ClientException) as error:
+        _fail(f"could not reach aria2c: {error}")
+
+
+# Column widths of the `list` table, fixed so that streamed chunks line up
+LIST_COLUMNS = (("#", 7, "right"), ("Status", 6, "left"), ("%", 5, "right"), ("URL", 60, "left"))
+# Values accepted by `list --status`; "stopped" covers complete, error and removed
+LIST_STATUSES = ("active", "waiting", "paused", "complete", "error", "removed", "stopped")
+
+
+def _print_rows(console, rows: list, show_header: bool):
+    from rich.table import Table
+
+    from pydownloader.utils import STATUS_ICONS, first_uri, progress_percent, truncate_url
+
+    table = Table(show_header=show_header, show_edge=False, box=None, pad_edge=False)
+    for name, width, justify in LIST_COLUMNS:
+        table.add_column(name, width=width, justify=justify, no_wrap=True)
+    for row, download in rows:
+        table.add_row(
+            str(row),
+            STATUS_ICONS.get(download["status"], "?"),
+            f"{progress_percent(download):.0f}%",
+            truncate_url(first_uri(download), LIST_COLUMNS[-1][1]),
+        )
+    console.print(table)
+
+
+def _parse_statuses(status: Optional[List[str]]) -> Optional[set]:
+    if not status:
+        return None
+    unknown = set(status) - set(LIST_STATUSES)
+    if unknown:
+        _fail(f"unknown status: {', '.join(sorted(unknown))}")
+    statuses = set(status)
+    if "stopped" in statuses:
+        statuses |= {"complete", "error", "removed"}
+    return statuses
+
+
+@app.command("list")
+def list_downloads(
+    page: int = typer.Option(1, min=1, help="Page number, counting from 1."),
+    limit: Optional[int] = typer.Option(None, min=1, help="Rows per page (default: everything)."),
+    status: Optional[List[str]] = typer.Option(
+        None, help=f"Only show these statuses ({', '.join(LIST_STATUSES)}); repeatable."
+    ),
+    watch: bool = typer.Option(False, "--watch", help="Keep the table open and refresh it live."),
+    refresh: float = typer.Option(1.0, min=0.1, help="Seconds between refreshes with --watch."),
+    show_all: bool = typer.Option(False, "--all", help="Also show the results archived in the history store."),
+):
+    """Displays the downloads, streaming the queue in windows."""
+    from aria2p import ClientException
+    from rich.console import Console
+
+    from pydownloader import controller, snapshot
+
+    if show_all and (watch or limit is not None or page > 1):
+        _fail("--all cannot be combined with --watch, --page or --limit.")
+    statuses = _parse_statuses(status)
+    settings = _load_settings()
+    ctl = _controller(settings)
+    console = Console()
+    if watch:
+        _watch(settings, ctl, console, page, limit, statuses, refresh)
+        return
+
+    async def stream(shown_rows):
+        owners = getattr(ctl.client, "owners", {})
+        async for rows in ctl.iter_rows(offset=(page - 1) * (limit or 0), limit=limit, statuses=statuses):
+            _print_rows(console, rows, show_header=not shown_rows)
+            for row, download in rows:
+                shown_rows.add(row, download, owners.get(download["gid"], 0))
+
+    try:
+        stat = ctl.client.get_global_stat()
+        # Remembers which download each row shows, for `remove` and `move`
+        shown_rows = snapshot.RowSnapshot(
+            str(ctl.client.server), ctl.client.get_session_info()["sessionId"], int(stat["numActive"])
+        )
+        controller.run(stream(shown_rows))
+    except (OSError, ClientException) as error:
+        _fail(f"could not reach aria2c: {error}")
+    snapshot.save(shown_rows)
+    archived = 0
+    if show_all:
+        # Archived results follow the live queue; they are not in the snapshot
+        live = sum(int(stat[key]) for key in ("numActive", "numWaiting", "numStopped"))
+        archived = _print_archived(console, settings.history_file, live + 1, statuses, show_header=not shown_rows)
+    if not shown_rows and not archived:
+        typer.echo("No downloads.")
+
+
+def _print_archived(console, history_file, first_row: int, statuses: Optional[set], show_header: bool) -> int:
+    from pydownloader import history
+
+    if not history_file.exists():
+        return 0
+    shown = 0
+    try:
+        with history.HistoryStore(history_file) as store:
+            for rows in store.iter_rows(first_row, statuses):
+                _print_rows(console, rows, show_header=show_header and not shown)
+                shown += len(rows)
+    except (OSError, ValueError) as error:
+        _fail(f"could not read {history_file}: {error}")
+    return shown
+
+
+def _watch(settings, ctl, console, page: int, limit: Optional[int], statuses: Optional[set], refresh: float):
+    from aria2p import ClientException
+
+    from pydownloader import controller, events
+    from pydownloader import watch as watch_module
+
+    # Without --limit, watch as many rows as fit on the screen
+    limit = limit or max(console.size.height - 8, 1)
+
+    async def visible_rows():
+        rows = []
+        async for batch in ctl.iter_rows(offset=(page - 1) * limit, limit=limit, statuses=statuses):
+            rows.extend(batch)
+        return rows
+
+    # Status changes arrive as notifications; polling is left to the progress of active rows
+    bus = events.EventBus()
+    listeners = [events.NotificationListener(url, bus, timeout=1.0) for url in _ws_urls(settings)]
+    try:
+        model = watch_module.WatchModel(ctl.client, controller.run(visible_rows()))
+        model.subscribe(bus)
+        for listener in listeners:
+            listener.start()
+        watch_module.watch(model, refresh=refresh)
+    except KeyboardInterrupt:
+        pass
+    except (OSError, ClientException) as error:
+        _fail(f"could not reach aria2c: {error}")
+    finally:
+        for listener in listeners:
+            listener.stop()
+
+
+def _ws_urls(settings) -> List[str]:
+    from pydownloader import events
+
+    if settings.nodes:
+        from pydownloader import fleet
+
+        return [fleet.ws_url(node) for node in settings.nodes]
+    return [events.ws_url(settings, port=settings.rpc_port + index) for index in range(settings.instances)]
+
+
+def _shown_rows(ctl, rows: List[int]):
+    """
+    Resolves rows through the snapshot saved by the last `list`.
+
+    Only the downloads at those rows are queried. Returns None when there is
+    no snapshot or it does not cover every row, so that the caller falls
+    back to fetching the queue.
+    """
+    from pydownloader import controller, snapshot
+
+    shown = snapshot.load(str(ctl.client.server))
+    if shown is None or any(shown.lookup(row) is None for row in rows):
+        return None
+    snapshot.check_session(shown, ctl.client)
+    return shown, controller.run(snapshot.revalidate(ctl, shown, rows))
+
+
+# Options shared by the bulk commands (remove, pause, unpause)
+_STATUS_OPTION = typer.Option(None, "--status", help=f"Select these statuses ({', '.join(LIST_STATUSES)}); repeatable.")
+_HOST_OPTION = typer.Option(None, "--host", help="Select downloads from this host or its subdomains; repeatable.")
+_MATCH_OPTION = typer.Option(None, "--match", help="Select downloads whose URL matches this regular expression.")
+_ROWS_OPTION = typer.Option(None, "--rows", help="Select rows as numbered by `list`, e.g. 10-500,600,700-.")
+_DRY_RUN_OPTION = typer.Option(False, "--dry-run", help="Only show what would be selected; change nothing.")
+_BATCH_SIZE_OPTION = typer.Option(500, min=1, help="Calls per system.multicall request.")
+# Selected downloads listed by a dry run
+_PREVIEW_ROWS = 20
+_ROW_OR_FILTERS = "give either a row number or filters (--status, --host, --match, --rows)."
+
+
+def _has_filters(status, host, match: Optional[str], rows: Optional[str]) -> bool:
+    return bool(status or host) or match is not None or rows is not None
+
+
+def _bulk_action(
+    name: str,
+    status: Optional[List[str]],
+    host: Optional[List[str]],
+    match: Optional[str],
+    rows: Optional[str],
+    dry_run: bool,
+    batch_size: int,
+):
+    """
+    Applies an action to every download matching the filters.
+
+    The queue is fetched with only the fields the filters need and the
+    action is sent as system.multicall batches.
+    """
+    from aria2p import ClientException
+
+    from pydownloader import bulk, controller
+    from pydownloader.utils import first_uri
+
+    action = bulk.ACTIONS[name]
+    try:
+        selector = bulk.make_selector(_parse_statuses(status), host or (), match, rows)
+    except ValueError as error:
+        _fail(str(error))
+    ctl = _controller(_load_settings())
+    keys = ["gid", "status", "files"] if dry_run else None
+    try:
+        selected = controller.run(bulk.select(ctl, selector, action, keys))
+    except (OSError, ClientException) as error:
+        _fail(f"could not reach aria2c: {error}")
+    if dry_run:
+        typer.echo(f"Would {name} {len(selected)} downloads.")
+        for row, download in selected[:_PREVIEW_ROWS]:
+            typer.echo(f"{row:>7}  {download['status']:<8}  {first_uri(download)}")
+        if len(selected) > _PREVIEW_ROWS:
+            typer.echo(f"    ... and {len(selected) - _PREVIEW_ROWS} more")
+        return
+    report = bulk.apply_action(ctl.client, action, (download for _, download in selected), batch_size)
+    for gid, message in report.failures:
+        typer.echo(f"GID {gid}: {message}", err=True)
+    typer.echo(
+        f"{name.capitalize()}d {report.done} downloads in {report.requests} requests, "
+        f"{len(report.failures)} failed."
+    )
+    if report.failures:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def remove(
+    row: Optional[int] = typer.Argument(None, help="Row number as shown by `list`."),
+    status: Optional[List[str]] = _STATUS_OPTION,
+    host: Optional[List[str]] = _HOST_OPTION,
+    match: Optional[str] = _MATCH_OPTION,
+    rows: Optional[str] = _ROWS_OPTION,
+    dry_run: bool = _DRY_RUN_OPTION,
+    batch_size: int = _BATCH_SIZE_OPTION,
+):
+    """Removes the download at a row, or every download matching the filters."""
+    from aria2p import ClientException
+
+    from pydownloader import controller
+
+    filtered = _has_filters(status, host, match, rows)
+    if (row is None) != filtered:
+        _fail(_ROW_OR_FILTERS)
+    if filtered:
+        _bulk_action("remove", status, host, match, rows, dry_run, batch_size)
+        return
+    ctl = _controller(_load_settings())
+    try:
+        shown = _shown_rows(ctl, [row])
+        if shown is None:
+            _, download = controller.resolve_row(_fetch_downloads(ctl), row)
+        else:
+            download = shown[1][row]
+        controller.run(ctl.remove(download))
+    except (ValueError, OSError, ClientException) as error:
+        _fail(str(error))
+    typer.echo(f"Removed row {row} (GID {download['gid']}).")
+
+
+def _row_or_filters(name: str, row: Optional[int], status, host, match, rows, dry_run: bool, batch_size: int):
+    if (row is None) != _has_filters(status, host, match, rows):
+        _fail(_ROW_OR_FILTERS)
+    _bulk_action(name, status, host, match, rows if row is None else str(row), dry_run, batch_size)
+
+
+@app.command()
+def pause(
+    row: Optional[int] = typer.Argument(None, help="Row number as shown by `list`."),
+    status: Optional[List[str]] = _STATUS_OPTION,
+    host: Optional[List[str]] = _HOST_OPTION,
+    match: Optional[str] = _MATCH_OPTION,
+    rows: Optional[str] = _ROWS_OPTION,
+    dry_run: bool = _DRY_RUN_OPTION,
+    batch_size: int = _BATCH_SIZE_OPTION,
+):
+    """Pauses the download at a row, or every active or waiting download matching the filters."""
+    _row_or_filters("pause", row, status, host, match, rows, dry_run, batch_size)
+
+
+@app.command()
+def unpause(
+    row: Optional[int] = typer.Argument(None, help="Row number as shown by `list`."),
+    status: Optional[List[str]] = _STATUS_OPTION,
+    host: Optional[List[str]] = _HOST_OPTION,
+    match: Optional[str] = _MATCH_OPTION,
+    rows: Optional[str] = _ROWS_OPTION,
+    dry_run: bool = _DRY_RUN_OPTION,
+    batch_size: int = _BATCH_SIZE_OPTION,
+):
+    """Resumes the paused download at a row, or every paused download matching the filters."""
+    _row_or_filters("unpause", row, status, host, match, rows, dry_run, batch_size)
+
+
+@app.command()
+def move(
+    from_row: int = typer.Argument(..., help="Row number of the download to move."),
+    to_row: int = typer.Argument(..., help="Row number it should end up at."),
+):
+    """Moves a waiting download to a new position in the queue."""
+    from aria2p import ClientException
+
+    from pydownloader import controller
+
+    ctl = _controller(_load_settings())
+    try:
+        shown = _shown_rows(ctl, [from_row, to_row])
+        if shown is None:
+            downloads = _fetch_downloads(ctl)
+            _, download = controller.resolve_row(downloads, from_row)
+            controller.resolve_row(downloads, to_row)
+            waiting = len([d for d in downloads if d["status"] in ("waiting", "paused")])
+            active = sum(1 for d in downloads if d["status"] == "active")
+        else:
+            download = shown[1][from_row]
+            # aria2c moves a download past the end of the queue to its end
+            waiting, active = None, shown[0].active
+        if download["status"] not in ("waiting", "paused"):
+            raise ValueError(f"Row {from_row} is not waiting in the queue and cannot be moved")
+        # Rows count active downloads first; queue positions count waiting only
+        position = max(to_row - active - 1, 0)
+        if waiting is not None:
+            position = min(position, waiting - 1)
+        position = controller.run(ctl.move(download["gid"], position))
+    except (ValueError, OSError, ClientException) as error:
+        _fail(str(error))
+    typer.echo(f"Moved row {from_row} to row {active + position + 1}.")
+
+
+@app.command()
+def reorder(
+    by: Optional[str] = typer.Option(None, "--by", help="Sort the waiting queue by 'size' or 'host'."),
+    reverse: bool = typer.Option(False, "--reverse", help="Sort in descending order."),
+    gid_file: Optional[str] = typer.Option(
+        None, "--file", help="File with GIDs, one per line, to move to the front in that order."
+    ),
+    batch_size: int = typer.Option(500, min=1, help="changePosition calls per system.multicall request."),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Only count the moves; change nothing."),
+):
+    """Reorders the waiting queue with as few moves as possible."""
+    from aria2p import ClientException
+
+    from pydownloader import pool
+    from pydownloader import reorder as reorder_module
+
+    if (by is None) == (gid_file is None):
+        _fail("give exactly one of --by and --file.")
+    first: List[str] = []
+    if gid_file is not None:
+        try:
+            with open(gid_file) as f:
+                first = [line.split("#", 1)[0].strip() for line in f]
+        except OSError as error:
+            _fail(str(error))
+        first = [gid for gid in first if gid]
+
+    settings = _load_settings()
+    client = pool.connect(settings)
+    if settings.nodes:
+        client = client.healthy()
+    # Each daemon has its own queue, so each one is reordered on its own
+    try:
+        report = reorder_module.merge_reports(
+            reorder_module.reorder(c, by, reverse, first, batch_size, dry_run)
+            for c in getattr(client, "clients", [client])
+        )
+    except (ValueError, OSError, ClientException) as error:
+        _fail(str(error))
+    for gid, message in report.failures:
+        typer.echo(f"GID {gid}: {message}", err=True)
+    verb = "Would reorder" if dry_run else "Reordered"
+    typer.echo(
+        f"{verb} {report.items} downloads with {report.moves} moves in {report.requests} requests "
+        f"(one move at a time: {report.naive_requests} requests, {report.saved} saved)."
+    )
+    if report.failures:
+        raise typer.Exit(code=1)
+
+
+@app.command()
+def monitor():
+    """Logs download events and archives stopped results (runs until interrupted)."""
+    import time
+
+    from aria2p import ClientException
+
+    from pydownloader import events, history, rpc
+    from pydownloader.utils import setup_logger
+
+    settings = _load_settings()
+    setup_logger(settings.log_file)
+    # One listener per instance or node, each with its own bus so that a
+    # stop event reaches the purger of the daemon that holds the result
+    if settings.nodes:
+        from pydownloader import fleet
+
+        endpoints = [(fleet.ws_url(node), fleet.connect_node(node, settings.rpc_timeout)) for node in settings.nodes]
+    else:
+        endpoints = [(events.ws_url(settings, port=client.port), client) for client in rpc.connect_all(settings)]
+    try:
+        store = history.HistoryStore(settings.history_file)
+    except (OSError, ValueError) as error:
+        _fail(f"could not open {settings.history_file}: {error}")
+    listeners, purgers = [], []
+    for url, client in endpoints:
+        bus = events.EventBus()
+        events.log_events(bus)
+        purger = history.Purger(client, store, settings.purge)
+        bus.subscribe(events.ALL, purger.on_event)
+        listeners.append(events.NotificationListener(url, bus, client=client))
+        purgers.append(purger)
+    for listener in listeners:
+        listener.start()
+    next_pass = time.monotonic()
+    try:
+        while True:
+            due = time.monotonic() >= next_pass
+            for purger in purgers:
+                try:
+                    # Downloads stopped since the last tick go to the store in one transaction
+                    purger.flush()
+                    if due:
+                        purger.run_once()
+                except (OSError, ClientException) as error:
+                    typer.echo(f"Warning: purge of {purger.client.server} failed: {error}", err=True)
+            if due:
+                next_pass = time.monotonic() + history.PURGE_INTERVAL
+            time.sleep(history.FLUSH_INTERVAL)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for listener in listeners:
+            listener.stop()
+        store.close()
+
+
+@app.command()
+def purge(
+    purge_all: bool = typer.Option(False, "--all", help="Archive every stopped result, not only the oldest."),
+):
+    """Archives stopped results beyond `keep_results` and removes them from aria2c."""
+    from aria2p import ClientException
+
+    from pydownloader import history, pool
+
+    settings = _load_settings()
+    client = pool.connect(settings)
+    if settings.nodes:
+        client = client.healthy()
+    archived = 0
+    try:
+        with history.HistoryStore(settings.history_file) as store:
+            # Each daemon keeps its own stopped results
+            for daemon_client in getattr(client, "clients", [client]):
+                purger = history.Purger(daemon_client, store, settings.purge._replace(max_age=0))
+                archived += purger.run_once(keep=0 if purge_all else None)
+    except (OSError, ValueError, ClientException) as error:
+        _fail(str(error))
+    typer.echo(f"Archived {archived} stopped results to {settings.history_file}.")
+
+
+@app.command("history")
+def history_command(
+    since: Optional[str] = typer.Option(None, help="Only downloads finished since then, e.g. 2026-10-01 or 7d."),
+    until: Optional[str] = typer.Option(None, help="Only downloads finished before then."),
+    host: Optional[List[str]] = typer.Option(None, "--host", help="Only downloads from this host; repeatable."),
+    status: Optional[List[str]] = typer.Option(
+        None, "--status", help="Only these final statuses (complete, error, removed); repeatable."
+    ),
+    min_size: Optional[str] = typer.Option(None, help="Only downloads at least this large, e.g. 10M."),
+    max_size: Optional[str] = typer.Option(None, help="Only downloads at most this large."),
+    limit: int = typer.Option(50, min=1, help="Maximum number of downloads to show."),
+    stats: bool = typer.Option(False, "--stats", help="Show per-host throughput and failure rate instead."),
+):
+    """Searches the archived download history."""
+    from rich.console import Console
+    from rich.table import Table
+
+    from pydownloader import history
+    from pydownloader.bulk import STOPPED_STATUSES
+    from pydownloader.utils import format_size, parse_speed, truncate_url
+
+    unknown = set(status or ()) - STOPPED_STATUSES
+    if unknown:
+        _fail(f"unknown status: {', '.join(sorted(unknown))}")
+    try:
+        query = history.HistoryQuery(
+            since=history.parse_time(since) if since else None,
+            until=history.parse_time(until) if until else None,
+            hosts=tuple(h.lower() for h in host or ()),
+            statuses=tuple(status or ()),
+            min_size=parse_speed(min_size) if min_size else None,
+            max_size=parse_speed(max_size) if max_size else None,
+        )
+    except ValueError as error:
+        _fail(str(error))
+    settings = _load_settings()
+    if not settings.history_file.exists():
+        typer.echo("No history.")
+        return
+    try:
+        with history.HistoryStore(settings.history_file) as store:
+            rows = store.host_stats(query) if stats else store.search(query, limit)
+    except (OSError, ValueError) as error:
+        _fail(f"could not read {settings.history_file}: {error}")
+    if not rows:
+        typer.echo("No matching downloads.")
+        return
+
+    if stats:
+        table = Table("Host", "Downloads", "Failed", "Downloaded", "Throughput", box=None, pad_edge=False)
+        for entry in rows:
+            throughput = entry.throughput
+            table.add_row(
+                entry.host or "-",
+                str(entry.downloads),
+                f"{entry.failure_rate:.0%}",
+                format_size(entry.size),
+                f"{format_size(int(throughput))}/s" if throughput is not None else "-",
+            )
+    else:
+        from datetime import datetime
+
+        from pydownloader.utils import STATUS_ICONS
+
+        table = Table("Finished", "Status", "Size", "Time", "Speed", "URL", box=None, pad_edge=False)
+        for entry in rows:
+            table.add_row(
+                datetime.fromtimestamp(entry.finished_at).strftime("%Y-%m-%d %H:%M"),
+                STATUS_ICONS.get(entry.status, "?"),
+                format_size(entry.total_length),
+                f"{entry.duration:.0f}s" if entry.duration is not None else "-",
+                f"{format_size(int(entry.speed))}/s" if entry.speed is not None else "-",
+                truncate_url(entry.uris[0] if entry.uris else "", 60),
+            )
+    Console().print(table)
+
+
+@app.command()
+def scheduler(
+    follow: bool = typer.Option(
+        False, "--follow", help="Stay resident and apply limits at each schedule boundary."
+    ),
+    interval: Optional[float] = typer.Option(
+        None, help="Seconds between aria2c restart checks in --follow mode [default: 30]."
+    ),
+):
+    """Applies the scheduled speed limit (once, or continuously with --follow)."""
+    from aria2p import ClientException
+
+    from pydownloader import pool
+    from pydownloader import scheduler as scheduler_module
+    from pydownloader.utils import setup_logger
+
+    settings = _load_settings()
+    setup_logger(settings.log_file)
+    if not follow:
+        try:
+            scheduler_module.run_once(settings)
+        except (OSError, ClientException) as error:
+            _fail(f"could not reach aria2c: {error}")
+        return
+
+    def apply_priority(window):
+        scheduler_module.apply_priority(settings, window)
+
+    follower = scheduler_module.ScheduleFollower(
+        settings.schedule,
+        pool.connect(settings),
+        check_interval=interval or scheduler_module.DEFAULT_CHECK_INTERVAL,
+        on_priority=apply_priority if settings.schedule.priority_keys else None,
+    )
+    try:
+        follower.run()
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    """Entry point for the `pydownloader` console script."""
+    app()
@@ -1,7 +1,16 @@
+import hashlib
+import marshal
 import os
 from configparser import ConfigParser
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydownloader.daemon import DEFAULT_MAX_DOWNLOAD_RESULT, DEFAULT_SAVE_SESSION_INTERVAL, default_session_dir
+from pydownloader.fleet import Node, parse_node
+from pydownloader.history import PurgePolicy, default_history_file
+from pydownloader.priority import ProcessPriority, load_priority
+from pydownloader.scheduler import CompiledSchedule, ScheduleEntry, parse_schedule, schedule_items
+from pydownloader.utils import parse_speed
 
 # Define the names of the config files we'll look for
 CONFIG_FILES = ["config.ini", ".pydownloader.ini"]
@@ -15,6 +24,94 @@ REQUIRED_SECTIONS = {
     ],
     "schedules": [],
 }
+DEFAULT_RPC_HOST = "localhost"
+DEFAULT_RPC_TIMEOUT = 30.0
+# How new downloads are spread over several aria2c instances
+SHARD_STRATEGIES = ("host", "load")
+# Bump whenever the layout of the cached settings snapshot changes
+CACHE_VERSION = 8
+
+
+class ConfigError(ValueError):
+    """
+    Raised when one or more configuration values are malformed.
+
+    Attributes:
+        errors: One message per invalid value.
+    """
+
+    def __init__(self, errors: List[str]):
+        super().__init__("Invalid configuration:\n  " + "\n  ".join(errors))
+        self.errors = errors
+
+
+class Settings:
+    """
+    The validated, typed application settings.
+
+    Values are converted once at load time: speeds are integer bytes/sec,
+    ports and counts are ints, paths are `Path` objects and the schedules are
+    compiled. Instances are immutable.
+    """
+
+    __slots__ = (
+        "dest_folder",
+        "username",
+        "password",
+        "connections",
+        "max_download_speed",
+        "log_file",
+        "rpc_host",
+        "rpc_port",
+        "rpc_secret",
+        "rpc_timeout",
+        "instances",
+        "shard_by",
+        "nodes",
+        "session_dir",
+        "save_session_interval",
+        "priority",
+        "history_file",
+        "purge",
+        "schedule",
+    )
+
+    dest_folder: Path
+    username: str
+    password: str
+    connections: int
+    max_download_speed: int
+    log_file: Optional[Path]
+    rpc_host: str
+    rpc_port: int
+    rpc_secret: str
+    rpc_timeout: float
+    instances: int
+    shard_by: str
+    nodes: Tuple[Node, ...]
+    session_dir: Path
+    save_session_interval: int
+    priority: ProcessPriority
+    history_file: Path
+    purge: PurgePolicy
+    schedule: CompiledSchedule
+
+    def __init__(self, **values: Any):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("Settings are read-only")
+
+    def __delattr__(self, name: str):
+        raise AttributeError("Settings are read-only")
+
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{name}={'***' if name in ('password', 'rpc_secret') else repr(getattr(self, name))}"
+            for name in self.__slots__
+        )
+        return f"Settings({fields})"
 
 
 def find_config_file(search_paths: List[Path]) -> Optional[Path]:
@@ -68,6 +165,7 @@ def load_config(search_paths: Optional[List[Path]] = None) -> ConfigParser:
     Raises:
         FileNotFoundError: If no configuration file can be found.
         ValueError: If the configuration is invalid (missing sections/keys).
+        ConfigError: If any value is malformed.
     """
     if search_paths is None:
         # Default search paths: user's home and current directory
@@ -82,5 +180,266 @@ def load_config(search_paths: Optional[List[Path]] = None) -> ConfigParser:
     config.read(config_file_path)
 
     validate_config(config)
+    # The daemon commands read the parser directly, so check every value here
+    # for them to fail at load time like the commands that use Settings
+    parse_settings(config)
+
+    return config
+
+def _int_option(config: ConfigParser, key: str, default: int, minimum: int, maximum: int, errors: List[str]) -> int:
+    raw = config.get("settings", key, fallback=str(default))
+    try:
+        value = int(raw)
+    except ValueError:
+        errors.append(f"'{key}' must be an integer, got '{raw}'")
+        return default
+    if not minimum <= value <= maximum:
+        errors.append(f"'{key}' must be between {minimum} and {maximum}, got {value}")
+    return value
+
+
+def parse_settings(config: ConfigParser) -> Settings:
+    """
+    Converts a validated ConfigParser into a typed Settings object.
+
+    Every value is checked before raising, so a single error lists all of the
+    problems in the file.
+
+    Args:
+        config: A ConfigParser that passed `validate_config`.
+
+    Returns:
+        The typed settings.
+
+    Raises:
+        ConfigError: If any value is malformed.
+    """
+    return _resolve_defaults(_parse_values(config))
+
+
+def _parse_values(config: ConfigParser) -> Dict[str, Any]:
+    errors: List[str] = []
+
+    try:
+        max_download_speed = parse_speed(config.get("settings", "max_download_speed"))
+    except ValueError as error:
+        errors.append(f"'max_download_speed': {error}")
+        max_download_speed = 0
+
+    entries = []
+    for key, value in schedule_items(config):
+        try:
+            entries.append(parse_schedule(value))
+        except ValueError as error:
+            errors.append(f"'{key}' in section 'schedules': {error}")
+
+    connections = _int_option(config, "connections", 8, 1, 16, errors)
+    instances = _int_option(config, "instances", 1, 1, 64, errors)
+    shard_by = config.get("settings", "shard_by", fallback="host").strip() or "host"
+    if shard_by not in SHARD_STRATEGIES:
+        errors.append(f"'shard_by' must be one of {', '.join(SHARD_STRATEGIES)}, got '{shard_by}'")
+    rpc_port = _int_option(config, "rpc_port", 6800, 1, 65535, errors)
+    # 0 disables autosave; the session is still saved when aria2c exits
+    save_session_interval = _int_option(
+        config, "save_session_interval", DEFAULT_SAVE_SESSION_INTERVAL, 0, 86400, errors
+    )
+
+    max_download_result = _int_option(
+        config, "max_download_result", DEFAULT_MAX_DOWNLOAD_RESULT, 1, 10_000_000, errors
+    )
+    keep_results = _int_option(config, "keep_results", PurgePolicy().keep, 0, 10_000_000, errors)
+    if keep_results >= max_download_result:
+        # aria2c would drop results before they could be archived
+        errors.append(
+            f"'keep_results' ({keep_results}) must be less than 'max_download_result' ({max_download_result})"
+        )
+    archive_after = _int_option(config, "archive_after", 0, 0, 10 * 365 * 86400, errors)
+    try:
+        archive_on_complete = config.getboolean("settings", "archive_on_complete", fallback=False)
+    except ValueError:
+        errors.append(
+            f"'archive_on_complete' must be yes or no, got '{config.get('settings', 'archive_on_complete')}'"
+        )
+        archive_on_complete = False
+
+    try:
+        priority = load_priority(config)
+    except ValueError as error:
+        errors.append(str(error))
+        priority = ProcessPriority()
+
+    nodes = []
+    if config.has_section("nodes"):
+        for name, value in config.items("nodes"):
+            try:
+                nodes.append(parse_node(name, value, config.get("settings", "rpc_secret", fallback="")))
+            except ValueError as error:
+                errors.append(f"'{name}' in section 'nodes': {error}")
+
+    raw_timeout = config.get("settings", "rpc_timeout", fallback=str(DEFAULT_RPC_TIMEOUT))
+    try:
+        rpc_timeout = float(raw_timeout)
+        if rpc_timeout <= 0:
+            raise ValueError
+    except ValueError:
+        errors.append(f"'rpc_timeout' must be a positive number of seconds, got '{raw_timeout}'")
+        rpc_timeout = DEFAULT_RPC_TIMEOUT
+
+    if errors:
+        raise ConfigError(errors)
+
+    # Blank paths stay None here and are resolved per run by _resolve_defaults,
+    # as the working directory and environment are not part of the cache key
+    dest_folder = config.get("settings", "dest_folder").strip()
+    log_file = config.get("settings", "log_file", fallback="").strip()
+    session_dir = config.get("settings", "session_dir", fallback="").strip()
+    history_file = config.get("settings", "history_file", fallback="").strip()
+    return dict(
+        dest_folder=Path(dest_folder).expanduser() if dest_folder else None,
+        username=config.get("settings", "username", fallback=""),
+        password=config.get("settings", "password", fallback=""),
+        connections=connections,
+        max_download_speed=max_download_speed,
+        log_file=Path(log_file).expanduser() if log_file else None,
+        rpc_host=config.get("settings", "rpc_host", fallback="").strip() or DEFAULT_RPC_HOST,
+        rpc_port=rpc_port,
+        rpc_secret=config.get("settings", "rpc_secret", fallback=""),
+        rpc_timeout=rpc_timeout,
+        instances=instances,
+        shard_by=shard_by,
+        nodes=tuple(nodes),
+        session_dir=Path(session_dir).expanduser() if session_dir else None,
+        save_session_interval=save_session_interval,
+        priority=priority,
+        history_file=Path(history_file).expanduser() if history_file else None,
+        purge=PurgePolicy(keep_results, archive_after, archive_on_complete),
+        schedule=CompiledSchedule(entries, max_download_speed),
+    )
+
+
+def _resolve_defaults(values: Dict[str, Any]) -> Settings:
+    # Blank paths fall back to aria2c's own default (the working directory)
+    if values["dest_folder"] is None:
+        values["dest_folder"] = Path.cwd()
+    if values["session_dir"] is None:
+        values["session_dir"] = default_session_dir()
+    if values["history_file"] is None:
+        values["history_file"] = default_history_file()
+    return Settings(**values)
+
+
+def cache_dir() -> Path:
+    """
+    Returns the directory holding compiled settings snapshots.
+
+    Returns:
+        `$XDG_CACHE_HOME/pydownloader`, or `~/.cache/pydownloader`.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "pydownloader"
+
+
+def _cache_file(config_path: Path) -> Path:
+    digest = hashlib.sha1(os.path.abspath(config_path).encode()).hexdigest()[:16]
+    return cache_dir() / f"settings-{digest}.bin"
+
+
+def _cache_key(stat: os.stat_result) -> tuple:
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def _dump_settings(values: Dict[str, Any]) -> dict:
+    values = dict(values)
+    values["dest_folder"] = str(values["dest_folder"]) if values["dest_folder"] else None
+    values["log_file"] = str(values["log_file"]) if values["log_file"] else None
+    values["nodes"] = [tuple(node) for node in values["nodes"]]
+    values["session_dir"] = str(values["session_dir"]) if values["session_dir"] else None
+    values["priority"] = tuple(values["priority"])
+    values["history_file"] = str(values["history_file"]) if values["history_file"] else None
+    values["purge"] = tuple(values["purge"])
+    values["schedule"] = [tuple(entry) for entry in values["schedule"].entries]
+    return values
+
+
+def _restore_settings(values: dict) -> Dict[str, Any]:
+    for name in ("dest_folder", "log_file", "session_dir", "history_file"):
+        values[name] = Path(values[name]) if values[name] else None
+    values["nodes"] = tuple(Node(*node) for node in values["nodes"])
+    values["priority"] = ProcessPriority(*values["priority"])
+    values["purge"] = PurgePolicy(*values["purge"])
+    entries = [ScheduleEntry(*entry) for entry in values["schedule"]]
+    values["schedule"] = CompiledSchedule(entries, values["max_download_speed"])
+    return values
+
+
+def _read_cache(config_path: Path, key: tuple) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_cache_file(config_path), "rb") as f:
+            version, cached_key, values = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != CACHE_VERSION or tuple(cached_key) != key:
+        return None
+    return _restore_settings(values)
+
+
+def _write_cache(config_path: Path, key: tuple, values: Dict[str, Any]):
+    path = _cache_file(config_path)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # The snapshot contains credentials, so keep it private to the user
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            marshal.dump((CACHE_VERSION, key, _dump_settings(values)), f)
+        os.replace(tmp_path, path)
+    except OSError:
+        # Caching is best-effort; a read-only home must not break the CLI
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def load_settings(search_paths: Optional[List[Path]] = None, use_cache: bool = True) -> Settings:
+    """
+    Loads, validates and converts the application configuration.
+
+    The validated settings are cached on disk, keyed by the config file's
+    path, mtime, size and inode. When the file is unchanged, loading costs a
+    stat and an unmarshal instead of parsing and validating the INI file.
+    Only values read from the file are cached; blank paths are resolved
+    against the current working directory and environment on every load.
+
+    Args:
+        search_paths: A list of directories to search for the config file.
+        use_cache: Whether to read and write the on-disk settings cache.
+
+    Returns:
+        The typed settings.
+
+    Raises:
+        FileNotFoundError: If no configuration file can be found.
+        ValueError: If the configuration is invalid.
+    """
+    if search_paths is None:
+        search_paths = [Path.home(), Path.cwd()]
+
+    config_file_path = find_config_file(search_paths)
+    if not config_file_path:
+        raise FileNotFoundError("Could not find a valid configuration file.")
+
+    key = _cache_key(config_file_path.stat())
+    if use_cache:
+        values = _read_cache(config_file_path, key)
+        if values is not None:
+            return _resolve_defaults(values)
+
+    config = ConfigParser()
+    config.read(config_file_path)
+    validate_config(config)
+    values = _parse_values(config)
 
-    return config
\ No newline at end of file
+    if use_cache:
+        _write_cache(config_file_path, key, values)
+    return _resolve_defaults(values)
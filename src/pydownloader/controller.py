@@ -0,0 +1,383 @@
+import asyncio
+import functools
+import logging
+from typing import AbstractSet, Any, AsyncIterator, Awaitable, Dict, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of RPC calls in flight per daemon
+DEFAULT_CONCURRENCY = 4
+# Seconds before a single RPC call is abandoned
+DEFAULT_CALL_TIMEOUT = 30.0
+# Status keys needed to render the download list
+LIST_KEYS = ["gid", "status", "totalLength", "completedLength", "files"]
+# Upper bound passed as `num` to tellWaiting/tellStopped to fetch everything
+QUEUE_LIMIT = 2 ** 31 - 1
+# Number of downloads fetched per tellWaiting/tellStopped call when paging
+DEFAULT_WINDOW = 500
+# The parts of the queue in `list` order and the statuses each one holds
+SEGMENTS = (
+    ("active", frozenset({"active"})),
+    ("waiting", frozenset({"waiting", "paused"})),
+    ("stopped", frozenset({"complete", "error", "removed"})),
+)
+
+
+class AsyncController:
+    """
+    An asyncio API over one aria2c daemon.
+
+    Each RPC call runs on the default executor, so independent calls proceed
+    concurrently. A semaphore bounds how many calls are in flight at once and
+    every call is subject to a timeout. Cancelling an awaiting task abandons
+    the call; the result of a request already on the wire is discarded.
+    """
+
+    def __init__(
+        self,
+        client,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        timeout: float = DEFAULT_CALL_TIMEOUT,
+        name: Optional[str] = None,
+    ):
+        """
+        Args:
+            client: A (thread-safe) aria2p client.
+            concurrency: Maximum number of concurrent RPC calls.
+            timeout: Seconds before a call raises `asyncio.TimeoutError`.
+            name: A label for the daemon, used when driving several at once.
+        """
+        self.client = client
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.name = name or str(getattr(client, "server", "aria2c"))
+        # Created lazily so that it binds to the running event loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """
+        Calls an aria2p client method without blocking the event loop.
+
+        Args:
+            method: The client method name, e.g. "tell_active".
+            *args: Positional arguments for the method.
+            **kwargs: Keyword arguments for the method.
+
+        Returns:
+            The method's return value.
+
+        Raises:
+            asyncio.TimeoutError: If the call takes longer than the timeout.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        func = functools.partial(getattr(self.client, method), *args, **kwargs)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await asyncio.wait_for(loop.run_in_executor(None, func), self.timeout)
+
+    async def _list_segments(self, keys: List[str]) -> Tuple[List[dict], List[dict], List[dict]]:
+        return await asyncio.gather(
+            self.call("tell_active", keys=keys),
+            self.call("tell_waiting", 0, QUEUE_LIMIT, keys=keys),
+            self.call("tell_stopped", 0, QUEUE_LIMIT, keys=keys),
+        )
+
+    async def list_downloads(self, keys: Sequence[str] = LIST_KEYS) -> List[dict]:
+        """
+        Fetches active, waiting and stopped downloads concurrently.
+
+        Args:
+            keys: The status keys to request.
+
+        Returns:
+            Active downloads, then waiting, then stopped, in queue order.
+        """
+        active, waiting, stopped = await self._list_segments(list(keys))
+        return active + waiting + stopped
+
+    async def _fetch_segment(self, segment: str, offset: int, num: int, keys: List[str]) -> List[dict]:
+        if segment == "active":
+            # tellActive cannot be paged, but it is bounded by max-concurrent-downloads
+            return (await self.call("tell_active", keys=keys))[offset:offset + num]
+        return await self.call(f"tell_{segment}", offset, num, keys=keys)
+
+    async def iter_rows(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        statuses: Optional[AbstractSet[str]] = None,
+        keys: Sequence[str] = LIST_KEYS,
+        window: int = DEFAULT_WINDOW,
+    ) -> AsyncIterator[List[Tuple[int, dict]]]:
+        """
+        Pages through the queue, yielding one window of rows at a time.
+
+        Rows are numbered across active, waiting and stopped downloads exactly
+        as in the full `list` output, whatever the offset or filter. Only
+        `window` downloads are held at once. When no status filter applies to
+        a part of the queue, the offset is skipped without fetching.
+
+        Args:
+            offset: Number of matching rows to skip.
+            limit: Maximum number of rows to yield; None for all.
+            statuses: Only yield downloads with these statuses; None for all.
+            keys: The status keys to request.
+            window: Number of downloads requested per RPC call.
+
+        Yields:
+            Lists of (row number, download) pairs.
+        """
+        async for _, rows in _iter_blocks([self], offset, limit, statuses, keys, window):
+            yield rows
+
+    async def map(self, method: str, gids: Sequence[str], *args: Any) -> List[Union[Any, BaseException]]:
+        """
+        Calls a per-download method for many GIDs concurrently.
+
+        Failures are returned in place of results rather than raised, so that
+        one bad GID does not abort the others.
+
+        Args:
+            method: The client method name, e.g. "remove".
+            gids: The downloads to act on.
+            *args: Extra arguments passed after the GID.
+
+        Returns:
+            One result or exception per GID, in order.
+        """
+        return await asyncio.gather(*(self.call(method, gid, *args) for gid in gids), return_exceptions=True)
+
+    async def status(self, gid: str, keys: Sequence[str] = LIST_KEYS) -> dict:
+        """
+        Fetches the current status of one download.
+
+        Args:
+            gid: The download.
+            keys: The status keys to request.
+
+        Returns:
+            Its status dict.
+        """
+        return await self.call("tell_status", gid, keys=list(keys))
+
+    async def remove(self, download: dict) -> Any:
+        """
+        Removes a download, or forgets its result if it has already stopped.
+
+        Args:
+            download: A status dict with `gid` and `status`.
+
+        Returns:
+            The RPC result.
+        """
+        if download["status"] in ("complete", "error", "removed"):
+            return await self.call("remove_download_result", download["gid"])
+        return await self.call("remove", download["gid"])
+
+    async def move(self, gid: str, position: int) -> int:
+        """
+        Moves a waiting download to an absolute position in the waiting queue.
+
+        Args:
+            gid: The download to move.
+            position: The 0-based target position.
+
+        Returns:
+            The resulting position.
+        """
+        return await self.call("change_position", gid, position, "POS_SET")
+
+
+async def _iter_blocks(
+    controllers: Sequence[AsyncController],
+    offset: int,
+    limit: Optional[int],
+    statuses: Optional[AbstractSet[str]],
+    keys: Sequence[str],
+    window: int,
+) -> AsyncIterator[Tuple[AsyncController, List[Tuple[int, dict]]]]:
+    # Each part of the queue lists the downloads of every daemon in turn
+    keys = list(keys)
+    stats = await asyncio.gather(*(c.call("get_global_stat") for c in controllers))
+    sizes = [
+        {"active": int(stat["numActive"]), "waiting": int(stat["numWaiting"]), "stopped": int(stat["numStopped"])}
+        for stat in stats
+    ]
+    skip, remaining = offset, limit
+    first_row = 1
+    for segment, segment_statuses in SEGMENTS:
+        wanted = segment_statuses if statuses is None else segment_statuses & statuses
+        unfiltered = wanted == segment_statuses
+        for ctl, size in zip(controllers, (s[segment] for s in sizes)):
+            position = 0
+            if unfiltered:
+                position = min(skip, size)
+                skip -= position
+            while wanted and position < size and remaining != 0:
+                num = min(window, remaining) if unfiltered and remaining is not None else window
+                page = await ctl._fetch_segment(segment, position, num, keys)
+                if not page:
+                    break
+                rows = []
+                for index, download in enumerate(page):
+                    if download["status"] not in wanted:
+                        continue
+                    if skip:
+                        skip -= 1
+                        continue
+                    rows.append((first_row + position + index, download))
+                    if remaining is not None:
+                        remaining -= 1
+                        if remaining == 0:
+                            break
+                if rows:
+                    yield ctl, rows
+                position += len(page)
+            first_row += size
+
+
+class ControllerGroup:
+    """
+    One merged queue over several aria2c instances.
+
+    It offers the listing and editing coroutines of AsyncController. Rows list
+    the active downloads of every instance, then the waiting ones, then the
+    stopped ones, each part in instance order. Every download seen is recorded
+    in the pool's GID index so that later calls reach the right instance.
+    """
+
+    def __init__(self, pool, concurrency: int = DEFAULT_CONCURRENCY, timeout: float = DEFAULT_CALL_TIMEOUT):
+        """
+        Args:
+            pool: A `pool.DaemonPool`.
+            concurrency: Maximum number of concurrent RPC calls per instance.
+            timeout: Seconds before a call raises `asyncio.TimeoutError`.
+        """
+        self.client = pool
+        self.controllers = [
+            AsyncController(client, concurrency, timeout, name=str(client.server)) for client in pool.clients
+        ]
+
+    def _owner(self, gid: str) -> AsyncController:
+        if gid not in self.client.owners:
+            raise ValueError(f"Download {gid} is not in the queue")
+        return self.controllers[self.client.owners[gid]]
+
+    def _record(self, ctl: AsyncController, downloads: List[dict]):
+        index = self.controllers.index(ctl)
+        for download in downloads:
+            self.client.owners[download["gid"]] = index
+
+    async def list_downloads(self, keys: Sequence[str] = LIST_KEYS) -> List[dict]:
+        """
+        Fetches the downloads of every instance concurrently.
+
+        Args:
+            keys: The status keys to request; must include "gid".
+
+        Returns:
+            Active downloads, then waiting, then stopped, in merged queue order.
+        """
+        parts = await asyncio.gather(*(c._list_segments(list(keys)) for c in self.controllers))
+        merged: List[dict] = []
+        for segment in range(len(SEGMENTS)):
+            for ctl, segments in zip(self.controllers, parts):
+                self._record(ctl, segments[segment])
+                merged.extend(segments[segment])
+        return merged
+
+    async def iter_rows(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        statuses: Optional[AbstractSet[str]] = None,
+        keys: Sequence[str] = LIST_KEYS,
+        window: int = DEFAULT_WINDOW,
+    ) -> AsyncIterator[List[Tuple[int, dict]]]:
+        """Pages through the merged queue; see `AsyncController.iter_rows`."""
+        async for ctl, rows in _iter_blocks(self.controllers, offset, limit, statuses, keys, window):
+            self._record(ctl, [download for _, download in rows])
+            yield rows
+
+    async def status(self, gid: str, keys: Sequence[str] = LIST_KEYS) -> dict:
+        """Fetches the current status of a download from the instance that owns it."""
+        return await self._owner(gid).status(gid, keys)
+
+    async def remove(self, download: dict) -> Any:
+        """Removes a download (or its result) on the instance that owns it."""
+        return await self._owner(download["gid"]).remove(download)
+
+    async def move(self, gid: str, position: int) -> int:
+        """
+        Moves a waiting download to a position in the merged waiting queue.
+
+        A download cannot change instance, so the position is clamped to the
+        owning instance's part of the waiting queue.
+
+        Args:
+            gid: The download to move.
+            position: The 0-based target position in the merged queue.
+
+        Returns:
+            The resulting position in the merged queue.
+        """
+        owner = self._owner(gid)
+        stats = await asyncio.gather(*(c.call("get_global_stat") for c in self.controllers))
+        start = sum(int(stat["numWaiting"]) for stat in stats[:self.controllers.index(owner)])
+        size = int(stats[self.controllers.index(owner)]["numWaiting"])
+        local = min(max(position - start, 0), max(size - 1, 0))
+        return start + await owner.move(gid, local)
+
+
+async def fan_out(
+    controllers: Sequence[AsyncController], method: str, *args: Any, **kwargs: Any
+) -> Dict[str, Union[Any, BaseException]]:
+    """
+    Runs the same controller coroutine on several daemons concurrently.
+
+    Args:
+        controllers: The daemons to query.
+        method: The AsyncController coroutine name, e.g. "list_downloads".
+        *args: Positional arguments for the coroutine.
+        **kwargs: Keyword arguments for the coroutine.
+
+    Returns:
+        The result (or the exception raised) per controller name.
+    """
+    results = await asyncio.gather(
+        *(getattr(c, method)(*args, **kwargs) for c in controllers), return_exceptions=True
+    )
+    return {c.name: result for c, result in zip(controllers, results)}
+
+
+def run(awaitable: Awaitable) -> Any:
+    """
+    Runs a controller coroutine to completion from synchronous code.
+
+    Args:
+        awaitable: The coroutine to run.
+
+    Returns:
+        Its result.
+    """
+    return asyncio.run(awaitable)
+
+
+def resolve_row(downloads: List[dict], row: int) -> Tuple[int, dict]:
+    """
+    Finds the download shown at a 1-based row of the `list` table.
+
+    Args:
+        downloads: The downloads in list order.
+        row: The row number.
+
+    Returns:
+        The 0-based index and the download.
+
+    Raises:
+        ValueError: If the row does not exist.
+    """
+    if not 1 <= row <= len(downloads):
+        raise ValueError(f"Row {row} does not exist (the queue has {len(downloads)} rows)")
+    return row - 1, downloads[row - 1]
@@ -0,0 +1,1035 @@
+import logging
+import os
+import subprocess
+import time
+from configparser import ConfigParser
+from contextlib import contextmanager, suppress
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Where the PID of the running aria2c daemon is recorded by default
+DEFAULT_PID_FILE = Path.home() / ".pydownloader.pid"
+# Seconds `start` waits for the RPC interface to answer
+DEFAULT_READY_TIMEOUT = 10.0
+# First and largest delay between readiness probes
+_PROBE_DELAY = 0.01
+_MAX_PROBE_DELAY = 0.5
+# State of a listening socket in /proc/net/tcp
+_TCP_LISTEN = "0A"
+# Seconds between automatic session saves by aria2c
+DEFAULT_SAVE_SESSION_INTERVAL = 60
+# Stopped results aria2c keeps in memory (aria2c's own default)
+DEFAULT_MAX_DOWNLOAD_RESULT = 1000
+# Seconds `stop` allows aria2c to shut down cleanly over RPC
+DEFAULT_STOP_TIMEOUT = 10.0
+# Seconds allowed for each later, less gentle, stop step
+_ESCALATION_TIMEOUT = 3.0
+# Position of the start time (clock ticks since boot) in /proc/<pid>/stat
+_STAT_START_TIME = 22
+# aria2c accepts at most 16 connections per server
+_MAX_CONNECTIONS = 16
+# File systems on which fallocate() reserves space without writing zeros
+_FALLOC_FILESYSTEMS = frozenset({"ext4", "xfs", "btrfs", "f2fs", "tmpfs", "bcachefs", "ocfs2", "gfs2"})
+# Smallest and largest per-instance disk cache, in MiB
+_MIN_DISK_CACHE = 16
+_MAX_DISK_CACHE = 256
+# Options that build_command sets itself and [aria2] may not override
+_MANAGED_OPTIONS = frozenset(
+    {
+        "enable-rpc",
+        "rpc-listen-port",
+        "rpc-secret",
+        "dir",
+        "daemon",
+        "input-file",
+        "save-session",
+        "save-session-interval",
+        "max-download-result",
+    }
+)
+
+
+def instance_count(config: ConfigParser) -> int:
+    """
+    Returns how many aria2c instances the configuration asks for.
+
+    Args:
+        config: The loaded configuration.
+
+    Returns:
+        The `instances` setting, 1 if unset.
+    """
+    return config.getint("settings", "instances", fallback=1)
+
+
+def default_session_dir() -> Path:
+    """
+    Returns the default directory for aria2c session files.
+
+    Returns:
+        `$XDG_STATE_HOME/pydownloader`, or `~/.local/state/pydownloader`.
+    """
+    base = os.environ.get("XDG_STATE_HOME") or Path.home() / ".local" / "state"
+    return Path(base) / "pydownloader"
+
+
+def session_file(config: ConfigParser, index: int = 0) -> Path:
+    """
+    Returns the session file of one daemon instance.
+
+    Args:
+        config: The loaded configuration.
+        index: The 0-based instance number.
+
+    Returns:
+        `session-N.txt` in `session_dir`.
+    """
+    folder = config.get("settings", "session_dir", fallback="").strip()
+    return (Path(folder).expanduser() if folder else default_session_dir()) / f"session-{index}.txt"
+
+
+def count_session_entries(path: Path) -> int:
+    """
+    Counts the downloads in an aria2c session file.
+
+    Each download is a line of URIs followed by indented option lines, so
+    only the unindented lines are counted.
+
+    Args:
+        path: The session file.
+
+    Returns:
+        The number of downloads; 0 if the file does not exist.
+    """
+    try:
+        with open(path, "rb") as f:
+            return sum(1 for line in f if line[:1] not in (b" ", b"\t", b"\n", b"\r", b"#", b""))
+    except FileNotFoundError:
+        return 0
+
+
+def prepare_session(path: Path) -> int:
+    """
+    Makes a session file ready to be loaded by a starting daemon.
+
+    A missing file is created empty, since aria2c refuses a missing
+    `--input-file`. An existing one is first copied to `<name>.bak`, so that
+    a daemon that fails during startup and saves an empty session cannot
+    lose the queue. The copy is written to a temporary file and renamed, so
+    a crash never leaves a truncated backup.
+
+    Args:
+        path: The session file.
+
+    Returns:
+        The number of downloads that will be restored.
+    """
+    import shutil
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    entries = count_session_entries(path)
+    if entries:
+        backup = path.with_name(path.name + ".bak")
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        shutil.copyfile(path, tmp_path)
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, backup)
+    elif not path.exists():
+        path.touch(mode=0o600)
+    return entries
+
+
+class HostFacts(NamedTuple):
+    """What the aria2c tuning profile is derived from."""
+
+    # File system type of the download folder; "" if unknown
+    fs_type: str
+    # Memory available without swapping, in bytes; 0 if unknown
+    available_memory: int
+    # CPUs this process may run on
+    cpus: int
+    # Whether /etc/resolv.conf lists a name server
+    nameservers: bool
+
+
+class TunedOption(NamedTuple):
+    """One aria2c option of the tuning profile."""
+
+    value: str
+    # Why the value was chosen, shown by `start --explain`
+    reason: str
+
+
+def filesystem_type(path: str) -> str:
+    """
+    Finds the type of the file system a path is on, from /proc/self/mounts.
+
+    Args:
+        path: The path; it need not exist yet.
+
+    Returns:
+        The type of the innermost mount containing the path, e.g. "ext4";
+        "" if it cannot be determined.
+    """
+    path = os.path.realpath(path)
+    best, fs_type = "", ""
+    try:
+        with open("/proc/self/mounts") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount = fields[1].replace("\\040", " ")
+                inside = path == mount or path.startswith(mount.rstrip("/") + "/")
+                # Later lines win: they are mounted over earlier ones
+                if inside and len(mount) >= len(best):
+                    best, fs_type = mount, fields[2]
+    except OSError:
+        return ""
+    return fs_type
+
+
+def _available_memory() -> int:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return 0
+
+
+def _has_nameservers() -> bool:
+    try:
+        with open("/etc/resolv.conf") as f:
+            return any(line.split()[:1] == ["nameserver"] for line in f)
+    except OSError:
+        return False
+
+
+def host_facts(dest_folder: str) -> HostFacts:
+    """
+    Gathers the host facts the tuning profile depends on.
+
+    Args:
+        dest_folder: The download folder.
+
+    Returns:
+        The facts about this host.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return HostFacts(filesystem_type(dest_folder), _available_memory(), cpus, _has_nameservers())
+
+
+def tune(config: ConfigParser, facts: Optional[HostFacts] = None) -> Dict[str, TunedOption]:
+    """
+    Chooses aria2c's throughput-related options for this config and host.
+
+    Every value can be overridden in the `[aria2]` section, which may also
+    set any other aria2c option (without the leading dashes).
+
+    Args:
+        config: The loaded configuration.
+        facts: Facts about the host; gathered for `dest_folder` if None.
+
+    Returns:
+        aria2c option name -> chosen value and the reason for it, in
+        command line order.
+
+    Raises:
+        ValueError: If `[aria2]` sets an option pydownloader manages itself.
+    """
+    if facts is None:
+        facts = host_facts(config.get("settings", "dest_folder"))
+    instances = instance_count(config)
+    profile: Dict[str, TunedOption] = {}
+
+    connections = config.getint("settings", "connections", fallback=_MAX_CONNECTIONS)
+    connections = max(1, min(connections, _MAX_CONNECTIONS))
+    profile["max-connection-per-server"] = TunedOption(str(connections), "the `connections` setting (at most 16)")
+    profile["split"] = TunedOption(str(connections), "one segment per connection")
+    profile["min-split-size"] = TunedOption("4M", "lets files from 8 MiB up use several connections")
+    profile["piece-length"] = TunedOption("1M", "an interrupted segment loses at most 1 MiB")
+
+    concurrent = max(5, min(16, 2 * facts.cpus // instances))
+    profile["max-concurrent-downloads"] = TunedOption(
+        str(concurrent), f"2 per CPU ({facts.cpus}) per instance ({instances}), between 5 and 16"
+    )
+    if facts.available_memory:
+        cache = facts.available_memory // 64 // instances // (1024 * 1024)
+        cache = max(_MIN_DISK_CACHE, min(cache, _MAX_DISK_CACHE))
+        reason = f"1/64 of available memory per instance, between {_MIN_DISK_CACHE}M and {_MAX_DISK_CACHE}M"
+    else:
+        cache, reason = _MIN_DISK_CACHE, "available memory is unknown"
+    profile["disk-cache"] = TunedOption(f"{cache}M", reason)
+
+    if facts.fs_type in _FALLOC_FILESYSTEMS:
+        profile["file-allocation"] = TunedOption("falloc", f"{facts.fs_type} reserves space without writing it")
+    else:
+        profile["file-allocation"] = TunedOption(
+            "none", f"{facts.fs_type or 'unknown file system'}: preallocating would write every file twice"
+        )
+    if facts.nameservers:
+        profile["async-dns"] = TunedOption("true", "/etc/resolv.conf lists name servers")
+    else:
+        profile["async-dns"] = TunedOption("false", "no name servers in /etc/resolv.conf; use the system resolver")
+
+    if config.has_section("aria2"):
+        for option, value in config.items("aria2"):
+            option = option.lstrip("-")
+            if option in _MANAGED_OPTIONS:
+                raise ValueError(f"'{option}' in section 'aria2' is set by pydownloader and cannot be overridden")
+            profile[option] = TunedOption(value, "set in [aria2]")
+    return profile
+
+
+def build_command(
+    config: ConfigParser,
+    index: int = 0,
+    foreground: bool = False,
+    profile: Optional[Dict[str, TunedOption]] = None,
+) -> List[str]:
+    """
+    Builds the aria2c command line for one daemon instance.
+
+    Instance N listens on `rpc_port + N`. When several instances are
+    configured, each one downloads into its own `instance-N` subdirectory of
+    `dest_folder`, so that instances never write to the same file.
+
+    Each instance restores its queue from its session file at startup and
+    saves it back every `save_session_interval` seconds and on exit. It keeps
+    at most `max_download_result` stopped results in memory; `monitor` and
+    `purge` archive older ones before aria2c drops them.
+
+    Args:
+        config: The loaded configuration.
+        index: The 0-based instance number.
+        foreground: Keep aria2c in the foreground (for a supervisor, which
+            must be its parent to wait on it) instead of `--daemon=true`.
+        profile: The tuned aria2c options; from `tune` if None.
+
+    Returns:
+        The command as a list of arguments.
+
+    Raises:
+        ValueError: If `[aria2]` overrides an option set here.
+    """
+    port = config.getint("settings", "rpc_port") + index
+    session = session_file(config, index)
+    interval = config.getint("settings", "save_session_interval", fallback=DEFAULT_SAVE_SESSION_INTERVAL)
+    max_results = config.getint("settings", "max_download_result", fallback=DEFAULT_MAX_DOWNLOAD_RESULT)
+    dest_folder = config.get("settings", "dest_folder")
+    if instance_count(config) > 1:
+        dest_folder = os.path.join(dest_folder, f"instance-{index}")
+    command = [
+        "aria2c",
+        "--enable-rpc",
+        f"--rpc-listen-port={port}",
+        f"--dir={dest_folder}",
+        "--daemon=false" if foreground else "--daemon=true",
+        f"--input-file={session}",
+        f"--save-session={session}",
+        f"--save-session-interval={interval}",
+        f"--max-download-result={max_results}",
+    ]
+    secret = config.get("settings", "rpc_secret", fallback="")
+    if secret:
+        command.append(f"--rpc-secret={secret}")
+    if profile is None:
+        profile = tune(config)
+    command.extend(f"--{option}={tuned.value}" for option, tuned in profile.items())
+    return command
+
+
+def call(port: int, secret: str, method: str, timeout: float = 1.0):
+    """
+    Calls an RPC method without parameters on a local daemon.
+
+    A raw HTTP request is used instead of aria2p to keep daemon management
+    light.
+
+    Args:
+        port: The RPC port.
+        secret: The RPC secret.
+        method: The method, e.g. "aria2.saveSession".
+        timeout: Socket timeout in seconds.
+
+    Returns:
+        The method's result.
+
+    Raises:
+        OSError: If the daemon does not accept connections.
+        ValueError: If it answers with an error, e.g. a wrong secret.
+    """
+    # Imported here so that `status`, which imports this module, stays fast
+    import http.client
+    import json
+
+    params = [f"token:{secret}"] if secret else []
+    body = json.dumps({"jsonrpc": "2.0", "id": "pydownloader", "method": method, "params": params})
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    try:
+        connection.request("POST", "/jsonrpc", body, {"Content-Type": "application/json"})
+        response = json.loads(connection.getresponse().read())
+    except http.client.HTTPException as error:
+        raise ConnectionError(str(error)) from error
+    finally:
+        connection.close()
+    if "error" in response:
+        raise ValueError(f"aria2c refused {method}: {response['error'].get('message')}")
+    return response["result"]
+
+
+def probe(port: int, secret: str = "", timeout: float = 1.0) -> str:
+    """
+    Calls `aria2.getVersion` on a local daemon once.
+
+    Args:
+        port: The RPC port.
+        secret: The RPC secret.
+        timeout: Socket timeout in seconds.
+
+    Returns:
+        The aria2c version.
+
+    Raises:
+        OSError: If the daemon does not accept connections yet.
+        ValueError: If it answers with an error, e.g. a wrong secret.
+    """
+    return call(port, secret, "aria2.getVersion", timeout)["version"]
+
+
+def wait_until_ready(
+    port: int,
+    secret: str = "",
+    timeout: float = DEFAULT_READY_TIMEOUT,
+    process: Optional[subprocess.Popen] = None,
+    clock: Callable[[], float] = time.monotonic,
+    sleep: Callable[[float], None] = time.sleep,
+) -> float:
+    """
+    Polls a freshly started daemon until its RPC interface answers.
+
+    Probes start 10 ms apart and back off exponentially to 0.5 s, so a fast
+    start is noticed almost immediately without busy-polling a slow one.
+
+    Args:
+        port: The RPC port.
+        secret: The RPC secret.
+        timeout: Seconds to wait before giving up.
+        process: The launched aria2c. If it exits with an error (e.g. the
+            port is taken), waiting stops at once.
+        clock: Returns a monotonic time in seconds.
+        sleep: Sleeps for the given number of seconds.
+
+    Returns:
+        Seconds until the daemon was ready.
+
+    Raises:
+        TimeoutError: If the daemon is not ready within the timeout.
+        RuntimeError: If aria2c exited with an error.
+        ValueError: If aria2c rejects the RPC secret.
+    """
+    started = clock()
+    delay = _PROBE_DELAY
+    while True:
+        remaining = timeout - (clock() - started)
+        try:
+            probe(port, secret, timeout=max(min(remaining, 1.0), 0.01))
+            return clock() - started
+        except OSError as error:
+            last_error = error
+        if process is not None and process.poll():
+            raise RuntimeError(f"aria2c exited with status {process.returncode}")
+        if clock() - started + delay > timeout:
+            raise TimeoutError(f"aria2c was not ready on port {port} after {timeout:g}s: {last_error}")
+        sleep(delay)
+        delay = min(delay * 2, _MAX_PROBE_DELAY)
+
+
+def _listening_inodes(port: int) -> set:
+    inodes = set()
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(table, "r") as f:
+                lines = f.readlines()[1:]
+        except OSError:
+            continue
+        for line in lines:
+            fields = line.split()
+            if fields[3] == _TCP_LISTEN and int(fields[1].rsplit(":", 1)[1], 16) == port:
+                inodes.add(fields[9])
+    return inodes
+
+
+def find_listener_pid(port: int) -> Optional[int]:
+    """
+    Finds the process listening on a local TCP port (Linux only).
+
+    `aria2c --daemon=true` forks and the launched process exits, so the PID
+    returned by Popen is not the daemon's. The daemon is the process that
+    owns the RPC socket.
+
+    Args:
+        port: The TCP port.
+
+    Returns:
+        The PID, or None if it cannot be determined (e.g. no /proc).
+    """
+    import glob
+
+    inodes = _listening_inodes(port)
+    if not inodes:
+        return None
+    targets = {f"socket:[{inode}]" for inode in inodes}
+    for fd_dir in glob.glob("/proc/[0-9]*/fd"):
+        try:
+            for fd in os.listdir(fd_dir):
+                if os.readlink(os.path.join(fd_dir, fd)) in targets:
+                    return int(fd_dir.split("/")[2])
+        except OSError:
+            # The process exited or belongs to another user
+            continue
+    return None
+
+
+def start(
+    config: ConfigParser, pid_file: Path = DEFAULT_PID_FILE, ready_timeout: float = DEFAULT_READY_TIMEOUT
+) -> List[float]:
+    """
+    Starts the aria2c daemon (or group of daemons) and waits until it is ready.
+
+    Each daemon reloads the queue saved in its session file. With
+    `instances = N`, N daemons are started on consecutive ports. The
+    function returns once every daemon answers RPC calls, so a following
+    `add` cannot race the startup. The PID file holds the real daemon PIDs,
+    one per line, in instance order. It is locked for the whole startup, so
+    a concurrent `start` waits and then finds the daemons running.
+
+    The configured nice level, I/O class, CPU affinity and cgroup are
+    applied to each daemon once it is ready; a control that cannot be
+    applied is logged and does not fail the start. If any daemon fails to
+    start, the ones already started are stopped again before raising.
+
+    Args:
+        config: The loaded configuration.
+        pid_file: Where to write the daemons' PIDs.
+        ready_timeout: Seconds to wait for each daemon's RPC interface.
+
+    Returns:
+        The measured time-to-ready of each daemon, in seconds.
+
+    Raises:
+        FileNotFoundError: If aria2c is not installed.
+        TimeoutError: If a daemon does not become ready in time.
+        RuntimeError: If aria2c exits with an error, is already running, or
+            its daemon PID cannot be found.
+        ValueError: If `[aria2]` overrides an option pydownloader sets, or a
+            priority setting is malformed.
+    """
+    from pydownloader import priority
+
+    port = config.getint("settings", "rpc_port")
+    secret = config.get("settings", "rpc_secret", fallback="")
+    limits = priority.load_priority(config)
+    with pid_lock(pid_file):
+        check_not_running(pid_file)
+        for index in range(instance_count(config)):
+            restored = prepare_session(session_file(config, index))
+            if restored:
+                logger.info("Restoring %d downloads from %s", restored, session_file(config, index))
+        profile = tune(config)
+        processes = [
+            subprocess.Popen(build_command(config, index, profile=profile)) for index in range(instance_count(config))
+        ]
+
+        pids, ready_times = [], []
+        try:
+            for index, process in enumerate(processes):
+                ready_times.append(wait_until_ready(port + index, secret, ready_timeout, process))
+                pids.append(_daemon_pid(port + index, process))
+                logger.info("aria2c on port %d ready in %.3fs (PID %d)", port + index, ready_times[-1], pids[-1])
+                if limits != priority.ProcessPriority():
+                    priority.apply(pids[-1], limits, config.get("settings", "dest_folder"))
+        except BaseException:
+            # Nothing would record the daemons already started, so stop them
+            _abort_start(processes, pids, port)
+            raise
+        write_pid_file(pid_file, pids)
+    return ready_times
+
+
+def _daemon_pid(port: int, process: subprocess.Popen) -> int:
+    pid = find_listener_pid(port)
+    if pid is not None:
+        return pid
+    # A launcher still running did not fork, so it is the daemon itself
+    if process.poll() is None:
+        return process.pid
+    raise RuntimeError(f"Could not find the PID of the aria2c listening on port {port}")
+
+
+def _abort_start(processes: List[subprocess.Popen], pids: List[int], port: int):
+    started = list(pids)
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for index, process in enumerate(processes):
+        try:
+            process.wait(timeout=_ESCALATION_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        # A launcher that exited cleanly had already forked its daemon
+        if index >= len(pids) and process.returncode == 0:
+            pid = find_listener_pid(port + index)
+            if pid is not None:
+                started.append(pid)
+    _signal(started, 15)
+    for pid in wait_for_exit(started, _ESCALATION_TIMEOUT):
+        logger.error("aria2c (PID %d) did not exit, killing it", pid)
+        _signal([pid], 9)
+
+
+@contextmanager
+def pid_lock(pid_file: Path = DEFAULT_PID_FILE) -> Iterator[None]:
+    """
+    Holds an exclusive `flock` on the PID file's lock file.
+
+    `start` and `stop` hold it from reading the PID file until they have
+    rewritten or removed it, so that two of them cannot interleave. The lock
+    is taken on a separate `.lock` file, as the PID file itself is replaced
+    and removed; the kernel drops it if the process dies.
+
+    Args:
+        pid_file: The daemons' PID file.
+    """
+    import fcntl
+
+    fd = os.open(pid_file.with_name(pid_file.name + ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _read_proc(pid: int, name: str) -> Optional[bytes]:
+    # A raw read: these files are tiny and status may run every few seconds
+    try:
+        fd = os.open(f"/proc/{pid}/{name}", os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        return os.read(fd, 4096)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+
+def process_start_time(pid: int) -> Optional[int]:
+    """
+    Returns when a process started, from `/proc/<pid>/stat`.
+
+    Together with the PID this identifies a process: a PID reused by a new
+    process comes with a different start time.
+
+    Args:
+        pid: The process ID.
+
+    Returns:
+        The start time in clock ticks since boot; None if the process does
+        not exist, is a zombie or /proc is unavailable.
+    """
+    stat = _read_proc(pid, "stat")
+    if not stat:
+        return None
+    # The command name (field 2) is in parentheses and may contain spaces
+    fields = stat[stat.rfind(b")") + 2 :].split()
+    if fields[0] == b"Z":
+        return None
+    return int(fields[_STAT_START_TIME - 3])
+
+
+def pid_alive(pid: int, start_time: Optional[int] = None, name: Optional[str] = "aria2c") -> bool:
+    """
+    Checks that a recorded process is still running and is the same process.
+
+    A recorded start time must match the process's; without one, the
+    executable in `/proc/<pid>/cmdline` must be `name`. Without /proc
+    (non-Linux) only the existence of the PID is checked.
+
+    Args:
+        pid: The process ID.
+        start_time: The start time recorded with the PID, if any.
+        name: The expected executable when no start time was recorded;
+            None to accept any.
+
+    Returns:
+        True if the process is running and was not replaced by another one
+        with the same PID.
+    """
+    if not os.path.isdir("/proc/self"):
+        return _alive(pid)
+    current = process_start_time(pid)
+    if current is None:
+        return False
+    if start_time is not None:
+        return current == start_time
+    if name is None:
+        return True
+    cmdline = _read_proc(pid, "cmdline") or b""
+    return os.path.basename(cmdline.split(b"\0", 1)[0]).decode(errors="replace") == name
+
+
+class PidEntry(NamedTuple):
+    """A process recorded in a PID file."""
+
+    pid: int
+    # Start time from /proc/<pid>/stat; None in files written without /proc
+    start_time: Optional[int] = None
+
+
+def write_pid_file(pid_file: Path, pids: List[int]):
+    """
+    Records processes with their start times, one per line.
+
+    The file is replaced atomically, so a concurrent `status` never reads a
+    partial file.
+
+    Args:
+        pid_file: The PID file.
+        pids: The PIDs, in instance order.
+    """
+    lines = []
+    for pid in pids:
+        start_time = process_start_time(pid)
+        lines.append(str(pid) if start_time is None else f"{pid} {start_time}")
+    tmp = pid_file.with_name(pid_file.name + ".tmp")
+    with open(tmp, "w") as f:
+        f.write("\n".join(lines))
+    os.replace(tmp, pid_file)
+
+
+def read_pid_entries(pid_file: Path = DEFAULT_PID_FILE) -> List[PidEntry]:
+    """
+    Reads the processes recorded by `write_pid_file`.
+
+    Args:
+        pid_file: The PID file.
+
+    Returns:
+        The entries in instance order; empty if the file is missing or invalid.
+    """
+    try:
+        with open(pid_file, "r") as f:
+            return [PidEntry(*map(int, line.split())) for line in f.read().splitlines() if line.strip()]
+    except (FileNotFoundError, ValueError, TypeError):
+        return []
+
+
+def read_pids(pid_file: Path = DEFAULT_PID_FILE) -> List[int]:
+    """
+    Reads the PIDs recorded by `start`.
+
+    Args:
+        pid_file: The daemons' PID file.
+
+    Returns:
+        The PIDs in instance order; empty if the file is missing or invalid.
+    """
+    return [entry.pid for entry in read_pid_entries(pid_file)]
+
+
+def running_pids(pid_file: Path = DEFAULT_PID_FILE, name: Optional[str] = "aria2c") -> List[int]:
+    """
+    Returns the recorded processes that are still running.
+
+    Args:
+        pid_file: The PID file.
+        name: The expected executable for entries without a start time;
+            None to accept any.
+
+    Returns:
+        The live PIDs in instance order.
+    """
+    return [entry.pid for entry in read_pid_entries(pid_file) if pid_alive(entry.pid, entry.start_time, name)]
+
+
+def supervisor_pid_file(pid_file: Path = DEFAULT_PID_FILE) -> Path:
+    """
+    Returns where a supervisor records its own PID next to the daemons' PIDs.
+
+    Args:
+        pid_file: The daemons' PID file.
+
+    Returns:
+        The supervisor's PID file.
+    """
+    return pid_file.with_name(pid_file.name + ".supervisor")
+
+
+def check_not_running(pid_file: Path = DEFAULT_PID_FILE):
+    """
+    Makes sure neither the daemons nor a supervisor are running.
+
+    Call it while holding `pid_lock`.
+
+    Args:
+        pid_file: The daemons' PID file.
+
+    Raises:
+        RuntimeError: If a recorded daemon or supervisor is still running.
+    """
+    running = running_pids(supervisor_pid_file(pid_file), name=None)
+    if running:
+        raise RuntimeError(f"aria2c is already supervised (supervisor PID {running[0]})")
+    running = running_pids(pid_file)
+    if running:
+        raise RuntimeError(f"aria2c is already running (PID {running[0]})")
+
+
+class StopResult(NamedTuple):
+    """How one daemon was stopped."""
+
+    pid: int
+    # The step after which it had exited: "shutdown", "forceShutdown",
+    # "SIGTERM" or "SIGKILL"
+    method: str
+    # Seconds from the start of `stop` until it exited
+    seconds: float
+
+
+def _pidfd_open(pid: int) -> Optional[int]:
+    try:
+        return os.pidfd_open(pid)
+    except ProcessLookupError:
+        raise
+    except (AttributeError, OSError):
+        # No pidfd support (old kernel, non-Linux): fall back to polling
+        return None
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def wait_for_exit(pids: List[int], timeout: float) -> List[int]:
+    """
+    Waits until the given processes exit, or the timeout passes.
+
+    Each process is watched through a pidfd, which becomes readable when it
+    exits, so the wait is a single `poll` rather than a busy loop. Without
+    pidfd support the processes are checked every 50 ms instead.
+
+    Args:
+        pids: The processes to wait for; they need not be our children.
+        timeout: Seconds to wait.
+
+    Returns:
+        The PIDs that are still running.
+    """
+    import select
+
+    deadline = time.monotonic() + timeout
+    fds: Dict[int, int] = {}
+    polled: List[int] = []
+    for pid in pids:
+        try:
+            fd = _pidfd_open(pid)
+        except ProcessLookupError:
+            continue
+        if fd is None:
+            polled.append(pid)
+        else:
+            fds[fd] = pid
+    try:
+        poller = select.poll()
+        for fd in fds:
+            poller.register(fd, select.POLLIN)
+        while (fds or polled) and time.monotonic() < deadline:
+            wait_ms = (deadline - time.monotonic()) * 1000
+            for fd, _ in poller.poll(min(wait_ms, 50) if polled else wait_ms):
+                poller.unregister(fd)
+                os.close(fd)
+                del fds[fd]
+            polled = [pid for pid in polled if _alive(pid)]
+    finally:
+        for fd in fds:
+            os.close(fd)
+    return sorted(set(fds.values()) | set(polled))
+
+
+def _signal(pids: List[int], signum: int):
+    for pid in pids:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def stop(
+    pid_file: Path = DEFAULT_PID_FILE,
+    config: Optional[ConfigParser] = None,
+    timeout: float = DEFAULT_STOP_TIMEOUT,
+) -> List[StopResult]:
+    """
+    Stops every daemon recorded in the PID file, as gently as possible.
+
+    A supervisor watching the daemons is told to stop first, so that it
+    does not restart them. Then each step below is tried on the daemons
+    still running, waiting for them to exit before moving on to the next:
+
+    1. `aria2.saveSession` and `aria2.shutdown`, which lets aria2c write
+       its session and `.aria2` control files (up to `timeout` seconds);
+    2. `aria2.forceShutdown`, which skips pending tracker announces;
+    3. SIGTERM;
+    4. SIGKILL.
+
+    The RPC steps need the configuration. Every step is timed and logged.
+    Daemons whose recorded start time no longer matches have exited and had
+    their PID reused, so they are not signalled.
+
+    Args:
+        pid_file: The daemons' PID file.
+        config: The loaded configuration. Without it, stopping starts at
+            SIGTERM and the sessions are not saved first.
+        timeout: Seconds allowed for the graceful shutdown. The later steps
+            get a few seconds each.
+
+    Returns:
+        How and when each daemon exited, in PID file order.
+    """
+    with pid_lock(pid_file):
+        return _stop(pid_file, config, timeout)
+
+
+def _stop(pid_file: Path, config: Optional[ConfigParser], timeout: float) -> List[StopResult]:
+    supervisor_file = supervisor_pid_file(pid_file)
+    if os.path.exists(supervisor_file):
+        # The supervisor saves and stops its own daemons on SIGTERM; it must be
+        # gone before its children are signalled, or it would restart them
+        supervisors = running_pids(supervisor_file, name=None)
+        _signal(supervisors, 15)
+        supervisors = wait_for_exit(supervisors, timeout + _ESCALATION_TIMEOUT)
+        if supervisors:
+            logger.warning("Supervisor (PID %s) did not exit, killing it", ", ".join(map(str, supervisors)))
+            _signal(supervisors, 9)
+            wait_for_exit(supervisors, _ESCALATION_TIMEOUT)
+        # The exiting supervisor removes both files itself, without the lock
+        with suppress(FileNotFoundError):
+            os.remove(supervisor_file)
+    entries = read_pid_entries(pid_file)
+    # Instance N listens on rpc_port + N, whichever instances are still alive
+    instances = {entry.pid: index for index, entry in enumerate(entries)}
+    # A PID whose start time changed, or that no longer runs aria2c when none
+    # was recorded, now belongs to another process
+    pids = [entry.pid for entry in entries if pid_alive(entry.pid, entry.start_time)]
+    if not pids:
+        with suppress(FileNotFoundError):
+            os.remove(pid_file)
+        return []
+
+    started = time.monotonic()
+    results: Dict[int, StopResult] = {}
+    running = list(pids)
+
+    def step(method: str, action: Callable[[List[int]], None], wait: float):
+        nonlocal running
+        if not running:
+            return
+        step_started = time.monotonic()
+        action(running)
+        still_running = wait_for_exit(running, wait)
+        elapsed = time.monotonic() - step_started
+        for pid in set(running) - set(still_running):
+            results[pid] = StopResult(pid, method, time.monotonic() - started)
+        logger.info(
+            "%s: %d of %d daemons exited in %.3fs", method, len(running) - len(still_running), len(running), elapsed
+        )
+        running = still_running
+
+    if config is not None:
+        port = config.getint("settings", "rpc_port")
+        secret = config.get("settings", "rpc_secret", fallback="")
+        ports = {pid: port + instances[pid] for pid in pids}
+
+        def rpc(methods: Tuple[str, ...]) -> Callable[[List[int]], None]:
+            def action(targets: List[int]):
+                for pid in targets:
+                    for method in methods:
+                        try:
+                            call(ports[pid], secret, method, timeout=5.0)
+                        except (OSError, ValueError) as error:
+                            logger.warning("%s failed for aria2c on port %d: %s", method, ports[pid], error)
+
+            return action
+
+        step("shutdown", rpc(("aria2.saveSession", "aria2.shutdown")), timeout)
+        step("forceShutdown", rpc(("aria2.forceShutdown",)), _ESCALATION_TIMEOUT)
+    step("SIGTERM", lambda targets: _signal(targets, 15), _ESCALATION_TIMEOUT)
+    step("SIGKILL", lambda targets: _signal(targets, 9), _ESCALATION_TIMEOUT)
+    for pid in running:
+        logger.error("aria2c (PID %d) did not exit", pid)
+
+    with suppress(FileNotFoundError):
+        os.remove(pid_file)
+    return [results[pid] for pid in pids if pid in results]
+
+
+def get_group_status(pid_file: Path = DEFAULT_PID_FILE) -> List[Tuple[int, bool]]:
+    """
+    Reports which daemons of the group are alive.
+
+    This only reads the PID file and, per daemon, `/proc/<pid>/stat`.
+
+    Args:
+        pid_file: The daemons' PID file.
+
+    Returns:
+        (pid, alive) pairs in instance order.
+    """
+    if not os.path.exists(pid_file):
+        return []
+    return [(entry.pid, pid_alive(entry.pid, entry.start_time)) for entry in read_pid_entries(pid_file)]
+
+
+def get_status(pid_file: Path = DEFAULT_PID_FILE) -> Tuple[str, Optional[int]]:
+    """
+    Reports whether the daemon is running.
+
+    For a group of daemons the status is "Running" only if all of them are,
+    and "Degraded" if some of them are.
+
+    Args:
+        pid_file: The daemon's PID file.
+
+    Returns:
+        A (status, pid) tuple where status is "Running", "Degraded",
+        "Stopped" or "Stopped (Stale PID)" and pid (of the first running
+        daemon) is only set when running.
+    """
+    group = get_group_status(pid_file)
+    if not group:
+        return "Stopped", None
+    alive = [pid for pid, running in group if running]
+    if not alive:
+        return "Stopped (Stale PID)", None
+    return ("Running" if len(alive) == len(group) else "Degraded"), alive[0]
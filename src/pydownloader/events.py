@@ -0,0 +1,299 @@
+import json
+import logging
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_START = "aria2.onDownloadStart"
+DOWNLOAD_PAUSE = "aria2.onDownloadPause"
+DOWNLOAD_STOP = "aria2.onDownloadStop"
+DOWNLOAD_COMPLETE = "aria2.onDownloadComplete"
+DOWNLOAD_ERROR = "aria2.onDownloadError"
+BT_DOWNLOAD_COMPLETE = "aria2.onBtDownloadComplete"
+NOTIFICATIONS = (
+    DOWNLOAD_START,
+    DOWNLOAD_PAUSE,
+    DOWNLOAD_STOP,
+    DOWNLOAD_COMPLETE,
+    DOWNLOAD_ERROR,
+    BT_DOWNLOAD_COMPLETE,
+)
+# Notifications after which a download is stopped and holds a final result
+STOP_EVENTS = frozenset({DOWNLOAD_STOP, DOWNLOAD_COMPLETE, DOWNLOAD_ERROR})
+# Subscribe to this to receive every event
+ALL = "*"
+
+# The notification implied by a download's status, used to synthesize events
+# for changes missed while the WebSocket was disconnected.
+STATUS_EVENTS = {
+    "active": DOWNLOAD_START,
+    "paused": DOWNLOAD_PAUSE,
+    "removed": DOWNLOAD_STOP,
+    "complete": DOWNLOAD_COMPLETE,
+    "error": DOWNLOAD_ERROR,
+}
+EVENT_STATUSES = {event: status for status, event in STATUS_EVENTS.items()}
+# Number of downloads requested per tellWaiting/tellStopped call
+POLL_WINDOW = 1000
+
+
+class Event(NamedTuple):
+    """A download state change reported by aria2c."""
+
+    type: str
+    gid: str
+    # True if the event was reconstructed by polling after a reconnect
+    synthetic: bool = False
+
+
+class EventBus:
+    """
+    Dispatches download events to subscribers.
+
+    Callbacks run on the publishing thread and must not block for long. An
+    exception in one callback is logged and does not affect the others.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[Callable[[Event], None]]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def subscribe(self, event_type: str, callback: Callable[[Event], None]):
+        """
+        Registers a callback for an event type, or for every event with `ALL`.
+
+        Args:
+            event_type: One of the notification names, or `ALL`.
+            callback: Called with each matching Event.
+        """
+        with self._lock:
+            self._subscribers[event_type].append(callback)
+
+    def unsubscribe(self, event_type: str, callback: Callable[[Event], None]):
+        """Removes a callback registered with `subscribe`."""
+        with self._lock:
+            self._subscribers[event_type].remove(callback)
+
+    def publish(self, event: Event):
+        """
+        Delivers an event to its subscribers.
+
+        Args:
+            event: The event to deliver.
+        """
+        with self._lock:
+            callbacks = self._subscribers.get(event.type, []) + self._subscribers.get(ALL, [])
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Event subscriber %r failed on %s", callback, event)
+
+
+def iter_downloads(client, keys: List[str], window: int = POLL_WINDOW) -> Iterator[dict]:
+    """
+    Yields every download known to the daemon, fetching only the given keys.
+
+    Waiting and stopped downloads are fetched in windows so that memory stays
+    bounded on very large queues.
+
+    Args:
+        client: An aria2p client.
+        keys: The status keys to request.
+        window: Number of downloads per tellWaiting/tellStopped call.
+
+    Yields:
+        Download status dicts: active, then waiting, then stopped.
+    """
+    yield from client.tell_active(keys=keys)
+    for fetch in (client.tell_waiting, client.tell_stopped):
+        offset = 0
+        while True:
+            page = fetch(offset, window, keys=keys)
+            yield from page
+            if len(page) < window:
+                break
+            offset += window
+
+
+class NotificationListener:
+    """
+    Publishes aria2c WebSocket notifications to an EventBus.
+
+    The listener reconnects with exponential backoff when the connection
+    drops. Because notifications sent while disconnected are lost, each
+    reconnect is followed by a single status poll that publishes synthetic
+    events for every download whose state changed in the meantime. That poll
+    is the only full-state scan; otherwise the work done is proportional to
+    the number of events.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        bus: EventBus,
+        client=None,
+        connect: Optional[Callable] = None,
+        timeout: float = 5.0,
+        max_backoff: float = 30.0,
+    ):
+        """
+        Args:
+            url: The WebSocket endpoint, e.g. "ws://localhost:6800/jsonrpc".
+            bus: The bus to publish events to.
+            client: An aria2p client used for the reconnect poll. Without one,
+                missed events are not recovered.
+            connect: Opens a WebSocket; defaults to `websocket.create_connection`.
+            timeout: Receive timeout, which bounds how long `stop` takes.
+            max_backoff: Maximum delay between reconnection attempts.
+        """
+        self.url = url
+        self.bus = bus
+        self.client = client
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self._connect = connect
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Last known status per GID, used to detect changes after a reconnect
+        self.statuses: Dict[str, str] = {}
+
+    def handle_message(self, message: str):
+        """
+        Publishes the event carried by a WebSocket message, if any.
+
+        Args:
+            message: The raw JSON message.
+        """
+        data = json.loads(message)
+        method = data.get("method")
+        if method not in NOTIFICATIONS:
+            return
+        for param in data.get("params", []):
+            gid = param["gid"]
+            if method in EVENT_STATUSES:
+                self.statuses[gid] = EVENT_STATUSES[method]
+            self.bus.publish(Event(method, gid))
+
+    def reconcile(self, publish: bool = True):
+        """
+        Polls the daemon and publishes events for changes that were missed.
+
+        Args:
+            publish: If False, only record the current statuses (used on the
+                first connection, when there is nothing to catch up on).
+        """
+        if self.client is None:
+            return
+        current = {}
+        for download in iter_downloads(self.client, ["gid", "status"]):
+            current[download["gid"]] = download["status"]
+            if publish and self.statuses.get(download["gid"]) != download["status"]:
+                event_type = STATUS_EVENTS.get(download["status"])
+                if event_type:
+                    self.bus.publish(Event(event_type, download["gid"], synthetic=True))
+        self.statuses = current
+
+    def _open(self):
+        if self._connect is None:
+            import websocket
+
+            self._connect = websocket.create_connection
+        return self._connect(self.url, timeout=self.timeout)
+
+    def run(self):
+        """Listens until `stop` is called. Blocks the calling thread."""
+        import websocket
+        from aria2p import ClientException
+
+        backoff = 0.5
+        connected_before = False
+        while not self._stopped.is_set():
+            try:
+                socket = self._open()
+            except (OSError, websocket.WebSocketException) as error:
+                logger.warning("Could not connect to %s: %s", self.url, error)
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            polled = False
+            try:
+                self.reconcile(publish=connected_before)
+                polled = connected_before = True
+                backoff = 0.5
+                while not self._stopped.is_set():
+                    try:
+                        message = socket.recv()
+                    except websocket.WebSocketTimeoutException:
+                        continue
+                    try:
+                        self.handle_message(message)
+                    except (ValueError, KeyError, TypeError) as error:
+                        logger.warning("Ignoring malformed notification %r: %s", message, error)
+            except (OSError, websocket.WebSocketException) as error:
+                logger.warning("Lost connection to %s: %s", self.url, error)
+            except ClientException as error:
+                logger.warning("Could not poll %s for missed events: %s", self.url, error)
+            finally:
+                socket.close()
+            if not polled:
+                # Reconnecting at once would spin while the poll keeps failing
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    def start(self) -> threading.Thread:
+        """Runs the listener on a daemon thread."""
+        self._thread = threading.Thread(target=self.run, name="aria2-notifications", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        """Stops the listener and waits for its thread to exit."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def log_events(bus: EventBus, log: logging.Logger = logger):
+    """
+    Subscribes a logger that records download starts, completions and failures.
+
+    Args:
+        bus: The bus to subscribe to.
+        log: The logger to write to.
+    """
+    messages = {
+        DOWNLOAD_START: (logging.INFO, "Download started: %s"),
+        DOWNLOAD_COMPLETE: (logging.INFO, "Download finished: %s"),
+        BT_DOWNLOAD_COMPLETE: (logging.INFO, "Download finished: %s"),
+        DOWNLOAD_ERROR: (logging.ERROR, "Download failed: %s"),
+        DOWNLOAD_STOP: (logging.INFO, "Download removed: %s"),
+        DOWNLOAD_PAUSE: (logging.INFO, "Download paused: %s"),
+    }
+
+    def on_event(event: Event):
+        level, message = messages[event.type]
+        log.log(level, message, event.gid)
+
+    bus.subscribe(ALL, on_event)
+
+
+def ws_url(settings, port: Optional[int] = None) -> str:
+    """
+    Returns the WebSocket RPC endpoint for the configured daemon.
+
+    Args:
+        settings: The loaded settings.
+        port: Use this port instead of `rpc_port`, e.g. for another instance.
+
+    Returns:
+        A URL such as "ws://localhost:6800/jsonrpc".
+    """
+    host = settings.rpc_host
+    port = settings.rpc_port if port is None else port
+    if "://" in host:
+        scheme, host = host.split("://", 1)
+        return f"{'wss' if scheme == 'https' else 'ws'}://{host}:{port}/jsonrpc"
+    return f"ws://{host}:{port}/jsonrpc"
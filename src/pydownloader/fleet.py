@@ -0,0 +1,332 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from pydownloader import rpc
+from pydownloader.bulk import fault_message
+from pydownloader.pool import DaemonPool, merge_stats
+from pydownloader.utils import parse_speed
+
+if TYPE_CHECKING:
+    from pydownloader.config import Settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds a getGlobalStat sample is trusted before the nodes are polled again
+DEFAULT_SAMPLE_INTERVAL = 10.0
+# Upper bound passed as `num` to tellWaiting when adding up queued bytes
+_QUEUE_LIMIT = 2 ** 31 - 1
+_SIZE_KEYS = ["totalLength", "completedLength"]
+
+
+class Node(NamedTuple):
+    """A remote aria2c daemon listed in the `[nodes]` section."""
+
+    name: str
+    url: str
+    secret: str = ""
+    # Capacity of the node's link in bytes/sec; 0 if unknown
+    bandwidth: int = 0
+    # Disk space available for downloads in bytes; 0 if unknown
+    disk: int = 0
+
+
+def parse_node(name: str, value: str, default_secret: str = "") -> Node:
+    """
+    Parses a `[nodes]` entry.
+
+    The value is the RPC endpoint followed by optional `key=value` fields,
+    e.g. "http://nas.lan:6800 secret=abc bandwidth=10M disk=500G".
+
+    Args:
+        name: The node's name (the option key).
+        value: The option value.
+        default_secret: The secret used when the entry does not set one.
+
+    Returns:
+        The parsed node.
+
+    Raises:
+        ValueError: If the endpoint or a field is malformed.
+    """
+    fields = value.split()
+    if not fields:
+        raise ValueError("Missing RPC endpoint")
+    url = fields[0] if "://" in fields[0] else f"http://{fields[0]}"
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Invalid RPC endpoint: '{fields[0]}'")
+    try:
+        port = parts.port or 6800
+    except ValueError:
+        raise ValueError(f"Invalid port in RPC endpoint: '{fields[0]}'") from None
+
+    options = {"secret": default_secret, "bandwidth": "0", "disk": "0"}
+    for field in fields[1:]:
+        key, sep, option = field.partition("=")
+        if not sep or key not in options:
+            raise ValueError(f"Unknown field '{field}' (expected secret=, bandwidth= or disk=)")
+        options[key] = option
+    return Node(
+        name=name,
+        url=f"{parts.scheme}://{parts.hostname}:{port}",
+        secret=options["secret"],
+        bandwidth=parse_speed(options["bandwidth"]),
+        disk=parse_speed(options["disk"]),
+    )
+
+
+def connect_node(node: Node, timeout: float = rpc.DEFAULT_TIMEOUT):
+    """
+    Creates a pooled aria2p client for a node.
+
+    Args:
+        node: The node to connect to.
+        timeout: Socket timeout in seconds.
+
+    Returns:
+        An aria2p client.
+    """
+    parts = urlsplit(node.url)
+    return rpc.client_class()(
+        host=f"{parts.scheme}://{parts.hostname}", port=parts.port, secret=node.secret, timeout=timeout
+    )
+
+
+def ws_url(node: Node) -> str:
+    """
+    Returns the WebSocket RPC endpoint of a node.
+
+    Args:
+        node: The node.
+
+    Returns:
+        A URL such as "ws://nas.lan:6800/jsonrpc".
+    """
+    scheme, rest = node.url.split("://", 1)
+    return f"{'wss' if scheme == 'https' else 'ws'}://{rest}/jsonrpc"
+
+
+@dataclass
+class NodeStats:
+    """The state of a node as of its last sample."""
+
+    node: Node
+    healthy: bool = False
+    error: str = ""
+    download_speed: int = 0
+    # The node's own max-overall-download-limit; 0 if unlimited
+    speed_limit: int = 0
+    num_active: int = 0
+    num_waiting: int = 0
+    # Bytes still to be downloaded by active and waiting downloads
+    remaining: int = 0
+    # Downloads placed on the node since the sample was taken
+    placed: int = 0
+
+    @property
+    def capacity(self) -> int:
+        """The usable bandwidth: the configured link speed, else aria2c's limit."""
+        return self.node.bandwidth or self.speed_limit
+
+    @property
+    def spare_bandwidth(self) -> int:
+        """Bytes/sec the node could still download; negative load if capacity is unknown."""
+        return self.capacity - self.download_speed
+
+    @property
+    def spare_disk(self) -> Optional[int]:
+        """Disk space not yet claimed by queued downloads; None if unknown."""
+        return self.node.disk - self.remaining if self.node.disk else None
+
+
+def sample_node(node: Node, client) -> NodeStats:
+    """
+    Takes one sample of a node with a single `system.multicall`.
+
+    Queued bytes are only added up for nodes with a `disk` size, as that
+    needs the whole waiting queue.
+
+    Args:
+        node: The node.
+        client: An aria2p client for it.
+
+    Returns:
+        The node's stats; `healthy` is False if it could not be reached.
+    """
+    calls = [("aria2.getGlobalStat", []), ("aria2.getGlobalOption", [])]
+    if node.disk:
+        calls += [("aria2.tellActive", [_SIZE_KEYS]), ("aria2.tellWaiting", [0, _QUEUE_LIMIT, _SIZE_KEYS])]
+    try:
+        results = client.multicall2(calls)
+    except Exception as error:
+        return NodeStats(node, error=str(error))
+    for result in results:
+        message = fault_message(result)
+        if message is not None:
+            return NodeStats(node, error=message)
+
+    stat, options = results[0][0], results[1][0]
+    remaining = sum(
+        int(d["totalLength"]) - int(d["completedLength"]) for result in results[2:] for d in result[0]
+    )
+    try:
+        speed_limit = parse_speed(options.get("max-overall-download-limit", "0"))
+    except ValueError:
+        speed_limit = 0
+    return NodeStats(
+        node,
+        healthy=True,
+        download_speed=int(stat["downloadSpeed"]),
+        speed_limit=speed_limit,
+        num_active=int(stat["numActive"]),
+        num_waiting=int(stat["numWaiting"]),
+        remaining=remaining,
+    )
+
+
+class Fleet(DaemonPool):
+    """
+    aria2c daemons on several machines, driven as one queue.
+
+    Nodes are sampled concurrently at most every `sample_interval` seconds.
+    A node that fails its sample is unhealthy and gets no new downloads until
+    a later sample succeeds. New downloads go to the healthy node with the
+    most spare bandwidth, skipping nodes whose disk is already claimed by
+    queued downloads. Downloads placed between samples are counted locally,
+    so a burst of adds is spread over the nodes instead of piling onto the
+    one that looked best at the last sample.
+
+    Unlike the instances of one machine, every node has its own link, so
+    option changes (including speed limits) are sent to each node unchanged.
+    """
+
+    def __init__(
+        self,
+        nodes: List[Node],
+        clients: List,
+        sample_interval: float = DEFAULT_SAMPLE_INTERVAL,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            nodes: The nodes, in configuration order.
+            clients: One aria2p client per node.
+            sample_interval: Maximum age of a sample used for placement.
+            clock: Returns a monotonic time in seconds.
+        """
+        super().__init__(clients)
+        self.nodes = nodes
+        self.sample_interval = sample_interval
+        self.clock = clock
+        self.stats: List[NodeStats] = []
+        self._sampled_at: Optional[float] = None
+        self._sample_lock = threading.Lock()
+
+    def sample(self) -> List[NodeStats]:
+        """
+        Samples every node concurrently.
+
+        Returns:
+            The stats of each node, in node order.
+        """
+        with ThreadPoolExecutor(max_workers=len(self.nodes)) as executor:
+            stats = list(executor.map(sample_node, self.nodes, self.clients))
+        for node_stats in stats:
+            if not node_stats.healthy:
+                logger.warning("Node %s is unreachable: %s", node_stats.node.name, node_stats.error)
+        self.stats, self._sampled_at = stats, self.clock()
+        return stats
+
+    def _fresh_stats(self) -> List[NodeStats]:
+        with self._sample_lock:
+            if self._sampled_at is None or self.clock() - self._sampled_at >= self.sample_interval:
+                self.sample()
+            return self.stats
+
+    def healthy(self) -> DaemonPool:
+        """
+        Returns the nodes that passed their last health check.
+
+        Returns:
+            A DaemonPool over the healthy nodes' clients, in node order.
+        """
+        return DaemonPool([c for c, s in zip(self.clients, self._fresh_stats()) if s.healthy])
+
+    def pick(self, url: str) -> int:
+        """
+        Chooses the node with the most spare bandwidth for a new download.
+
+        Args:
+            url: The download's URL (unused: placement depends on load only).
+
+        Returns:
+            The node index.
+
+        Raises:
+            ValueError: If no node is healthy with disk space to spare.
+        """
+        stats = self._fresh_stats()
+        with self._lock:
+            candidates = [
+                index
+                for index, s in enumerate(stats)
+                if s.healthy and (s.spare_disk is None or s.spare_disk > 0)
+            ]
+            if not candidates:
+                raise ValueError("No healthy node with free disk space is available")
+
+            def score(index: int):
+                s = stats[index]
+                queued = s.num_active + s.num_waiting + s.placed
+                return (max(s.spare_bandwidth, 0) / (s.placed + 1), -queued)
+
+            index = max(candidates, key=score)
+            stats[index].placed += 1
+            return index
+
+    def get_global_stat(self) -> Dict[str, str]:
+        """Returns getGlobalStat summed over the healthy nodes."""
+        return merge_stats(self.healthy().global_stats())
+
+    def get_session_info(self) -> Dict[str, str]:
+        """
+        Returns a session ID for the healthy part of the fleet.
+
+        It changes whenever a node restarts, drops out or comes back, so that
+        the scheduler re-applies its limit to returning nodes.
+        """
+        return self.healthy().get_session_info()
+
+    def change_global_option(self, options: Dict[str, str]) -> bool:
+        """
+        Changes a global option on every healthy node.
+
+        Args:
+            options: The options to change.
+
+        Returns:
+            True.
+        """
+        for client in self.healthy().clients:
+            client.change_global_option(options)
+        return True
+
+
+def connect(settings: "Settings", sample_interval: float = DEFAULT_SAMPLE_INTERVAL) -> Fleet:
+    """
+    Creates a Fleet over the nodes in the `[nodes]` section.
+
+    Args:
+        settings: The loaded settings, with at least one node.
+        sample_interval: Maximum age of a sample used for placement.
+
+    Returns:
+        The fleet.
+    """
+    clients = [connect_node(node, settings.rpc_timeout) for node in settings.nodes]
+    return Fleet(list(settings.nodes), clients, sample_interval)
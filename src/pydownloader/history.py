@@ -0,0 +1,599 @@
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import AbstractSet, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from pydownloader.bulk import DEFAULT_BATCH_SIZE, STOPPED_STATUSES, batched, fault_message
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the table layout changes, and migrate older files on open
+SCHEMA_VERSION = 1
+# Status keys archived for every stopped download
+ARCHIVE_KEYS = ["gid", "status", "totalLength", "completedLength", "files", "errorCode"]
+REMOVE_RESULT = "aria2.removeDownloadResult"
+TELL_STATUS = "aria2.tellStatus"
+# Seconds between purge passes while `monitor` runs
+PURGE_INTERVAL = 60.0
+# Seconds between writes of downloads archived on their stop event
+FLUSH_INTERVAL = 1.0
+# Number of results requested per tellStopped call
+_STOPPED_WINDOW = 1000
+# Rows fetched from the store per query when listing
+_READ_WINDOW = 1000
+# "7d", "12h", ... for --since and --until
+_RELATIVE_TIME_RE = re.compile(r"^\s*(\d+)\s*([smhdw])\s*$", re.IGNORECASE)
+_TIME_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+_COLUMNS = (
+    "gid",
+    "status",
+    "uris",
+    "host",
+    "path",
+    "total_length",
+    "completed_length",
+    "error_code",
+    "started_at",
+    "finished_at",
+    "duration",
+    "speed",
+    "archived_at",
+)
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    gid TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    uris TEXT NOT NULL,
+    host TEXT NOT NULL,
+    path TEXT NOT NULL,
+    total_length INTEGER NOT NULL,
+    completed_length INTEGER NOT NULL,
+    error_code TEXT,
+    started_at REAL,
+    finished_at REAL NOT NULL,
+    duration REAL,
+    speed REAL,
+    archived_at REAL NOT NULL
+)
+"""
+# Searches filter or order by finish time, alone or after host or status, or
+# filter by size. The first two also cover every column `host_stats` reads,
+# so aggregates are computed from the index alone.
+_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS downloads_finished"
+    " ON downloads (finished_at, host, status, completed_length, duration)",
+    "CREATE INDEX IF NOT EXISTS downloads_host ON downloads (host, finished_at, status, completed_length, duration)",
+    "CREATE INDEX IF NOT EXISTS downloads_status ON downloads (status, finished_at)",
+    "CREATE INDEX IF NOT EXISTS downloads_size ON downloads (total_length)",
+)
+class PurgePolicy(NamedTuple):
+    """When stopped results are moved from aria2c's memory to the history store."""
+
+    # Stopped results left in each daemon; older ones are archived
+    keep: int = 500
+    # Archive results stopped for this many seconds (0 = never by age)
+    max_age: int = 0
+    # Archive every result as soon as its download stops
+    on_complete: bool = False
+
+
+class HistoryEntry(NamedTuple):
+    """One archived download."""
+
+    gid: str
+    status: str
+    # Every URI of the download, first one first
+    uris: Tuple[str, ...]
+    host: str
+    path: str
+    total_length: int
+    completed_length: int
+    error_code: Optional[str]
+    # When `monitor` saw it start (None if it did not) and stop, in epoch seconds
+    started_at: Optional[float]
+    finished_at: float
+    duration: Optional[float]
+    # Average speed in bytes/sec, if the duration is known
+    speed: Optional[float]
+
+
+class HostStats(NamedTuple):
+    """Aggregates of the archived downloads from one host."""
+
+    host: str
+    downloads: int
+    completed: int
+    failed: int
+    # Bytes downloaded
+    size: int
+    # Bytes and seconds of the downloads with a known duration
+    timed_size: int
+    seconds: float
+
+    @property
+    def failure_rate(self) -> float:
+        """The share of finished downloads that failed (removed ones are not counted)."""
+        finished = self.completed + self.failed
+        return self.failed / finished if finished else 0.0
+
+    @property
+    def throughput(self) -> Optional[float]:
+        """The average speed in bytes/sec, or None if no duration is known."""
+        return self.timed_size / self.seconds if self.seconds else None
+
+
+class HistoryQuery(NamedTuple):
+    """Filters for `HistoryStore.search` and `host_stats`. Unset filters match everything."""
+
+    # Finish time range, in epoch seconds
+    since: Optional[float] = None
+    until: Optional[float] = None
+    # Exact host names
+    hosts: Tuple[str, ...] = ()
+    statuses: Tuple[str, ...] = ()
+    # Total size range, in bytes
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+
+    def where(self) -> Tuple[str, list]:
+        """Returns the SQL condition and its parameters."""
+        clauses = []
+        params: list = []
+        if self.since is not None:
+            clauses.append("finished_at >= ?")
+            params.append(self.since)
+        if self.until is not None:
+            clauses.append("finished_at < ?")
+            params.append(self.until)
+        for column, values in (("host", self.hosts), ("status", self.statuses)):
+            if values:
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        if self.min_size is not None:
+            clauses.append("total_length >= ?")
+            params.append(self.min_size)
+        if self.max_size is not None:
+            clauses.append("total_length <= ?")
+            params.append(self.max_size)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def parse_time(value: str, now: Optional[float] = None) -> float:
+    """
+    Parses a --since/--until value.
+
+    Args:
+        value: An ISO date or date and time ("2026-10-01", "2026-10-01 08:30"),
+            in local time, or an age such as "90m", "12h" or "7d".
+        now: The current time; `time.time()` if None.
+
+    Returns:
+        The time in epoch seconds.
+
+    Raises:
+        ValueError: If the value is neither.
+    """
+    match = _RELATIVE_TIME_RE.match(value)
+    if match:
+        now = time.time() if now is None else now
+        return now - int(match.group(1)) * _TIME_UNITS[match.group(2).lower()]
+    try:
+        return datetime.fromisoformat(value.strip()).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid time '{value}' (expected e.g. 2026-10-01, '2026-10-01 08:30' or 7d)") from None
+
+
+def default_history_file() -> Path:
+    """
+    Returns the default location of the history store.
+
+    Returns:
+        `history.sqlite3` next to the session files.
+    """
+    from pydownloader.daemon import default_session_dir
+
+    return default_session_dir() / "history.sqlite3"
+
+
+def _host(uris: str) -> str:
+    return urlsplit(uris.split("\n", 1)[0]).hostname or ""
+
+
+def _row(download: dict, archived_at: float, started_at: Optional[float], finished_at: Optional[float]) -> tuple:
+    files = download.get("files", [])
+    uris = "\n".join(dict.fromkeys(uri["uri"] for file in files for uri in file.get("uris", [])))
+    completed_length = int(download.get("completedLength", 0))
+    finished_at = archived_at if finished_at is None else finished_at
+    duration = finished_at - started_at if started_at is not None else None
+    return (
+        download["gid"],
+        download["status"],
+        uris,
+        _host(uris),
+        files[0].get("path", "") if files else "",
+        int(download.get("totalLength", 0)),
+        completed_length,
+        download.get("errorCode"),
+        started_at,
+        finished_at,
+        duration,
+        completed_length / duration if duration else None,
+        archived_at,
+    )
+
+
+def _download(row: tuple) -> dict:
+    gid, status, uris, path, total_length, completed_length, error_code = row
+    download = {
+        "gid": gid,
+        "status": status,
+        "totalLength": str(total_length),
+        "completedLength": str(completed_length),
+        "files": [{"index": "1", "path": path, "uris": [{"uri": uri} for uri in uris.split("\n") if uri]}],
+    }
+    if error_code is not None:
+        download["errorCode"] = error_code
+    return download
+
+
+class HistoryStore:
+    """
+    An SQLite file holding the results of downloads that aria2c has forgotten.
+
+    Archived downloads are read back as aria2c status dicts, so that `list`
+    renders them like the stopped downloads aria2c still holds, or searched
+    with `search` and `host_stats`. Indexes on the finish time, alone and
+    after the host and the status, keep those queries fast on millions of
+    rows. The file is in WAL mode, so readers do not block the `monitor`
+    writing to it, and every `add` is a single transaction. The store may be
+    shared by the threads of one process.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Args:
+            path: The database file; it is created if missing.
+
+        Raises:
+            ValueError: If the file was written by a newer version.
+        """
+        import sqlite3
+
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode = WAL")
+        # In WAL mode a commit is still atomic without a sync; only the last ones may be lost on power failure
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            self._db.close()
+            raise ValueError(f"{path} was written by a newer version (schema {version})")
+        with self._lock, self._db:
+            self._db.execute(_SCHEMA)
+            for statement in _INDEXES:
+                self._db.execute(statement)
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def __enter__(self) -> "HistoryStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Refreshes the query planner's statistics if needed, then closes the database."""
+        import sqlite3
+
+        try:
+            # A sampled ANALYZE: cheap even on millions of rows
+            self._db.execute("PRAGMA analysis_limit = 1000")
+            self._db.execute("PRAGMA optimize")
+        except sqlite3.Error as error:
+            logger.debug("Could not optimize %s: %s", self.path, error)
+        self._db.close()
+
+    def add(
+        self,
+        downloads: Iterable[dict],
+        archived_at: Optional[float] = None,
+        timings: Optional[Dict[str, Tuple[Optional[float], Optional[float]]]] = None,
+    ) -> int:
+        """
+        Archives stopped downloads in one transaction.
+
+        A download archived twice (e.g. after an interrupted purge) keeps
+        only its latest record.
+
+        Args:
+            downloads: Status dicts with ARCHIVE_KEYS.
+            archived_at: The archive time; now if None.
+            timings: GID -> (start time, stop time), where known. The stop
+                time defaults to the archive time; without a start time the
+                duration and speed are unknown.
+
+        Returns:
+            The number of downloads archived.
+        """
+        archived_at = time.time() if archived_at is None else archived_at
+        timings = timings or {}
+        rows = [_row(download, archived_at, *timings.get(download["gid"], (None, None))) for download in downloads]
+        with self._lock, self._db:
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO downloads ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                rows,
+            )
+        return len(rows)
+
+    def count(self) -> int:
+        """Returns the number of archived downloads."""
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
+
+    def iter_rows(
+        self, first_row: int = 1, statuses: Optional[AbstractSet[str]] = None
+    ) -> Iterator[List[Tuple[int, dict]]]:
+        """
+        Pages through the archive in the order downloads were archived.
+
+        Rows are numbered from `first_row` whatever the filter, like
+        `AsyncController.iter_rows` numbers the live queue.
+
+        Args:
+            first_row: The number of the first archived row.
+            statuses: Only yield downloads with these statuses; None for all.
+
+        Yields:
+            Lists of (row number, download) pairs.
+        """
+        last = 0
+        row = first_row
+        while True:
+            with self._lock:
+                page = self._db.execute(
+                    "SELECT rowid, gid, status, uris, path, total_length, completed_length, error_code"
+                    " FROM downloads WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last, _READ_WINDOW),
+                ).fetchall()
+            if not page:
+                return
+            rows = []
+            for values in page:
+                if statuses is None or values[2] in statuses:
+                    rows.append((row, _download(values[1:])))
+                row += 1
+            if rows:
+                yield rows
+            last = page[-1][0]
+
+    def search(self, query: HistoryQuery = HistoryQuery(), limit: Optional[int] = None) -> List[HistoryEntry]:
+        """
+        Finds archived downloads, most recently finished first.
+
+        Args:
+            query: The filters.
+            limit: The maximum number of downloads returned; None for all.
+
+        Returns:
+            The matching downloads.
+        """
+        where, params = query.where()
+        sql = (
+            "SELECT gid, status, uris, host, path, total_length, completed_length, error_code,"
+            f" started_at, finished_at, duration, speed FROM downloads{where} ORDER BY finished_at DESC"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [HistoryEntry(row[0], row[1], tuple(row[2].split("\n")) if row[2] else (), *row[3:]) for row in rows]
+
+    def host_stats(self, query: HistoryQuery = HistoryQuery()) -> List[HostStats]:
+        """
+        Aggregates archived downloads per host.
+
+        Args:
+            query: The filters.
+
+        Returns:
+            One entry per host, busiest first.
+        """
+        where, params = query.where()
+        sql = (
+            "SELECT host, COUNT(*), SUM(status = 'complete'), SUM(status = 'error'), SUM(completed_length),"
+            " TOTAL(CASE WHEN duration > 0 THEN completed_length END), TOTAL(CASE WHEN duration > 0 THEN duration END)"
+            f" FROM downloads{where} GROUP BY host ORDER BY COUNT(*) DESC, host"
+        )
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        return [
+            HostStats(host, count, done, failed, size, int(timed), seconds)
+            for host, count, done, failed, size, timed, seconds in rows
+        ]
+
+
+class Purger:
+    """
+    Moves stopped results out of one aria2c daemon into the history store.
+
+    aria2c keeps every stopped result in memory until `max-download-result`
+    is reached, and `tellStopped` (needed by `list`) gets slower with each
+    one. A purge pass archives the results the policy selects, then forgets
+    them in aria2c with `removeDownloadResult` in multicall batches. Results
+    are written to the store before they are removed from aria2c, so an
+    interrupted pass can only archive a result twice, never lose it.
+
+    Fed with the daemon's notifications, the purger records when downloads
+    start and stop, from which the store derives durations and speeds.
+    aria2c does not report these times itself, so downloads that started
+    while nothing was listening have no duration, and ages are counted from
+    the stop event or else the first pass that saw the result. With
+    `on_complete`, stopped downloads are collected and archived together
+    by `flush`.
+    """
+
+    def __init__(
+        self,
+        client,
+        store: HistoryStore,
+        policy: PurgePolicy = PurgePolicy(),
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        clock=time.time,
+    ):
+        """
+        Args:
+            client: An aria2p client for one daemon.
+            store: Where archived results go.
+            policy: Which results to archive.
+            batch_size: removeDownloadResult calls per request, and stopped
+                downloads collected before `on_event` flushes them itself.
+            clock: Returns the current time in seconds.
+        """
+        self.client = client
+        self.store = store
+        self.policy = policy
+        self.batch_size = batch_size
+        self.clock = clock
+        # GID -> when its download was seen starting / stopped
+        self.started: Dict[str, float] = {}
+        self.finished: Dict[str, float] = {}
+        # Stopped downloads waiting for `flush`
+        self.pending: List[str] = []
+        self._lock = threading.Lock()
+
+    def archive(self, downloads: List[dict]) -> int:
+        """
+        Archives stopped downloads and removes their results from aria2c.
+
+        Args:
+            downloads: Status dicts with ARCHIVE_KEYS.
+
+        Returns:
+            The number of results removed from aria2c.
+        """
+        downloads = [download for download in downloads if download["status"] in STOPPED_STATUSES]
+        if not downloads:
+            return 0
+        with self._lock:
+            timings = {
+                d["gid"]: (self.started.pop(d["gid"], None), self.finished.pop(d["gid"], None)) for d in downloads
+            }
+        self.store.add(downloads, self.clock(), timings)
+        removed = 0
+        for batch in batched(downloads, self.batch_size):
+            results = self.client.multicall2([(REMOVE_RESULT, [download["gid"]]) for download in batch])
+            for download, result in zip(batch, results):
+                message = fault_message(result)
+                if message is None:
+                    removed += 1
+                else:
+                    # Already gone, e.g. removed by hand since it was listed
+                    logger.debug("Could not remove the result of %s: %s", download["gid"], message)
+        return removed
+
+    def _stopped(self) -> List[dict]:
+        downloads: List[dict] = []
+        while True:
+            page = self.client.tell_stopped(len(downloads), _STOPPED_WINDOW, keys=ARCHIVE_KEYS)
+            downloads.extend(page)
+            if len(page) < _STOPPED_WINDOW:
+                return downloads
+
+    def run_once(self, keep: Optional[int] = None) -> int:
+        """
+        Runs one purge pass.
+
+        The oldest results beyond `keep` are archived, as are results older
+        than the policy's maximum age.
+
+        Args:
+            keep: Overrides the policy's number of results to keep.
+
+        Returns:
+            The number of results archived.
+        """
+        keep = self.policy.keep if keep is None else keep
+        if not self.policy.max_age:
+            # tellStopped lists the oldest results first
+            excess = int(self.client.get_global_stat()["numStopped"]) - keep
+            if excess <= 0:
+                return 0
+            selected = self.client.tell_stopped(0, excess, keys=ARCHIVE_KEYS)
+        else:
+            stopped = self._stopped()
+            now = self.clock()
+            with self._lock:
+                for download in stopped:
+                    self.finished.setdefault(download["gid"], now)
+                finished = dict(self.finished)
+            cutoff = now - self.policy.max_age
+            excess = len(stopped) - keep
+            selected = [d for i, d in enumerate(stopped) if i < excess or finished[d["gid"]] <= cutoff]
+        archived = self.archive(selected)
+        if archived:
+            logger.info("Archived %d stopped results to %s", archived, self.store.path)
+        return archived
+
+    def flush(self) -> int:
+        """
+        Archives the stopped downloads collected by `on_event`.
+
+        Their results are fetched with one multicall per batch and written
+        to the store in one transaction.
+
+        Returns:
+            The number of results archived.
+        """
+        with self._lock:
+            gids, self.pending = self.pending, []
+        downloads = []
+        for batch in batched(gids, self.batch_size):
+            results = self.client.multicall2([(TELL_STATUS, [gid, ARCHIVE_KEYS]) for gid in batch])
+            # A result that is already gone was archived by a purge pass
+            downloads.extend(result[0] for result in results if fault_message(result) is None)
+        return self.archive(downloads)
+
+    def on_event(self, event):
+        """
+        Records start and stop times, and collects stopped downloads if the
+        policy archives them on completion.
+
+        Subscribe it to an EventBus fed by this daemon's notifications.
+
+        Args:
+            event: An `events.Event`.
+        """
+        from pydownloader import events
+
+        now = self.clock()
+        with self._lock:
+            if event.type == events.DOWNLOAD_START:
+                # Events replayed after a reconnect carry no useful time
+                if not event.synthetic:
+                    self.started.setdefault(event.gid, now)
+                return
+            if event.type not in events.STOP_EVENTS:
+                return
+            if not event.synthetic:
+                self.finished.setdefault(event.gid, now)
+            if not self.policy.on_complete:
+                return
+            self.pending.append(event.gid)
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self._flush_logged()
+
+    def _flush_logged(self):
+        from aria2p import ClientException
+
+        try:
+            self.flush()
+        except (OSError, ClientException) as error:
+            logger.warning("Could not archive stopped downloads: %s", error)
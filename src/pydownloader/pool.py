@@ -0,0 +1,281 @@
+import bisect
+import hashlib
+import logging
+import threading
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from pydownloader import rpc
+from pydownloader.bulk import ADD_URI
+from pydownloader.utils import format_speed, parse_speed
+
+if TYPE_CHECKING:
+    from pydownloader.config import Settings
+
+logger = logging.getLogger(__name__)
+
+# Points per instance on the hash ring; more points spread hosts more evenly
+DEFAULT_REPLICAS = 64
+SPEED_LIMIT = "max-overall-download-limit"
+GET_GLOBAL_STAT = "aria2.getGlobalStat"
+# getGlobalStat fields that are summed across instances
+_STAT_FIELDS = ("downloadSpeed", "uploadSpeed", "numActive", "numWaiting", "numStopped", "numStoppedTotal")
+# Smallest non-zero per-instance limit; aria2c reads 0 as unlimited
+_MIN_SHARE = 1024
+
+
+def url_host(url: str) -> str:
+    """
+    Returns the host of a URL, used as the sharding key.
+
+    Args:
+        url: A download URL.
+
+    Returns:
+        The lower-cased host name, or the URL itself if it has none.
+    """
+    return urlsplit(url).hostname or url
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of keys onto a fixed number of nodes.
+
+    Each node owns `replicas` points on the ring and a key belongs to the
+    first point at or after its hash. The same key always maps to the same
+    node, and resizing the group only moves about 1/N of the keys.
+    """
+
+    def __init__(self, nodes: int, replicas: int = DEFAULT_REPLICAS):
+        """
+        Args:
+            nodes: The number of nodes, numbered from 0.
+            replicas: Points per node on the ring.
+        """
+        points = sorted((_hash(f"{node}-{replica}"), node) for node in range(nodes) for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key: str) -> int:
+        """
+        Finds the node a key belongs to.
+
+        Args:
+            key: The key, e.g. a host name.
+
+        Returns:
+            The node number.
+        """
+        index = bisect.bisect_left(self._hashes, _hash(key))
+        return self._nodes[index % len(self._nodes)]
+
+
+def split_limit(speed: int, count: int) -> List[int]:
+    """
+    Splits a global speed limit evenly across instances.
+
+    Args:
+        speed: The total limit in bytes/sec; 0 (unlimited) is not split.
+        count: The number of instances.
+
+    Returns:
+        One limit per instance. The shares add up to `speed`, except that
+        each one is at least 1K so that none of them means "unlimited".
+    """
+    if not speed:
+        return [0] * count
+    shares = [max(speed // count, _MIN_SHARE)] * count
+    shares[-1] = max(speed - sum(shares[:-1]), _MIN_SHARE)
+    return shares
+
+
+def merge_stats(stats: Sequence[Dict[str, str]]) -> Dict[str, str]:
+    """
+    Adds up getGlobalStat results from several instances.
+
+    Args:
+        stats: One getGlobalStat result per instance.
+
+    Returns:
+        A getGlobalStat-style dict for the whole group.
+    """
+    return {key: str(sum(int(stat.get(key, 0)) for stat in stats)) for key in _STAT_FIELDS}
+
+
+class DaemonPool:
+    """
+    A group of aria2c instances behind the subset of the aria2p client API
+    that pydownloader uses.
+
+    New downloads are sharded across instances, either by consistent hashing
+    of the URL host or to the least busy instance. Calls that target a GID
+    are routed to the instance that owns it; the owner is learned when the
+    download is added or listed. Global speed limits are split evenly across
+    the instances.
+    """
+
+    def __init__(self, clients: List, shard_by: str = "host"):
+        """
+        Args:
+            clients: One aria2p client per instance, in instance order.
+            shard_by: "host" or "load".
+        """
+        self.clients = clients
+        self.shard_by = shard_by
+        self.ring = HashRing(len(clients))
+        # Instance index per known GID
+        self.owners: Dict[str, int] = {}
+        self._loads: Optional[List[int]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def server(self) -> str:
+        return ",".join(str(client.server) for client in self.clients)
+
+    def global_stats(self) -> List[Dict[str, str]]:
+        """Returns the getGlobalStat result of each instance."""
+        return [client.get_global_stat() for client in self.clients]
+
+    def pick(self, url: str) -> int:
+        """
+        Chooses the instance a new download should go to.
+
+        With `shard_by = "load"` the queue length of every instance is fetched
+        once; afterwards picks are accounted locally, so that adding many URLs
+        does not cost one getGlobalStat round per URL.
+
+        Args:
+            url: The download's URL.
+
+        Returns:
+            The instance index.
+        """
+        if self.shard_by == "host":
+            return self.ring.node_for(url_host(url))
+        with self._lock:
+            if self._loads is None:
+                self._loads = [int(stat["numActive"]) + int(stat["numWaiting"]) for stat in self.global_stats()]
+            index = min(range(len(self._loads)), key=self._loads.__getitem__)
+            self._loads[index] += 1
+            return index
+
+    def add_uri(self, uris: List[str], options: Optional[dict] = None, position: Optional[int] = None) -> str:
+        """
+        Adds a download to the instance chosen for its first URI.
+
+        Args:
+            uris: The download's URIs.
+            options: aria2c options for the download.
+            position: Position in that instance's waiting queue.
+
+        Returns:
+            The new download's GID.
+        """
+        index = self.pick(uris[0])
+        gid = self.clients[index].add_uri(uris, options=options, position=position)
+        self.owners[gid] = index
+        return gid
+
+    def multicall2(self, calls: List[Tuple[str, list]]) -> list:
+        """
+        Sends a batch of calls, one system.multicall per instance involved.
+
+        `aria2.addUri` calls are sharded, `aria2.getGlobalStat` is answered
+        for the whole group and any other call is sent to the owner of the GID
+        in its first parameter. A call for an unknown GID fails on its own.
+
+        Args:
+            calls: (method, params) pairs.
+
+        Returns:
+            One result per call, in order, as `aria2p.Client.multicall2`.
+        """
+        results: list = [None] * len(calls)
+        batches: Dict[int, List[Tuple[int, Tuple[str, list]]]] = defaultdict(list)
+        stat_positions = []
+        for position, (method, params) in enumerate(calls):
+            if method == GET_GLOBAL_STAT:
+                stat_positions.append(position)
+            elif method == ADD_URI:
+                batches[self.pick(params[0][0])].append((position, (method, params)))
+            elif params and params[0] in self.owners:
+                batches[self.owners[params[0]]].append((position, (method, params)))
+            else:
+                gid = params[0] if params else ""
+                results[position] = {"faultCode": 1, "faultString": f"GID {gid} is not found"}
+
+        for index, batch in batches.items():
+            for (position, (method, _)), result in zip(batch, self.clients[index].multicall2([c for _, c in batch])):
+                if method == ADD_URI and isinstance(result, list):
+                    self.owners[result[0]] = index
+                results[position] = result
+        if stat_positions:
+            stat = merge_stats(self.global_stats())
+            for position in stat_positions:
+                results[position] = [stat]
+        return results
+
+    def get_global_stat(self) -> Dict[str, str]:
+        """Returns getGlobalStat summed over all instances."""
+        return merge_stats(self.global_stats())
+
+    def get_session_info(self) -> Dict[str, str]:
+        """
+        Returns a session ID for the whole group.
+
+        It changes whenever any instance restarts, so that the scheduler
+        re-applies its limit.
+        """
+        return {"sessionId": ",".join(client.get_session_info()["sessionId"] for client in self.clients)}
+
+    def change_global_option(self, options: Dict[str, str]) -> bool:
+        """
+        Changes a global option on every instance.
+
+        A `max-overall-download-limit` is split evenly across the instances;
+        other options are sent as-is. Weighting the split by the active
+        downloads of the moment would starve an instance that is idle now
+        but is sharded new downloads later.
+
+        Args:
+            options: The options to change.
+
+        Returns:
+            True.
+        """
+        shares = [None] * len(self.clients)
+        if SPEED_LIMIT in options:
+            shares = split_limit(parse_speed(options[SPEED_LIMIT]), len(self.clients))
+        for client, share in zip(self.clients, shares):
+            client_options = dict(options)
+            if share is not None:
+                client_options[SPEED_LIMIT] = format_speed(share)
+            client.change_global_option(client_options)
+        logger.debug("Sent %s to %d instances", options, len(self.clients))
+        return True
+
+
+def connect(settings: "Settings"):
+    """
+    Creates a client for the configured daemon or group of daemons.
+
+    Args:
+        settings: The loaded settings.
+
+    Returns:
+        A `fleet.Fleet` when `[nodes]` lists remote daemons, an aria2p client
+        when a single instance is configured, otherwise a DaemonPool over all
+        instances.
+    """
+    if settings.nodes:
+        from pydownloader import fleet
+
+        return fleet.connect(settings)
+    if settings.instances == 1:
+        return rpc.connect(settings)
+    return DaemonPool(rpc.connect_all(settings), settings.shard_by)
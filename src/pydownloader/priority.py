@@ -0,0 +1,378 @@
+import logging
+import os
+from configparser import ConfigParser
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from pydownloader.utils import parse_speed
+
+logger = logging.getLogger(__name__)
+
+# I/O scheduling classes from linux/ioprio.h; "none" derives it from nice
+IO_CLASSES = {"none": 0, "realtime": 1, "best-effort": 2, "idle": 3}
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_WHO_PROCESS = 1
+# (ioprio_set, ioprio_get) syscall numbers; glibc has no wrapper for them
+_IOPRIO_SYSCALLS = {
+    "x86_64": (251, 252),
+    "i686": (289, 290),
+    "aarch64": (30, 31),
+    "riscv64": (30, 31),
+    "armv7l": (314, 315),
+    "ppc64le": (273, 274),
+    "s390x": (282, 283),
+}
+# Where relative `cgroup` paths are created
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+# io.max keys, see Documentation/admin-guide/cgroup-v2.rst
+_IO_MAX_KEYS = ("rbps", "wbps", "riops", "wiops")
+# Settings a schedule window may override; the cgroup itself is fixed
+WINDOW_KEYS = ("nice", "io_class", "cpu_affinity", "memory_max", "io_max")
+
+
+class ProcessPriority(NamedTuple):
+    """How much of the machine the aria2c daemons may use. Unset fields are left alone."""
+
+    nice: Optional[int] = None
+    # "idle", "best-effort", "best-effort:LEVEL" (0-7), "realtime:LEVEL" or "none"
+    io_class: str = ""
+    cpu_affinity: Tuple[int, ...] = ()
+    # A cgroup v2 directory, relative to /sys/fs/cgroup unless absolute
+    cgroup: str = ""
+    # Value for memory.max: a byte count or "max"
+    memory_max: str = ""
+    # Value for io.max without the device, e.g. "wbps=10485760 rbps=max"
+    io_max: str = ""
+
+
+# Values that undo every control, used when a schedule window ends
+NEUTRAL = ProcessPriority(
+    nice=0,
+    io_class="none",
+    cpu_affinity=tuple(range(os.cpu_count() or 1)),
+    memory_max="max",
+    io_max=" ".join(f"{key}=max" for key in _IO_MAX_KEYS),
+)
+
+
+def parse_cpu_list(value: str) -> Tuple[int, ...]:
+    """
+    Parses a CPU list in the format of `taskset -c`.
+
+    Args:
+        value: CPU numbers and ranges, e.g. "0-3,6".
+
+    Returns:
+        The sorted CPU numbers; empty for a blank value.
+
+    Raises:
+        ValueError: If the list is malformed.
+    """
+    cpus = set()
+    for part in value.replace(" ", "").split(","):
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        if not first.isdigit() or (sep and not last.isdigit()):
+            raise ValueError(f"Invalid CPU list: '{value}' (expected e.g. 0-3,6)")
+        start, end = int(first), int(last) if sep else int(first)
+        if end < start:
+            raise ValueError(f"Invalid CPU range: '{part}'")
+        cpus.update(range(start, end + 1))
+    return tuple(sorted(cpus))
+
+
+def parse_io_class(value: str) -> Tuple[int, int]:
+    """
+    Parses an I/O scheduling class.
+
+    Args:
+        value: "idle", "best-effort", "none" or "realtime", optionally with a
+            priority level, e.g. "best-effort:7".
+
+    Returns:
+        The (class, level) pair for ioprio_set.
+
+    Raises:
+        ValueError: If the class or level is unknown.
+    """
+    name, sep, level = value.strip().lower().partition(":")
+    if name not in IO_CLASSES:
+        raise ValueError(f"Unknown I/O class '{name}' (expected {', '.join(IO_CLASSES)})")
+    if not sep:
+        return IO_CLASSES[name], 4 if name in ("best-effort", "realtime") else 0
+    if not level.isdigit() or int(level) > 7:
+        raise ValueError(f"Invalid I/O priority level '{level}' (expected 0-7)")
+    return IO_CLASSES[name], int(level)
+
+
+def _parse_limit(value: str) -> str:
+    return "max" if value.strip().lower() == "max" else str(parse_speed(value))
+
+
+def parse_io_max(value: str) -> str:
+    """
+    Parses io.max limits, with the units accepted for speeds.
+
+    Args:
+        value: Limits separated by commas or spaces, e.g. "wbps=20M,riops=max".
+
+    Returns:
+        The limits in io.max syntax, e.g. "wbps=20971520 riops=max".
+
+    Raises:
+        ValueError: If a key or value is invalid.
+    """
+    limits = []
+    for field in value.replace(",", " ").split():
+        key, sep, limit = field.partition("=")
+        if not sep or key not in _IO_MAX_KEYS:
+            raise ValueError(f"Invalid io_max limit '{field}' (expected {', '.join(_IO_MAX_KEYS)}=VALUE)")
+        limits.append(f"{key}={_parse_limit(limit)}")
+    return " ".join(limits)
+
+
+def parse_priority(values: Dict[str, str], base: ProcessPriority = ProcessPriority()) -> ProcessPriority:
+    """
+    Applies priority settings on top of a base.
+
+    Args:
+        values: Setting name -> raw value; blank values are ignored.
+        base: The priority to start from.
+
+    Returns:
+        The combined priority.
+
+    Raises:
+        ValueError: If a value is malformed or a name is unknown.
+    """
+    changes = {}
+    for key, value in values.items():
+        value = value.strip()
+        if not value:
+            continue
+        if key == "nice":
+            try:
+                nice = int(value)
+            except ValueError:
+                raise ValueError(f"'nice' must be an integer, got '{value}'") from None
+            if not -20 <= nice <= 19:
+                raise ValueError(f"'nice' must be between -20 and 19, got {nice}")
+            changes["nice"] = nice
+        elif key == "io_class":
+            parse_io_class(value)
+            changes["io_class"] = value.lower()
+        elif key == "cpu_affinity":
+            changes["cpu_affinity"] = parse_cpu_list(value)
+        elif key == "cgroup":
+            changes["cgroup"] = value
+        elif key == "memory_max":
+            changes["memory_max"] = _parse_limit(value)
+        elif key == "io_max":
+            changes["io_max"] = parse_io_max(value)
+        else:
+            raise ValueError(f"Unknown priority setting '{key}'")
+    return base._replace(**changes)
+
+
+def load_priority(config: ConfigParser) -> ProcessPriority:
+    """
+    Reads the priority settings from the `[settings]` section.
+
+    Args:
+        config: The loaded configuration.
+
+    Returns:
+        The configured priority.
+
+    Raises:
+        ValueError: If a value is malformed, or a cgroup limit is set without
+            a cgroup.
+    """
+    keys = WINDOW_KEYS + ("cgroup",)
+    priority = parse_priority({key: config.get("settings", key, fallback="") for key in keys})
+    if (priority.memory_max or priority.io_max) and not priority.cgroup:
+        raise ValueError("'memory_max' and 'io_max' need a 'cgroup' to apply them to")
+    return priority
+
+
+def with_neutral(priority: ProcessPriority, keys: Iterable[str]) -> ProcessPriority:
+    """
+    Fills unset fields with the values that undo them.
+
+    A schedule window that sets e.g. `io_class = idle` must be undone when
+    it ends, even if the base configuration does not set an I/O class.
+
+    Args:
+        priority: The priority to complete.
+        keys: The fields to fill in if unset.
+
+    Returns:
+        The completed priority.
+    """
+    changes = {key: getattr(NEUTRAL, key) for key in keys if getattr(priority, key) in (None, "", ())}
+    return priority._replace(**changes)
+
+
+def _ioprio_syscalls() -> Tuple[int, int]:
+    machine = os.uname().machine
+    try:
+        return _IOPRIO_SYSCALLS[machine]
+    except KeyError:
+        raise OSError(f"ioprio is not supported on {machine}") from None
+
+
+def _syscall(number: int, *args: int) -> int:
+    import ctypes
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    result = libc.syscall(number, *args)
+    if result < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    return result
+
+
+def set_io_priority(tid: int, io_class: int, level: int):
+    """
+    Sets the I/O scheduling class and level of a thread.
+
+    Args:
+        tid: The thread (or single-threaded process) ID.
+        io_class: A value of IO_CLASSES.
+        level: The priority level within the class, 0 (highest) to 7.
+
+    Raises:
+        OSError: If the call fails or is not supported.
+    """
+    _syscall(_ioprio_syscalls()[0], _IOPRIO_WHO_PROCESS, tid, io_class << _IOPRIO_CLASS_SHIFT | level)
+
+
+def get_io_priority(tid: int) -> Tuple[int, int]:
+    """
+    Returns the I/O scheduling class and level of a thread.
+
+    Args:
+        tid: The thread (or single-threaded process) ID.
+
+    Returns:
+        The (class, level) pair.
+
+    Raises:
+        OSError: If the call fails or is not supported.
+    """
+    value = _syscall(_ioprio_syscalls()[1], _IOPRIO_WHO_PROCESS, tid)
+    return value >> _IOPRIO_CLASS_SHIFT, value & ((1 << _IOPRIO_CLASS_SHIFT) - 1)
+
+
+def _threads(pid: int) -> List[int]:
+    # nice, ioprio and affinity are per thread on Linux
+    try:
+        return [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        return [pid]
+
+
+def block_device(path: str) -> str:
+    """
+    Finds the disk a path is stored on, as io.max expects it.
+
+    Args:
+        path: A file or directory; the nearest existing parent is used.
+
+    Returns:
+        The "MAJOR:MINOR" of the whole disk (not the partition).
+
+    Raises:
+        OSError: If the path is not on a block device.
+    """
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    dev = os.stat(path).st_dev
+    device = f"{os.major(dev)}:{os.minor(dev)}"
+    sysfs = Path("/sys/dev/block") / device
+    if not sysfs.exists():
+        raise OSError(f"{path} is not on a block device ({device})")
+    if (sysfs / "partition").exists():
+        device = (sysfs.resolve().parent / "dev").read_text().strip()
+    return device
+
+
+def cgroup_path(cgroup: str) -> Path:
+    """
+    Resolves the `cgroup` setting.
+
+    Args:
+        cgroup: An absolute path, or a path relative to /sys/fs/cgroup.
+
+    Returns:
+        The cgroup directory.
+    """
+    path = Path(cgroup)
+    return path if path.is_absolute() else CGROUP_ROOT / path
+
+
+def configure_cgroup(path: Path, memory_max: str = "", io_max: str = "", device: str = ""):
+    """
+    Creates a cgroup v2 directory if needed and writes its limits.
+
+    Args:
+        path: The cgroup directory.
+        memory_max: The memory.max value; unchanged if blank.
+        io_max: The io.max limits without the device; unchanged if blank.
+        device: The "MAJOR:MINOR" the io.max limits apply to.
+
+    Raises:
+        OSError: If the cgroup cannot be created or written.
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    if memory_max:
+        (path / "memory.max").write_text(memory_max + "\n")
+    if io_max:
+        (path / "io.max").write_text(f"{device} {io_max}\n")
+
+
+def apply(pid: int, priority: ProcessPriority, dest_folder: str = ".") -> List[str]:
+    """
+    Applies a priority to a running process and all of its threads.
+
+    Every control is tried even if an earlier one fails, e.g. because a
+    negative nice level needs root. Failures are logged and returned.
+    `memory_max` and `io_max` only take effect together with `cgroup`.
+
+    Args:
+        pid: The process.
+        priority: What to apply; unset fields are left unchanged.
+        dest_folder: The download folder, whose disk io.max limits.
+
+    Returns:
+        One message per control that could not be applied.
+    """
+    failures = []
+
+    def attempt(control: str, action):
+        try:
+            action()
+        except (OSError, ValueError) as error:
+            failures.append(f"{control}: {error}")
+            logger.warning("Could not set %s of PID %d: %s", control, pid, error)
+
+    if priority.cgroup:
+
+        def place():
+            path = cgroup_path(priority.cgroup)
+            device = block_device(dest_folder) if priority.io_max else ""
+            configure_cgroup(path, priority.memory_max, priority.io_max, device)
+            (path / "cgroup.procs").write_text(f"{pid}\n")
+
+        attempt("cgroup", place)
+    threads = _threads(pid)
+    if priority.nice is not None:
+        attempt("nice", lambda: [os.setpriority(os.PRIO_PROCESS, tid, priority.nice) for tid in threads])
+    if priority.io_class:
+        io_class, level = parse_io_class(priority.io_class)
+        attempt("I/O class", lambda: [set_io_priority(tid, io_class, level) for tid in threads])
+    if priority.cpu_affinity:
+        attempt("CPU affinity", lambda: [os.sched_setaffinity(tid, priority.cpu_affinity) for tid in threads])
+    return failures
@@ -0,0 +1,273 @@
+import bisect
+import logging
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from pydownloader.bulk import DEFAULT_BATCH_SIZE, batched, fault_message
+from pydownloader.pool import url_host
+from pydownloader.utils import first_uri
+
+logger = logging.getLogger(__name__)
+
+CHANGE_POSITION = "aria2.changePosition"
+# Upper bound passed as `num` to tellWaiting to fetch the whole queue
+_QUEUE_LIMIT = 2 ** 31 - 1
+
+
+def _size(download: dict) -> int:
+    return int(download.get("totalLength", 0))
+
+
+def _host(download: dict) -> str:
+    return url_host(first_uri(download))
+
+
+# Sort keys accepted by `reorder --by`
+SORT_KEYS: Dict[str, Callable[[dict], object]] = {"size": _size, "host": _host}
+# Status keys fetched for each sort key
+_SORT_FIELDS = {"size": ["gid", "totalLength"], "host": ["gid", "files"]}
+
+
+@dataclass
+class ReorderReport:
+    """The outcome of a reorder."""
+
+    # Waiting downloads whose order was considered
+    items: int = 0
+    # changePosition calls sent
+    moves: int = 0
+    # multicall requests sent
+    requests: int = 0
+    failures: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def naive_requests(self) -> int:
+        """Requests needed to list the queue, then move every download one at a time as `move` does."""
+        return self.items + 1
+
+    @property
+    def saved(self) -> int:
+        """Round trips saved compared with naive moves."""
+        return self.naive_requests - self.requests
+
+
+def longest_increasing_subsequence(values: Sequence[int]) -> List[int]:
+    """
+    Finds a longest strictly increasing subsequence in O(n log n).
+
+    Args:
+        values: The sequence.
+
+    Returns:
+        The indices of the subsequence's elements, in order.
+    """
+    # tails[k] is the index of the smallest tail of an increasing run of length k + 1
+    tails: List[int] = []
+    tail_values: List[int] = []
+    previous = [-1] * len(values)
+    for index, value in enumerate(values):
+        length = bisect.bisect_left(tail_values, value)
+        if length:
+            previous[index] = tails[length - 1]
+        if length == len(tails):
+            tails.append(index)
+            tail_values.append(value)
+        else:
+            tails[length] = index
+            tail_values[length] = value
+    result = []
+    index = tails[-1] if tails else -1
+    while index >= 0:
+        result.append(index)
+        index = previous[index]
+    return result[::-1]
+
+
+def target_order(current: Sequence[str], first: Iterable[str]) -> List[str]:
+    """
+    Completes a partial order.
+
+    Args:
+        current: The GIDs in the waiting queue, in queue order.
+        first: GIDs that should lead the queue, in this order. Unknown and
+            repeated GIDs are ignored.
+
+    Returns:
+        The listed GIDs followed by the others in their current order.
+    """
+    known = set(current)
+    leading: List[str] = []
+    seen = set()
+    for gid in first:
+        if gid in known and gid not in seen:
+            leading.append(gid)
+            seen.add(gid)
+    return leading + [gid for gid in current if gid not in seen]
+
+
+def plan_moves(current: Sequence[str], target: Sequence[str]) -> List[Tuple[str, int]]:
+    """
+    Computes few `changePosition` calls that turn one queue order into another.
+
+    The downloads forming a longest increasing subsequence (by target rank)
+    stay where they are; every other download is moved once, right behind
+    its predecessor in the target order. No plan with fewer moves exists.
+
+    Planning takes O(n log n): instead of replaying the moves on a list, each
+    download's slot in the evolving queue is known up front, and a Fenwick
+    tree over the slots counts the downloads ahead of each destination.
+
+    Args:
+        current: The GIDs in queue order.
+        target: The same GIDs in the desired order.
+
+    Returns:
+        (gid, absolute position) pairs, to be applied in order with POS_SET.
+    """
+    rank = {gid: position for position, gid in enumerate(target)}
+    index = {gid: position for position, gid in enumerate(current)}
+    kept = {current[i] for i in longest_increasing_subsequence([rank[gid] for gid in current])}
+
+    # A download sorts by (queue index, target rank). A moved download lands
+    # right behind its predecessor, i.e. in the run that follows the nearest
+    # kept download before it in the target order (or at the very front).
+    start = {gid: (index[gid], rank[gid]) for gid in current}
+    end = {}
+    anchor = -1
+    for gid in target:
+        if gid in kept:
+            anchor = index[gid]
+        end[gid] = (anchor, rank[gid])
+    slots = {key: slot for slot, key in enumerate(sorted(set(start.values()) | set(end.values())))}
+
+    tree = _Counter(len(slots))
+    for key in start.values():
+        tree.add(slots[key], 1)
+    moves = []
+    for gid in target:
+        if gid in kept:
+            continue
+        tree.add(slots[start[gid]], -1)
+        destination = tree.count_before(slots[end[gid]])
+        tree.add(slots[end[gid]], 1)
+        moves.append((gid, destination))
+    return moves
+
+
+class _Counter:
+    """A Fenwick tree counting the occupied slots before a given slot."""
+
+    def __init__(self, size: int):
+        self.tree = [0] * (size + 1)
+
+    def add(self, slot: int, delta: int):
+        slot += 1
+        while slot < len(self.tree):
+            self.tree[slot] += delta
+            slot += slot & -slot
+
+    def count_before(self, slot: int) -> int:
+        total = 0
+        while slot > 0:
+            total += self.tree[slot]
+            slot -= slot & -slot
+        return total
+
+
+def apply_moves(client, moves: List[Tuple[str, int]], batch_size: int = DEFAULT_BATCH_SIZE) -> ReorderReport:
+    """
+    Sends planned moves as sequential `system.multicall` batches.
+
+    aria2c runs the calls of a multicall in order, and batches are sent one
+    after another, so every absolute position refers to the queue as left by
+    the previous move.
+
+    Args:
+        client: An aria2p client for one daemon.
+        moves: The moves from `plan_moves`.
+        batch_size: changePosition calls per request.
+
+    Returns:
+        The moves and requests sent, and any failed moves.
+    """
+    report = ReorderReport()
+    for batch in batched(moves, batch_size):
+        results = client.multicall2([(CHANGE_POSITION, [gid, position, "POS_SET"]) for gid, position in batch])
+        report.requests += 1
+        report.moves += len(batch)
+        for (gid, _), result in zip(batch, results):
+            message = fault_message(result)
+            if message is not None:
+                report.failures.append((gid, message))
+    return report
+
+
+def reorder(
+    client,
+    by: Optional[str] = None,
+    reverse: bool = False,
+    first: Sequence[str] = (),
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    dry_run: bool = False,
+) -> ReorderReport:
+    """
+    Reorders the waiting queue of a daemon with as few moves as possible.
+
+    The order is either a sort (`by`) or a list of GIDs to put first. A
+    sort is stable, so downloads with equal keys keep their relative order.
+    The queue is read with one tellWaiting call; the moves go out in
+    multicall batches.
+
+    Args:
+        client: An aria2p client for one daemon.
+        by: A key of SORT_KEYS.
+        reverse: Sort in descending order.
+        first: GIDs that should lead the queue, used when `by` is None.
+        batch_size: changePosition calls per request.
+        dry_run: Only plan; send nothing.
+
+    Returns:
+        The report; `requests` includes the tellWaiting call and, in a dry
+        run, the batches a real run would send.
+
+    Raises:
+        ValueError: If `by` is not a known sort key.
+    """
+    if by is not None and by not in SORT_KEYS:
+        raise ValueError(f"Unknown sort key '{by}' (expected {', '.join(SORT_KEYS)})")
+    downloads = client.tell_waiting(0, _QUEUE_LIMIT, keys=_SORT_FIELDS.get(by, ["gid"]))
+    current = [download["gid"] for download in downloads]
+    if by is not None:
+        target = [d["gid"] for d in sorted(downloads, key=SORT_KEYS[by], reverse=reverse)]
+    else:
+        target = target_order(current, first)
+    moves = plan_moves(current, target)
+
+    if dry_run:
+        # Count the batches the real run would send, so that `saved` matches it
+        report = ReorderReport(moves=len(moves), requests=-(-len(moves) // batch_size))
+    else:
+        report = apply_moves(client, moves, batch_size)
+    report.items = len(target)
+    report.requests += 1
+    logger.info("Reordered %d downloads with %d moves in %d requests", report.items, report.moves, report.requests)
+    return report
+
+
+def merge_reports(reports: Iterable[ReorderReport]) -> ReorderReport:
+    """
+    Adds up the reports of several daemons.
+
+    Args:
+        reports: One report per daemon.
+
+    Returns:
+        The combined report.
+    """
+    total = ReorderReport()
+    for report in reports:
+        total.items += report.items
+        total.moves += report.moves
+        total.requests += report.requests
+        total.failures.extend(report.failures)
+    return total
@@ -0,0 +1,216 @@
+import http.client
+import json
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    from pydownloader.config import Settings
+
+# Maximum number of idle keep-alive connections kept per daemon
+DEFAULT_POOL_SIZE = 4
+DEFAULT_TIMEOUT = 30.0
+
+# Errors that mean a pooled socket was closed by the other end, e.g. because
+# aria2c was restarted since the connection was opened.
+_STALE_CONNECTION_ERRORS = (ConnectionError, http.client.RemoteDisconnected, http.client.CannotSendRequest)
+
+
+class RPCConnectionError(ConnectionError):
+    """Raised when the daemon cannot be reached or sends a malformed response."""
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of keep-alive HTTP connections to one JSON-RPC endpoint.
+
+    Connections are handed out last-in first-out so that the warmest socket is
+    reused. At most `size` idle connections are kept; extra ones opened under
+    concurrency are closed when they are released.
+    """
+
+    def __init__(self, url: str, size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT):
+        """
+        Args:
+            url: The JSON-RPC endpoint, e.g. "http://localhost:6800/jsonrpc".
+            size: Maximum number of idle connections to keep.
+            timeout: Socket timeout in seconds for connect, send and receive.
+        """
+        parts = urlsplit(url)
+        self.url = url
+        self.path = parts.path or "/jsonrpc"
+        self.size = size
+        self.timeout = timeout
+        self._connection_class = (
+            http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        )
+        self._address = (parts.hostname, parts.port)
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def _acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+            self.opened += 1
+        host, port = self._address
+        return self._connection_class(host, port, timeout=self.timeout), False
+
+    def _release(self, connection: http.client.HTTPConnection):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def _send(self, connection: http.client.HTTPConnection, payload: bytes) -> bytes:
+        connection.request(
+            "POST", self.path, body=payload, headers={"Content-Type": "application/json-rpc"}
+        )
+        response = connection.getresponse()
+        body = response.read()
+        if response.will_close:
+            connection.close()
+        return body
+
+    def post(self, payload: bytes) -> bytes:
+        """
+        Sends a request body and returns the response body.
+
+        If a reused connection turns out to be stale, the request is retried
+        once on a fresh connection, which transparently reconnects after a
+        daemon restart.
+
+        Args:
+            payload: The encoded JSON-RPC request.
+
+        Returns:
+            The raw response body.
+
+        Raises:
+            RPCConnectionError: If the daemon cannot be reached.
+        """
+        connection, reused = self._acquire()
+        try:
+            body = self._send(connection, payload)
+        except _STALE_CONNECTION_ERRORS as error:
+            connection.close()
+            if not reused:
+                raise RPCConnectionError(f"Could not reach aria2c at {self.url}: {error}") from error
+            connection, _ = self._acquire_fresh()
+            try:
+                body = self._send(connection, payload)
+            except (OSError, http.client.HTTPException) as retry_error:
+                connection.close()
+                raise RPCConnectionError(f"Could not reach aria2c at {self.url}: {retry_error}") from retry_error
+        except (OSError, http.client.HTTPException) as error:
+            connection.close()
+            raise RPCConnectionError(f"Could not reach aria2c at {self.url}: {error}") from error
+        self._release(connection)
+        return body
+
+    def _acquire_fresh(self) -> Tuple[http.client.HTTPConnection, bool]:
+        # Every idle socket predates the failure, so drop them all
+        self.close()
+        return self._acquire()
+
+    def close(self):
+        """Closes every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+_pools: Dict[Tuple[str, float], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(url: str, timeout: float = DEFAULT_TIMEOUT) -> ConnectionPool:
+    """
+    Returns the process-wide connection pool for an endpoint.
+
+    Args:
+        url: The JSON-RPC endpoint.
+        timeout: Socket timeout in seconds.
+
+    Returns:
+        A shared ConnectionPool.
+    """
+    with _pools_lock:
+        pool = _pools.get((url, timeout))
+        if pool is None:
+            pool = _pools[(url, timeout)] = ConnectionPool(url, timeout=timeout)
+        return pool
+
+
+_PooledClient = None
+
+
+def client_class():
+    """
+    Returns an aria2p client class whose requests go through a ConnectionPool.
+
+    The class is built on first use so that importing this module does not
+    import aria2p.
+    """
+    global _PooledClient
+    if _PooledClient is None:
+        import aria2p
+
+        class PooledClient(aria2p.Client):
+            """An aria2p client that reuses keep-alive connections."""
+
+            def __init__(self, *args, pool: Optional[ConnectionPool] = None, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.pool = pool or get_pool(self.server, self.timeout)
+
+            def post(self, payload: str) -> dict:
+                body = self.pool.post(payload.encode())
+                try:
+                    return json.loads(body)
+                except ValueError as error:
+                    raise RPCConnectionError(f"Malformed response from aria2c: {body[:100]!r}") from error
+
+        _PooledClient = PooledClient
+    return _PooledClient
+
+
+def connect(settings: "Settings", pooled: bool = True, port: Optional[int] = None):
+    """
+    Creates an aria2p client for the daemon described by the settings.
+
+    aria2p is imported here rather than at module level so that commands which
+    never talk to the daemon do not pay for the import.
+
+    Args:
+        settings: The loaded settings.
+        pooled: Whether to reuse keep-alive connections from the shared pool.
+        port: Connect to this port instead of `rpc_port`.
+
+    Returns:
+        An `aria2p.Client` bound to `rpc_host:rpc_port` with `rpc_secret`.
+    """
+    import aria2p
+
+    host = settings.rpc_host
+    if "://" not in host:
+        host = f"http://{host}"
+    cls = client_class() if pooled else aria2p.Client
+    port = settings.rpc_port if port is None else port
+    return cls(host=host, port=port, secret=settings.rpc_secret, timeout=settings.rpc_timeout)
+
+
+def connect_all(settings: "Settings", pooled: bool = True) -> List:
+    """
+    Creates one client per configured aria2c instance.
+
+    Args:
+        settings: The loaded settings.
+        pooled: Whether to reuse keep-alive connections from the shared pool.
+
+    Returns:
+        Clients for ports `rpc_port` to `rpc_port + instances - 1`, in order.
+    """
+    return [connect(settings, pooled, port=settings.rpc_port + index) for index in range(settings.instances)]
@@ -0,0 +1,409 @@
+import logging
+import re
+import time
+from bisect import bisect_right
+from configparser import ConfigParser
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+from pydownloader import daemon, pool, priority
+from pydownloader.utils import format_speed, parse_speed
+
+if TYPE_CHECKING:
+    from pydownloader.config import Settings
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+# How often (in seconds) the follow loop checks whether aria2c was restarted
+DEFAULT_CHECK_INTERVAL = 30.0
+
+_SCHEDULE_RE = re.compile(r"^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*-\s*(\S+)((?:\s+\S+)*)\s*$")
+_SCHEDULE_KEY_RE = re.compile(r"^s(\d+)$")
+
+
+class ScheduleEntry(NamedTuple):
+    """A single `sN = HH:MM-HH:MM-SPEED [KEY=VALUE ...]` line, in minutes of the day."""
+
+    start: int
+    end: int
+    speed: int
+    # Process priority settings for the window, e.g. (("io_class", "idle"),)
+    priority: Tuple[Tuple[str, str], ...] = ()
+
+    def covers(self, minute: int) -> bool:
+        """Returns True if the given minute of the day falls inside this entry."""
+        if self.start == self.end:
+            return True
+        if self.start < self.end:
+            return self.start <= minute < self.end
+        # The range spans midnight, e.g. 22:00-06:00
+        return minute >= self.start or minute < self.end
+
+
+def _parse_minute(hours: str, minutes: str, value: str) -> int:
+    hour, minute = int(hours), int(minutes)
+    if hour > 23 or minute > 59:
+        raise ValueError(f"Invalid time in schedule: '{value}'")
+    return hour * 60 + minute
+
+
+def parse_schedule(value: str) -> ScheduleEntry:
+    """
+    Parses a schedule string of the form `HH:MM-HH:MM-SPEED [KEY=VALUE ...]`.
+
+    A range whose start equals its end covers the whole day. The optional
+    fields set the daemons' process priority during the window; the keys
+    are those of `priority.WINDOW_KEYS`, e.g. "io_class=idle nice=10".
+
+    Args:
+        value: The schedule string, e.g. "22:00-06:00-10M".
+
+    Returns:
+        The parsed ScheduleEntry.
+
+    Raises:
+        ValueError: If the string is malformed.
+    """
+    match = _SCHEDULE_RE.match(value)
+    if not match:
+        raise ValueError(f"Invalid schedule format: '{value}' (expected HH:MM-HH:MM-SPEED)")
+    start_h, start_m, end_h, end_m, speed, fields = match.groups()
+    window = []
+    for field in fields.split():
+        key, sep, setting = field.partition("=")
+        if not sep or key not in priority.WINDOW_KEYS:
+            raise ValueError(f"Invalid schedule field '{field}' (expected {'=, '.join(priority.WINDOW_KEYS)}=)")
+        window.append((key, setting))
+    # Validates the values; they are applied on top of the configured priority
+    priority.parse_priority(dict(window))
+    return ScheduleEntry(
+        start=_parse_minute(start_h, start_m, value),
+        end=_parse_minute(end_h, end_m, value),
+        speed=parse_speed(speed),
+        priority=tuple(window),
+    )
+
+
+class CompiledSchedule:
+    """
+    A schedule resolved into a sorted table of non-overlapping intervals.
+
+    Priority (first matching entry wins) and midnight wraparound are resolved
+    once at construction time. Each interval in the table starts at a minute of
+    the day and lasts until the next one; adjacent intervals always differ in
+    limit or process priority. Looking up the limit for a time is a binary
+    search and finding the next transition is a table lookup.
+    """
+
+    def __init__(self, entries: List[ScheduleEntry], default_speed: int = 0):
+        """
+        Args:
+            entries: Schedule entries in priority order.
+            default_speed: Speed used outside of every schedule, in bytes/sec.
+        """
+        self.entries = list(entries)
+        self.default_speed = default_speed
+        # Priority settings changed by at least one window
+        self.priority_keys = frozenset(key for e in entries for key, _ in e.priority)
+
+        boundaries = sorted({0} | {e.start for e in entries} | {e.end for e in entries})
+        starts: List[int] = []
+        states: List[Tuple[int, Tuple[Tuple[str, str], ...]]] = []
+        for minute in boundaries:
+            entry = next((e for e in entries if e.covers(minute)), None)
+            state = (entry.speed, entry.priority) if entry else (default_speed, ())
+            if not states or states[-1] != state:
+                starts.append(minute)
+                states.append(state)
+        self._starts = starts
+        self._limits = [limit for limit, _ in states]
+        self._priorities = [window for _, window in states]
+
+        # Minutes from midnight (possibly on the next day) at which the limit
+        # changes after each interval, or None if the limit never changes.
+        count = len(starts)
+        self._next_change: List[Optional[int]] = []
+        for i in range(count):
+            if count == 1:
+                self._next_change.append(None)
+            elif i + 1 < count:
+                self._next_change.append(starts[i + 1])
+            elif states[-1] != states[0]:
+                self._next_change.append(MINUTES_PER_DAY)
+            else:
+                # The last interval continues into the first one after midnight
+                self._next_change.append(MINUTES_PER_DAY + starts[1])
+
+    def __repr__(self) -> str:
+        return f"CompiledSchedule({self.entries!r}, default_speed={self.default_speed})"
+
+    @property
+    def intervals(self) -> List[Tuple[int, int]]:
+        """The resolved table as (start minute, limit) pairs."""
+        return list(zip(self._starts, self._limits))
+
+    def _index(self, minute: int) -> int:
+        return bisect_right(self._starts, minute) - 1
+
+    def limit_at(self, when: datetime) -> int:
+        """
+        Returns the speed limit that applies at the given time.
+
+        Args:
+            when: The time to look up.
+
+        Returns:
+            The speed limit in bytes/sec (0 means unlimited).
+        """
+        return self._limits[self._index(when.hour * 60 + when.minute)]
+
+    def priority_at(self, when: datetime) -> Tuple[Tuple[str, str], ...]:
+        """
+        Returns the process priority settings of the window at the given time.
+
+        Args:
+            when: The time to look up.
+
+        Returns:
+            (key, value) pairs; empty outside of windows that set any.
+        """
+        return self._priorities[self._index(when.hour * 60 + when.minute)]
+
+    def next_transition(self, when: datetime) -> Optional[datetime]:
+        """
+        Returns the first moment after `when` at which the limit or priority changes.
+
+        Args:
+            when: The reference time.
+
+        Returns:
+            The datetime of the next transition, or None if the limit is the
+            same all day.
+        """
+        change = self._next_change[self._index(when.hour * 60 + when.minute)]
+        if change is None:
+            return None
+        midnight = when.replace(hour=0, minute=0, second=0, microsecond=0)
+        return midnight + timedelta(minutes=change)
+
+    def transitions(self, start: datetime, until: datetime) -> Iterator[Tuple[datetime, int]]:
+        """
+        Yields every schedule boundary between two times.
+
+        A boundary changes the speed limit, the process priority, or both, so
+        consecutive items may carry the same limit when only the priority
+        changes. The first item is always `start` with the limit in effect at
+        that time.
+
+        Args:
+            start: Beginning of the simulated timeline.
+            until: End of the simulated timeline (exclusive).
+
+        Yields:
+            (time, limit in effect from then) pairs in chronological order.
+        """
+        when: Optional[datetime] = start
+        while when is not None and when < until:
+            yield when, self.limit_at(when)
+            when = self.next_transition(when)
+
+
+def _schedule_priority(key: str) -> Tuple[int, str]:
+    match = _SCHEDULE_KEY_RE.match(key)
+    return (int(match.group(1)), key) if match else (0, key)
+
+
+def schedule_items(config: ConfigParser) -> List[Tuple[str, str]]:
+    """
+    Returns the raw `[schedules]` entries in priority order.
+
+    Entries are prioritised by their numeric suffix (s1, s2, ..., s10).
+
+    Args:
+        config: The loaded configuration.
+
+    Returns:
+        (key, value) pairs, highest priority first.
+    """
+    if not config.has_section("schedules"):
+        return []
+    keys = sorted(config.options("schedules"), key=_schedule_priority)
+    return [(key, config.get("schedules", key)) for key in keys]
+
+
+def load_schedule(config: ConfigParser) -> CompiledSchedule:
+    """
+    Compiles the `[schedules]` section of a configuration.
+
+    The `max_download_speed` setting is used outside of every schedule.
+
+    Args:
+        config: The loaded configuration.
+
+    Returns:
+        The compiled schedule.
+
+    Raises:
+        ValueError: If a schedule line or the default speed is malformed.
+    """
+    default_speed = parse_speed(config.get("settings", "max_download_speed", fallback="0"))
+    entries = [parse_schedule(value) for _, value in schedule_items(config)]
+    return CompiledSchedule(entries, default_speed)
+
+
+def apply_speed_limit(client, speed: int):
+    """
+    Sends the global download limit to the running daemon.
+
+    Args:
+        client: An aria2p client.
+        speed: The limit in bytes/sec (0 means unlimited).
+    """
+    client.change_global_option({"max-overall-download-limit": format_speed(speed)})
+
+
+def apply_priority(
+    settings: "Settings", window: Tuple[Tuple[str, str], ...], pid_file: Path = daemon.DEFAULT_PID_FILE
+) -> int:
+    """
+    Applies a schedule window's process priority to the local daemons.
+
+    The window's settings are applied on top of the configured ones.
+    Settings that some window changes but the configuration leaves unset
+    are reset to their defaults (nice 0, all CPUs, no cgroup limits)
+    outside of that window.
+
+    Args:
+        settings: The loaded settings.
+        window: The window's (key, value) pairs, from `priority_at`.
+        pid_file: The daemons' PID file.
+
+    Returns:
+        The number of daemons updated; 0 when `[nodes]` lists remote daemons.
+    """
+    if settings.nodes:
+        return 0
+    base = priority.with_neutral(settings.priority, settings.schedule.priority_keys)
+    limits = priority.parse_priority(dict(window), base)
+    pids = daemon.running_pids(pid_file)
+    for pid in pids:
+        priority.apply(pid, limits, str(settings.dest_folder))
+    logger.info("Applied process priority %s to %d daemons", dict(window) or "defaults", len(pids))
+    return len(pids)
+
+
+def run_once(settings: "Settings", now: Optional[datetime] = None) -> int:
+    """
+    Applies the limit for the current time once (the cron entry point).
+
+    If any schedule window sets a process priority, the daemons' priority
+    for the current time is applied as well.
+
+    Args:
+        settings: The loaded settings.
+        now: The time to use instead of the current time.
+
+    Returns:
+        The limit that was applied, in bytes/sec.
+    """
+    now = now or datetime.now()
+    speed = settings.schedule.limit_at(now)
+    apply_speed_limit(pool.connect(settings), speed)
+    logger.info("Applied speed limit %s", format_speed(speed))
+    if settings.schedule.priority_keys:
+        apply_priority(settings, settings.schedule.priority_at(now))
+    return speed
+
+
+class ScheduleFollower:
+    """
+    Keeps the daemon's speed limit in sync with a schedule from a resident process.
+
+    The follower remembers the limit it last applied and the aria2c session it
+    applied it to. A `change_global_option` call is only sent when the schedule
+    crosses a boundary or when the session ID changes, i.e. aria2c was
+    restarted and lost its options. Between checks it sleeps until the next
+    schedule transition or the next restart check, whichever comes first.
+
+    With `on_priority`, a window's process priority settings are handed to
+    it whenever they change, and again after a restart (the new daemon has
+    a new PID).
+    """
+
+    def __init__(
+        self,
+        schedule: CompiledSchedule,
+        client,
+        check_interval: float = DEFAULT_CHECK_INTERVAL,
+        clock: Callable[[], datetime] = datetime.now,
+        sleep: Callable[[float], None] = time.sleep,
+        on_priority: Optional[Callable[[Tuple[Tuple[str, str], ...]], None]] = None,
+    ):
+        """
+        Args:
+            schedule: The compiled schedule to follow.
+            client: An aria2p client for the daemon.
+            check_interval: Maximum seconds between daemon restart checks.
+            clock: Returns the current local time.
+            sleep: Sleeps for the given number of seconds.
+            on_priority: Applies a window's priority, e.g. `apply_priority`.
+        """
+        self.schedule = schedule
+        self.client = client
+        self.check_interval = check_interval
+        self.clock = clock
+        self.sleep = sleep
+        self.on_priority = on_priority
+        self.applied_speed: Optional[int] = None
+        self.applied_priority: Optional[Tuple[Tuple[str, str], ...]] = None
+        self.session_id: Optional[str] = None
+
+    def tick(self) -> Optional[datetime]:
+        """
+        Checks the daemon once and applies the limit if it is out of date.
+
+        Returns:
+            The time of the next schedule transition, or None if there is none.
+        """
+        from aria2p import ClientException
+
+        now = self.clock()
+        speed = self.schedule.limit_at(now)
+        try:
+            session_id = self.client.get_session_info()["sessionId"]
+            restarted = session_id != self.session_id
+            if restarted or speed != self.applied_speed:
+                if self.session_id is not None and restarted:
+                    logger.info("aria2c session changed, re-applying speed limit")
+                apply_speed_limit(self.client, speed)
+                logger.info("Applied speed limit %s", format_speed(speed))
+                self.session_id, self.applied_speed = session_id, speed
+            window = self.schedule.priority_at(now)
+            if self.on_priority is not None and (restarted or window != self.applied_priority):
+                self.on_priority(window)
+                self.applied_priority = window
+        except (OSError, ClientException) as error:
+            # The daemon is down or restarting; force a re-apply once it is back
+            logger.warning("Could not reach aria2c: %s", error)
+            self.session_id = self.applied_speed = self.applied_priority = None
+        return self.schedule.next_transition(now)
+
+    def run(self, iterations: Optional[int] = None):
+        """
+        Runs the follow loop.
+
+        Args:
+            iterations: Stop after this many checks. Runs forever if None.
+        """
+        while iterations is None or iterations > 0:
+            transition = self.tick()
+            delay = self.check_interval
+            if transition is not None:
+                delay = min(delay, max((transition - self.clock()).total_seconds(), 0.0))
+            if iterations is not None:
+                iterations -= 1
+                if iterations == 0:
+                    break
+            self.sleep(delay)
@@ -0,0 +1,224 @@
+import bisect
+import hashlib
+import marshal
+import os
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Bump whenever the layout of a saved snapshot changes
+SNAPSHOT_VERSION = 1
+# Download statuses, stored as one byte per row
+STATUSES = ("active", "waiting", "paused", "complete", "error", "removed")
+# aria2c GIDs are 16 hex digits, so they are stored back to back
+GID_LENGTH = 16
+
+
+class StaleSnapshotError(ValueError):
+    """Raised when the queue changed in a way that makes a shown row number ambiguous."""
+
+
+class RowSnapshot:
+    """
+    The rows printed by the last `list`: row number -> GID, status and owner.
+
+    `remove` and `move` look row numbers up here instead of fetching the
+    whole queue, so a row always means the download that was shown at it,
+    even if the queue has changed since. The snapshot is stamped with the
+    aria2c session ID; after a restart it is stale.
+
+    Rows are kept in flat arrays (numbers, concatenated GIDs, status bytes,
+    owner bytes) so that a snapshot of a large queue stays small and loads
+    with a single unmarshal.
+    """
+
+    def __init__(self, server: str, session: str, active: int):
+        """
+        Args:
+            server: The daemon (or group) the rows came from.
+            session: Its session ID when the rows were listed.
+            active: The number of active downloads, which precede the
+                waiting ones in row order.
+        """
+        self.server = server
+        self.session = session
+        self.active = active
+        self._rows = array("q")
+        self._gids: List[str] = []
+        self._statuses = bytearray()
+        self._owners = bytearray()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, row: int, download: dict, owner: int = 0):
+        """
+        Records a shown row. Rows must be added in increasing order.
+
+        Args:
+            row: The row number.
+            download: A status dict with `gid` and `status`.
+            owner: The instance holding the download, for groups.
+        """
+        self._rows.append(row)
+        self._gids.append(download["gid"])
+        self._statuses.append(STATUSES.index(download["status"]))
+        self._owners.append(owner)
+
+    def lookup(self, row: int) -> Optional[Tuple[str, str, int]]:
+        """
+        Finds a shown row.
+
+        Args:
+            row: The row number.
+
+        Returns:
+            The (gid, status, owner) shown at the row, or None if the last
+            `list` did not show it.
+        """
+        index = bisect.bisect_left(self._rows, row)
+        if index == len(self._rows) or self._rows[index] != row:
+            return None
+        return self._gids[index], STATUSES[self._statuses[index]], self._owners[index]
+
+    def dump(self) -> tuple:
+        """Returns the snapshot as marshal-friendly values."""
+        return (
+            SNAPSHOT_VERSION,
+            self.server,
+            self.session,
+            self.active,
+            self._rows.tobytes(),
+            "".join(self._gids),
+            bytes(self._statuses),
+            bytes(self._owners),
+        )
+
+    @classmethod
+    def restore(cls, values: tuple) -> "RowSnapshot":
+        """
+        Rebuilds a snapshot from `dump` output.
+
+        Raises:
+            ValueError: If the values are from another snapshot version.
+        """
+        version, server, session, active, rows, gids, statuses, owners = values
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}")
+        snapshot = cls(server, session, active)
+        snapshot._rows.frombytes(rows)
+        snapshot._gids = [gids[i:i + GID_LENGTH] for i in range(0, len(gids), GID_LENGTH)]
+        snapshot._statuses = bytearray(statuses)
+        snapshot._owners = bytearray(owners)
+        return snapshot
+
+
+def snapshot_file(server: str) -> Path:
+    """
+    Returns where the row snapshot of a daemon is kept.
+
+    Args:
+        server: The daemon's (or group's) address.
+
+    Returns:
+        A file in the settings cache directory.
+    """
+    from pydownloader.config import cache_dir
+
+    digest = hashlib.sha1(server.encode()).hexdigest()[:16]
+    return cache_dir() / f"rows-{digest}.bin"
+
+
+def save(snapshot: RowSnapshot):
+    """
+    Writes a snapshot, replacing the previous one atomically.
+
+    Saving is best-effort: a read-only cache only costs the fast path.
+
+    Args:
+        snapshot: The snapshot to save.
+    """
+    path = snapshot_file(snapshot.server)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            marshal.dump(snapshot.dump(), f)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def load(server: str) -> Optional[RowSnapshot]:
+    """
+    Reads the last snapshot of a daemon.
+
+    Args:
+        server: The daemon's (or group's) address.
+
+    Returns:
+        The snapshot, or None if there is none or it cannot be read.
+    """
+    try:
+        with open(snapshot_file(server), "rb") as f:
+            snapshot = RowSnapshot.restore(marshal.load(f))
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    return snapshot if snapshot.server == server else None
+
+
+def check_session(snapshot: RowSnapshot, client):
+    """
+    Makes sure the daemon was not restarted since the snapshot was taken.
+
+    Args:
+        snapshot: The snapshot.
+        client: A client for the daemon (or group).
+
+    Raises:
+        StaleSnapshotError: If the session ID changed.
+    """
+    if client.get_session_info()["sessionId"] != snapshot.session:
+        raise StaleSnapshotError("aria2c was restarted since the last `list`; run `list` again")
+
+
+async def revalidate(ctl, snapshot: RowSnapshot, rows: Sequence[int]) -> Dict[int, dict]:
+    """
+    Fetches the current status of the downloads shown at some rows.
+
+    Only those downloads are queried, with one `tellStatus` each.
+
+    Args:
+        ctl: An AsyncController or ControllerGroup.
+        snapshot: The snapshot the rows refer to.
+        rows: Row numbers present in the snapshot.
+
+    Returns:
+        Row number -> current status dict (`gid` and `status`).
+
+    Raises:
+        StaleSnapshotError: If a download is no longer known to aria2c.
+    """
+    import asyncio
+
+    from aria2p import ClientException
+
+    entries = {row: snapshot.lookup(row) for row in rows}
+    owners = getattr(ctl.client, "owners", None)
+    if owners is not None:
+        for gid, _, owner in entries.values():
+            owners.setdefault(gid, owner)
+    results = await asyncio.gather(
+        *(ctl.status(gid, ["gid", "status"]) for gid, _, _ in entries.values()), return_exceptions=True
+    )
+    current = {}
+    for (row, (gid, _, _)), result in zip(entries.items(), results):
+        if isinstance(result, ClientException):
+            raise StaleSnapshotError(f"Row {row} (GID {gid}) is no longer in the queue; run `list` again")
+        if isinstance(result, BaseException):
+            raise result
+        current[row] = result
+    return current
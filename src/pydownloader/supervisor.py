@@ -0,0 +1,253 @@
+import logging
+import os
+import signal
+import subprocess
+import threading
+import time
+from configparser import ConfigParser
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from pydownloader import daemon, priority
+
+logger = logging.getLogger(__name__)
+
+# First delay before restarting a crashed daemon, in seconds
+DEFAULT_MIN_BACKOFF = 1.0
+# Longest delay between restarts of a daemon that keeps crashing
+DEFAULT_MAX_BACKOFF = 300.0
+# A daemon that ran this long before exiting is not in a crash loop
+DEFAULT_STABLE_AFTER = 60.0
+
+
+class Supervisor:
+    """
+    Runs the aria2c daemons as child processes and restarts any that die.
+
+    The daemons run in the foreground so that the supervisor is their parent
+    and can block in `waitpid` until one exits; nothing is polled. A crashed
+    daemon is restarted from its session file after a delay that starts at
+    `min_backoff` and doubles while it keeps crashing within `stable_after`
+    seconds of starting, up to `max_backoff`. After each restart
+    `on_restart` is called, e.g. to re-apply the scheduler's speed limit,
+    and the downtime (exit until RPC ready) is logged.
+
+    Each daemon gets the configured process priority when it starts; the
+    scheduler's time windows are re-applied through `on_restart`.
+
+    SIGTERM and SIGINT stop the supervisor. It first saves every daemon's
+    session, then terminates the daemons and waits for them.
+    """
+
+    def __init__(
+        self,
+        config: ConfigParser,
+        pid_file: Path = daemon.DEFAULT_PID_FILE,
+        on_restart: Optional[Callable[[int], None]] = None,
+        ready_timeout: float = daemon.DEFAULT_READY_TIMEOUT,
+        min_backoff: float = DEFAULT_MIN_BACKOFF,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        stable_after: float = DEFAULT_STABLE_AFTER,
+        spawn: Optional[Callable[[int], subprocess.Popen]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Optional[Callable[[float], None]] = None,
+    ):
+        """
+        Args:
+            config: The loaded configuration.
+            pid_file: Where to record the daemons' PIDs.
+            on_restart: Called with the instance index after a restart.
+            ready_timeout: Seconds to wait for a daemon's RPC interface.
+            min_backoff: First delay before a restart.
+            max_backoff: Maximum delay before a restart.
+            stable_after: Uptime after which a crash resets the backoff.
+            spawn: Launches instance N; defaults to running aria2c.
+            clock: Returns a monotonic time in seconds.
+            sleep: Sleeps for the given number of seconds. By default the
+                sleep ends early when the supervisor is stopped.
+        """
+        self.config = config
+        self.pid_file = pid_file
+        self.on_restart = on_restart
+        self.ready_timeout = ready_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.clock = clock
+        self._stopped = threading.Event()
+        self.sleep = sleep or self._stopped.wait
+        self._spawn = spawn or self._spawn_aria2c
+        self.port = config.getint("settings", "rpc_port")
+        self.secret = config.get("settings", "rpc_secret", fallback="")
+        self.priority = priority.load_priority(config)
+        self.processes: Dict[int, subprocess.Popen] = {}
+        self.restarts = 0
+        self.stopping = False
+        self._started_at: Dict[int, float] = {}
+        self._backoff: Dict[int, float] = {}
+
+    def _spawn_aria2c(self, index: int) -> subprocess.Popen:
+        daemon.prepare_session(daemon.session_file(self.config, index))
+        return subprocess.Popen(
+            daemon.build_command(self.config, index, foreground=True),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+        )
+
+    def _write_pids(self):
+        daemon.write_pid_file(self.pid_file, [self.processes[index].pid for index in sorted(self.processes)])
+
+    def launch(self, index: int) -> float:
+        """
+        Starts one daemon and waits until it answers RPC calls.
+
+        Args:
+            index: The instance number.
+
+        Returns:
+            Seconds until it was ready.
+
+        Raises:
+            TimeoutError: If it does not become ready in time.
+            RuntimeError: If it exits with an error while starting.
+        """
+        process = self._spawn(index)
+        self.processes[index] = process
+        self._started_at[index] = self.clock()
+        try:
+            ready = daemon.wait_until_ready(self.port + index, self.secret, self.ready_timeout, process)
+        except (TimeoutError, RuntimeError):
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            del self.processes[index]
+            raise
+        if self.priority != priority.ProcessPriority():
+            priority.apply(process.pid, self.priority, self.config.get("settings", "dest_folder"))
+        self._write_pids()
+        return ready
+
+    def _next_backoff(self, index: int, uptime: float) -> float:
+        if uptime >= self.stable_after or index not in self._backoff:
+            backoff = self.min_backoff
+        else:
+            backoff = min(self._backoff[index] * 2, self.max_backoff)
+        self._backoff[index] = backoff
+        return backoff
+
+    def restart(self, index: int, exited_at: float):
+        """
+        Restarts a daemon that exited, retrying with backoff until it is ready.
+
+        Args:
+            index: The instance number.
+            exited_at: When the daemon exited, per `clock`.
+        """
+        uptime = exited_at - self._started_at.get(index, exited_at)
+        while not self.stopping:
+            backoff = self._next_backoff(index, uptime)
+            logger.info("Restarting aria2c instance %d in %.1fs", index, backoff)
+            self.sleep(backoff)
+            if self.stopping:
+                return
+            try:
+                self.launch(index)
+            except (TimeoutError, RuntimeError, OSError) as error:
+                logger.error("aria2c instance %d failed to start: %s", index, error)
+                uptime = 0.0
+                continue
+            self.restarts += 1
+            logger.warning(
+                "aria2c instance %d is back after %.1fs of downtime (restart #%d)",
+                index,
+                self.clock() - exited_at,
+                self.restarts,
+            )
+            if self.on_restart is not None:
+                try:
+                    self.on_restart(index)
+                except Exception:
+                    logger.exception("Restoring state of aria2c instance %d failed", index)
+            return
+
+    def _reap(self) -> Optional[int]:
+        # Blocks until any child exits; returns its instance number
+        try:
+            pid, status = os.waitpid(-1, 0)
+        except ChildProcessError:
+            return None
+        for index, process in list(self.processes.items()):
+            if process.pid == pid:
+                # Tell Popen the child is gone so it does not wait on it again
+                process.returncode = os.waitstatus_to_exitcode(status)
+                del self.processes[index]
+                logger.log(
+                    logging.INFO if self.stopping else logging.ERROR,
+                    "aria2c instance %d (PID %d) exited with status %d",
+                    index,
+                    pid,
+                    process.returncode,
+                )
+                return index
+        return -1
+
+    def terminate(self):
+        """Saves every running daemon's session, then sends it SIGTERM."""
+        self.stopping = True
+        self._stopped.set()
+        for index, process in list(self.processes.items()):
+            try:
+                daemon.call(self.port + index, self.secret, "aria2.saveSession", timeout=5.0)
+            except (OSError, ValueError) as error:
+                logger.warning("Could not save the session of aria2c instance %d: %s", index, error)
+            try:
+                process.terminate()
+            except ProcessLookupError:
+                pass
+
+    def _on_signal(self, signum, frame):
+        logger.info("Received signal %d, stopping the daemons", signum)
+        self.terminate()
+
+    def run(self, max_restarts: Optional[int] = None):
+        """
+        Starts the daemons and supervises them until stopped.
+
+        Args:
+            max_restarts: Return after this many restarts. Runs until stopped
+                if None.
+
+        Raises:
+            RuntimeError: If the daemons or another supervisor are already
+                running.
+        """
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self._on_signal)
+            signal.signal(signal.SIGINT, self._on_signal)
+        supervisor_file = daemon.supervisor_pid_file(self.pid_file)
+        with daemon.pid_lock(self.pid_file):
+            daemon.check_not_running(self.pid_file)
+            daemon.write_pid_file(supervisor_file, [os.getpid()])
+        try:
+            for index in range(daemon.instance_count(self.config)):
+                ready = self.launch(index)
+                logger.info("aria2c instance %d ready in %.3fs", index, ready)
+            while self.processes:
+                index = self._reap()
+                if index is None:
+                    break
+                if index < 0 or self.stopping:
+                    continue
+                self.restart(index, self.clock())
+                if max_restarts is not None and self.restarts >= max_restarts:
+                    break
+        finally:
+            self.terminate()
+            while self.processes and self._reap() is not None:
+                pass
+            for path in (self.pid_file, supervisor_file):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
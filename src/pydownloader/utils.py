@@ -0,0 +1,193 @@
+import io
+import logging
+import re
+import sys
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional, Tuple, Union
+
+# Multipliers for the size suffixes understood by aria2c (K = 1024, M = 1024K)
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+# Magic numbers of the compressed formats accepted for URL lists
+GZIP_MAGIC = b"\x1f\x8b"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Icons shown in the `list` table for each aria2c download status
+STATUS_ICONS = {
+    "active": "⏳",
+    "waiting": "⏳",
+    "paused": "⏸️",
+    "complete": "✅",
+    "error": "❌",
+    "removed": "❌",
+}
+
+_SPEED_RE = re.compile(r"^\s*(\d+)\s*([KMG]?)\s*$", re.IGNORECASE)
+
+
+def parse_speed(value: str) -> int:
+    """
+    Converts an aria2c-style speed string into bytes per second.
+
+    Args:
+        value: A speed such as "0", "500K", "2M" or "1G". "0" means unlimited.
+
+    Returns:
+        The speed in bytes per second.
+
+    Raises:
+        ValueError: If the value is not a valid speed.
+    """
+    match = _SPEED_RE.match(value)
+    if not match:
+        raise ValueError(f"Invalid speed value: '{value}'")
+    number, unit = match.groups()
+    return int(number) * SIZE_UNITS[unit.upper()]
+
+
+def format_speed(speed: int) -> str:
+    """
+    Formats a speed in bytes per second using the largest exact aria2c unit.
+
+    Args:
+        speed: The speed in bytes per second. 0 means unlimited.
+
+    Returns:
+        A string such as "0", "500K" or "2M", accepted by aria2c as-is.
+    """
+    # aria2c only accepts K and M suffixes for speeds
+    for unit in ("M", "K"):
+        if speed and speed % SIZE_UNITS[unit] == 0:
+            return f"{speed // SIZE_UNITS[unit]}{unit}"
+    return str(speed)
+
+
+def truncate_url(url: str, width: int = 60) -> str:
+    """
+    Shortens a URL from the start, keeping the (more informative) end.
+
+    Args:
+        url: The URL to shorten.
+        width: The maximum length of the result.
+
+    Returns:
+        The URL, prefixed with "..." if it had to be cut.
+    """
+    if len(url) <= width:
+        return url
+    return "..." + url[-(width - 3):]
+
+
+def format_size(size: int) -> str:
+    """
+    Formats a number of bytes for display, e.g. 1536 -> "1.5 KiB".
+
+    Args:
+        size: The size in bytes.
+
+    Returns:
+        The human-readable size.
+    """
+    value = float(size)
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if value < 1024:
+            return f"{value:.0f} B" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TiB"
+
+
+def progress_percent(download: dict) -> float:
+    """
+    Returns the completion percentage of an aria2c status dict.
+
+    Args:
+        download: A status dict with `totalLength` and `completedLength`.
+
+    Returns:
+        The percentage, 0 if the total size is not known yet.
+    """
+    total = int(download.get("totalLength", 0))
+    if not total:
+        return 0.0
+    return int(download.get("completedLength", 0)) * 100 / total
+
+
+def first_uri(download: dict) -> str:
+    """
+    Returns the first URI of an aria2c status dict.
+
+    Args:
+        download: A status dict with `files`.
+
+    Returns:
+        The URI, or an empty string if there is none (e.g. magnet metadata).
+    """
+    for file in download.get("files", []):
+        for uri in file.get("uris", []):
+            return uri["uri"]
+    return ""
+
+
+def setup_logger(log_file: Optional[Union[str, Path]] = None, level: int = logging.INFO):
+    """
+    Configures the root logger for the application.
+
+    Args:
+        log_file: Path of the log file. Logs go to stderr if empty or None.
+        level: The logging level.
+    """
+    handler = logging.FileHandler(log_file) if log_file else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def _decompress(raw: BinaryIO) -> BinaryIO:
+    buffered = raw if isinstance(raw, io.BufferedReader) else io.BufferedReader(raw)
+    head = buffered.peek(6)[:6]
+    if head.startswith(GZIP_MAGIC):
+        import gzip
+
+        return gzip.GzipFile(fileobj=buffered)
+    if head.startswith(XZ_MAGIC):
+        import lzma
+
+        return lzma.LZMAFile(buffered)
+    if head.startswith(ZSTD_MAGIC):
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("Reading zstd-compressed lists requires the 'zstandard' package")
+        return zstandard.ZstdDecompressor().stream_reader(buffered)
+    return buffered
+
+
+def iter_url_list(path: Union[str, Path]) -> Iterator[Tuple[int, str]]:
+    """
+    Lazily reads URLs from a text file, one per line.
+
+    The file is streamed, never read into memory as a whole. gzip, xz and
+    zstd compression are detected from the file's magic number, and "-" reads
+    from standard input. Blank lines and lines starting with "#" are skipped.
+
+    Args:
+        path: The list file, or "-" for stdin.
+
+    Yields:
+        (line number, URL) pairs.
+
+    Raises:
+        ValueError: If the list is zstd-compressed and zstandard is missing.
+    """
+    raw = sys.stdin.buffer if str(path) == "-" else open(path, "rb")
+    try:
+        stream = io.TextIOWrapper(_decompress(raw), encoding="utf-8", errors="replace")
+        for line_number, line in enumerate(stream, start=1):
+            url = line.strip()
+            if url and not url.startswith("#"):
+                yield line_number, url
+    finally:
+        if raw is not sys.stdin.buffer:
+            raw.close()
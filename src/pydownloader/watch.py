@@ -0,0 +1,168 @@
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from pydownloader import events
+from pydownloader.bulk import fault_message
+from pydownloader.utils import STATUS_ICONS, first_uri, format_size, progress_percent, truncate_url
+
+logger = logging.getLogger(__name__)
+
+# The only keys refetched on each refresh; the URL never changes
+CHANGING_KEYS = ["status", "totalLength", "completedLength", "downloadSpeed"]
+DEFAULT_REFRESH = 1.0
+# With notifications, every row is still refetched this often (in refreshes),
+# for changes aria2c does not notify, e.g. an unpause or a purged result
+FULL_POLL_EVERY = 10
+
+
+class WatchModel:
+    """
+    The state behind `list --watch`.
+
+    The set of rows is fixed when the watch starts. Each refresh sends a
+    single `system.multicall` with one field-projected `tellStatus` per row
+    on screen and one `getGlobalStat`. RPC load and CPU time are therefore
+    proportional to the number of visible rows, not to the queue size.
+    Rendered cells are cached per row and rebuilt only when a value changes.
+
+    Once subscribed to an EventBus, status changes come from aria2c's
+    notifications, and a refresh only refetches the rows that are active,
+    the only ones whose progress and speed move. Every row is refetched one
+    refresh in FULL_POLL_EVERY as a fallback.
+    """
+
+    def __init__(self, client, rows: List[Tuple[int, dict]]):
+        """
+        Args:
+            client: An aria2p client.
+            rows: The (row number, download) pairs to watch, with `files`.
+        """
+        self.client = client
+        self.rows = [(row, download["gid"]) for row, download in rows]
+        self.downloads: Dict[str, dict] = {download["gid"]: dict(download) for _, download in rows}
+        self.global_stat: Dict[str, str] = {}
+        self._cells: Dict[str, Tuple[str, ...]] = {}
+        # Filled by the listener thread, drained by `poll`
+        self._events: Deque[events.Event] = deque()
+        self._subscribed = False
+        self._polls = 0
+
+    def subscribe(self, bus: events.EventBus):
+        """
+        Takes status changes from a bus fed by aria2c's notifications.
+
+        Args:
+            bus: The bus to subscribe to.
+        """
+        bus.subscribe(events.ALL, self._events.append)
+        self._subscribed = True
+
+    def _apply_events(self) -> Set[str]:
+        changed = set()
+        while self._events:
+            event = self._events.popleft()
+            status = events.EVENT_STATUSES.get(event.type)
+            download = self.downloads.get(event.gid)
+            if download is not None and status and download["status"] != status:
+                download["status"] = status
+                changed.add(event.gid)
+                self._cells.pop(event.gid, None)
+        return changed
+
+    def poll(self) -> Set[str]:
+        """
+        Refreshes the changing fields of the visible rows.
+
+        Returns:
+            The GIDs whose values changed.
+        """
+        changed = self._apply_events()
+        rows = self.rows
+        if self._subscribed and self._polls % FULL_POLL_EVERY:
+            rows = [(row, gid) for row, gid in self.rows if self.downloads[gid]["status"] == "active"]
+        self._polls += 1
+        calls = [("aria2.tellStatus", [gid, CHANGING_KEYS]) for _, gid in rows]
+        calls.append(("aria2.getGlobalStat", []))
+        results = self.client.multicall2(calls)
+        self.global_stat = results[-1][0] if fault_message(results[-1]) is None else {}
+
+        for (_, gid), result in zip(rows, results):
+            # A download whose result was purged is reported as gone
+            update = {"status": "removed"} if fault_message(result) else result[0]
+            download = self.downloads[gid]
+            if any(download.get(key) != value for key, value in update.items()):
+                download.update(update)
+                changed.add(gid)
+                self._cells.pop(gid, None)
+        return changed
+
+    def cells(self, gid: str) -> Tuple[str, ...]:
+        """
+        Returns the rendered table cells of a row, cached until it changes.
+
+        Args:
+            gid: The download's GID.
+
+        Returns:
+            The status icon, percentage, speed and URL cells.
+        """
+        if gid not in self._cells:
+            download = self.downloads[gid]
+            speed = int(download.get("downloadSpeed", 0))
+            self._cells[gid] = (
+                STATUS_ICONS.get(download["status"], "?"),
+                f"{progress_percent(download):.0f}%",
+                f"{format_size(speed)}/s" if speed else "",
+                truncate_url(first_uri(download), 60),
+            )
+        return self._cells[gid]
+
+    def render(self):
+        """Builds the rich renderable for the current state."""
+        from rich.table import Table
+
+        speed = int(self.global_stat.get("downloadSpeed", 0))
+        caption = (
+            f"Total: {format_size(speed)}/s, {self.global_stat.get('numActive', '?')} active, "
+            f"{self.global_stat.get('numWaiting', '?')} waiting"
+        )
+        table = Table(caption=caption)
+        table.add_column("#", justify="right")
+        table.add_column("Status")
+        table.add_column("%", justify="right")
+        table.add_column("Speed", justify="right")
+        table.add_column("URL")
+        for row, gid in self.rows:
+            table.add_row(str(row), *self.cells(gid))
+        return table
+
+
+def watch(
+    model: WatchModel,
+    refresh: float = DEFAULT_REFRESH,
+    iterations: Optional[int] = None,
+    sleep: Callable[[float], None] = time.sleep,
+):
+    """
+    Shows a live table until interrupted.
+
+    Args:
+        model: The rows to watch.
+        refresh: Seconds between refreshes.
+        iterations: Stop after this many refreshes. Runs forever if None.
+        sleep: Sleeps for the given number of seconds.
+    """
+    from rich.live import Live
+
+    model.poll()
+    with Live(model.render(), auto_refresh=False) as live:
+        live.refresh()
+        while iterations is None or iterations > 0:
+            sleep(refresh)
+            previous_stat = model.global_stat
+            if model.poll() or model.global_stat != previous_stat:
+                live.update(model.render(), refresh=True)
+            if iterations is not None:
+                iterations -= 1
@@ -0,0 +1,86 @@
+import pytest
+
+from tests.fake_aria2 import FakeAria2Server
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Keeps settings caches, `list` snapshots and the history store out of the real home directory."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path / "state"))
+
+
+@pytest.fixture
+def fake_aria2():
+    """Runs a fake aria2c JSON-RPC server for the duration of a test."""
+    server = FakeAria2Server(secret="secret_token").start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def fake_settings(fake_aria2):
+    """Provides settings pointing at the fake aria2c server."""
+    from configparser import ConfigParser
+
+    from pydownloader.config import parse_settings
+
+    config = ConfigParser()
+    config.read_dict(
+        {
+            "settings": {
+                "dest_folder": "/downloads",
+                "connections": "8",
+                "max_download_speed": "0",
+                "rpc_host": "127.0.0.1",
+                "rpc_port": str(fake_aria2.port),
+                "rpc_secret": "secret_token",
+            },
+            "schedules": {},
+        }
+    )
+    return parse_settings(config)
+
+
+@pytest.fixture
+def fake_group():
+    """Runs two fake aria2c servers on consecutive ports, like `instances = 2`."""
+    for _ in range(20):
+        first = FakeAria2Server(secret="secret_token")
+        try:
+            second = FakeAria2Server(secret="secret_token", port=first.port + 1)
+        except OSError:
+            first.server_close()
+            continue
+        servers = [first.start(), second.start()]
+        break
+    else:
+        pytest.skip("no two consecutive free ports")
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def group_settings(fake_group):
+    """Provides settings pointing at the two fake aria2c servers."""
+    from configparser import ConfigParser
+
+    from pydownloader.config import parse_settings
+
+    config = ConfigParser()
+    config.read_dict(
+        {
+            "settings": {
+                "dest_folder": "/downloads",
+                "connections": "8",
+                "max_download_speed": "0",
+                "rpc_host": "127.0.0.1",
+                "rpc_port": str(fake_group[0].port),
+                "rpc_secret": "secret_token",
+                "instances": "2",
+            },
+            "schedules": {},
+        }
+    )
+    return parse_settings(config)
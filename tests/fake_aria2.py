@@ -0,0 +1,258 @@
+"""
+An in-process stand-in for the aria2c JSON-RPC server.
+
+It keeps an in-memory queue and implements the subset of the aria2 RPC API
+used by pydownloader, so tests and benchmarks can exercise real HTTP round
+trips without aria2c installed.
+"""
+import itertools
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Shared by all fake daemons: like aria2c's random GIDs, they never collide
+_GIDS = itertools.count(1)
+
+
+class RPCFault(Exception):
+    def __init__(self, message, code=1):
+        super().__init__(message)
+        self.code = code
+
+
+class FakeAria2:
+    """The in-memory daemon state and RPC method implementations."""
+
+    def __init__(self, secret=""):
+        self.secret = secret
+        self.lock = threading.Lock()
+        self.downloads = {}
+        self.order = []
+        self.options = {}
+        self.session_id = "0" * 40
+        self.calls = 0
+        self.sessions_saved = 0
+
+    def add(self, uri, status="waiting", total=1000, completed=0, **extra):
+        gid = f"{next(_GIDS):016x}"
+        self.downloads[gid] = {
+            "gid": gid,
+            "status": status,
+            "totalLength": str(total),
+            "completedLength": str(completed),
+            "downloadSpeed": "0",
+            "files": [{"index": "1", "uris": [{"uri": uri, "status": "used"}]}],
+            **extra,
+        }
+        self.order.append(gid)
+        return gid
+
+    def _select(self, statuses):
+        return [self.downloads[gid] for gid in self.order if self.downloads[gid]["status"] in statuses]
+
+    @staticmethod
+    def _project(download, keys):
+        return {k: v for k, v in download.items() if k in keys} if keys else dict(download)
+
+    def _get(self, gid):
+        if gid not in self.downloads:
+            raise RPCFault(f"GID {gid} is not found")
+        return self.downloads[gid]
+
+    def dispatch(self, method, params):
+        if method == "system.multicall":
+            results = []
+            for call in params[0]:
+                try:
+                    results.append([self.dispatch(call["methodName"], list(call.get("params", [])))])
+                except RPCFault as fault:
+                    results.append({"faultCode": fault.code, "faultString": str(fault)})
+            return results
+        if method.startswith("aria2."):
+            if self.secret and (not params or params[0] != f"token:{self.secret}"):
+                raise RPCFault("Unauthorized")
+            if params and isinstance(params[0], str) and params[0].startswith("token:"):
+                params = params[1:]
+        self.calls += 1
+        handler = getattr(self, "rpc_" + method.split(".", 1)[1], None)
+        if handler is None:
+            raise RPCFault(f"No such method: {method}")
+        return handler(*params)
+
+    def rpc_getVersion(self):
+        return {"version": "1.37.0", "enabledFeatures": []}
+
+    def rpc_getSessionInfo(self):
+        return {"sessionId": self.session_id}
+
+    def rpc_changeGlobalOption(self, options):
+        self.options.update(options)
+        return "OK"
+
+    def rpc_getGlobalOption(self):
+        return dict(self.options)
+
+    def rpc_addUri(self, uris, options=None, position=None):
+        if not uris or "://" not in uris[0]:
+            raise RPCFault("No URI to download.")
+        gid = self.add(uris[0])
+        if position is not None:
+            self.order.remove(gid)
+            self.order.insert(position, gid)
+        return gid
+
+    def rpc_tellStatus(self, gid, keys=None):
+        return self._project(self._get(gid), keys)
+
+    def rpc_tellActive(self, keys=None):
+        return [self._project(d, keys) for d in self._select({"active"})]
+
+    def rpc_tellWaiting(self, offset, num, keys=None):
+        waiting = self._select({"waiting", "paused"})
+        return [self._project(d, keys) for d in waiting[offset:offset + num]]
+
+    def rpc_tellStopped(self, offset, num, keys=None):
+        stopped = self._select({"complete", "error", "removed"})
+        return [self._project(d, keys) for d in stopped[offset:offset + num]]
+
+    def rpc_getGlobalStat(self):
+        counts = {s: len(self._select({s})) for s in ("active", "waiting", "paused")}
+        return {
+            "downloadSpeed": str(sum(int(d["downloadSpeed"]) for d in self._select({"active"}))),
+            "uploadSpeed": "0",
+            "numActive": str(counts["active"]),
+            "numWaiting": str(counts["waiting"] + counts["paused"]),
+            "numStopped": str(len(self._select({"complete", "error", "removed"}))),
+            "numStoppedTotal": str(len(self._select({"complete", "error", "removed"}))),
+        }
+
+    def rpc_remove(self, gid):
+        download = self._get(gid)
+        if download["status"] in ("complete", "error", "removed"):
+            raise RPCFault(f"Active Download not found for GID#{gid}")
+        download["status"] = "removed"
+        return gid
+
+    rpc_forceRemove = rpc_remove
+
+    def rpc_pause(self, gid):
+        download = self._get(gid)
+        if download["status"] not in ("active", "waiting"):
+            raise RPCFault(f"GID#{gid} cannot be paused now")
+        download["status"] = "paused"
+        return gid
+
+    rpc_forcePause = rpc_pause
+
+    def rpc_unpause(self, gid):
+        download = self._get(gid)
+        if download["status"] != "paused":
+            raise RPCFault(f"GID#{gid} cannot be unpaused now")
+        download["status"] = "waiting"
+        return gid
+
+    def rpc_changePosition(self, gid, pos, how):
+        download = self._get(gid)
+        if download["status"] not in ("waiting", "paused"):
+            raise RPCFault(f"GID#{gid} not found in the waiting queue.")
+        waiting = [d["gid"] for d in self._select({"waiting", "paused"})]
+        current = waiting.index(gid)
+        base = {"POS_SET": 0, "POS_CUR": current, "POS_END": len(waiting) - 1}[how]
+        target = max(0, min(len(waiting) - 1, base + pos))
+        waiting.pop(current)
+        waiting.insert(target, gid)
+        rest = [g for g in self.order if g not in set(waiting)]
+        self.order = waiting + rest
+        return target
+
+    def rpc_removeDownloadResult(self, gid):
+        download = self._get(gid)
+        if download["status"] not in ("complete", "error", "removed"):
+            raise RPCFault(f"Could not remove download result of GID#{gid}")
+        del self.downloads[gid]
+        self.order.remove(gid)
+        return "OK"
+
+    def rpc_purgeDownloadResult(self):
+        for download in self._select({"complete", "error", "removed"}):
+            del self.downloads[download["gid"]]
+            self.order.remove(download["gid"])
+        return "OK"
+
+    def rpc_saveSession(self):
+        self.sessions_saved += 1
+        return "OK"
+
+    def rpc_shutdown(self):
+        return "OK"
+
+    rpc_forceShutdown = rpc_shutdown
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; avoid Nagle/delayed-ACK stalls
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        request = json.loads(body)
+        aria2 = self.server.aria2
+        try:
+            with aria2.lock:
+                result = aria2.dispatch(request["method"], list(request.get("params", [])))
+            response = {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+        except RPCFault as fault:
+            response = {
+                "jsonrpc": "2.0",
+                "id": request.get("id"),
+                "error": {"code": fault.code, "message": str(fault)},
+            }
+        payload = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json-rpc")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeAria2Server(ThreadingHTTPServer):
+    """A threaded HTTP server exposing a FakeAria2 on 127.0.0.1."""
+
+    daemon_threads = True
+
+    def __init__(self, secret="", port=0):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.aria2 = FakeAria2(secret)
+        self.connections = 0
+        self._sockets = []
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def get_request(self):
+        self.connections += 1
+        request = super().get_request()
+        self._sockets.append(request[0])
+        return request
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops serving and drops open keep-alive connections, like a killed daemon."""
+        self.shutdown()
+        self.server_close()
+        for sock in self._sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -0,0 +1,126 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from pydownloader import bulk, controller, pool, rpc
+
+
+def test_batched():
+    """
+    Tests that items are split into bounded batches.
+    """
+    assert list(bulk.batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+def test_add_urls_batches_requests(fake_aria2, fake_settings):
+    """
+    Tests that URLs are sent as multicall batches instead of one call each.
+    """
+    urls = ((i, f"http://example.com/{i}") for i in range(1, 1001))
+
+    report = bulk.add_urls(rpc.connect(fake_settings), urls, batch_size=100, max_in_flight=3)
+
+    assert report.added == 1000
+    assert report.failures == []
+    assert len(fake_aria2.aria2.downloads) == 1000
+
+
+def test_add_urls_reports_line_failures(fake_aria2, fake_settings):
+    """
+    Tests that a rejected URL is reported without aborting its batch.
+    """
+    urls = [(1, "http://example.com/a"), (2, "not-a-url"), (3, "http://example.com/b")]
+
+    report = bulk.add_urls(rpc.connect(fake_settings), urls, batch_size=10)
+
+    assert report.added == 2
+    assert report.failures == [bulk.LineFailure(2, "not-a-url", "No URI to download.")]
+
+
+def test_add_urls_connection_failure():
+    """
+    Tests that a failed request marks every line of its batch as failed.
+    """
+    client = MagicMock()
+    client.multicall2.side_effect = [ConnectionError("refused"), [["gid"]]]
+    urls = [(1, "http://a/1"), (2, "http://a/2"), (3, "http://a/3")]
+
+    report = bulk.add_urls(client, urls, batch_size=2, max_in_flight=1)
+
+    assert report.added == 1
+    assert [f.line for f in report.failures] == [1, 2]
+
+
+def test_parse_rows():
+    """
+    Tests that row selections accept numbers, closed and open ranges.
+    """
+    assert bulk.parse_rows("10-500, 600,700-") == [(10, 500), (600, 600), (700, None)]
+    for spec in ("0", "5-3", "a-b", ""):
+        with pytest.raises(ValueError, match="Invalid row selection"):
+            bulk.parse_rows(spec)
+
+
+def test_selector_matches():
+    """
+    Tests that all criteria must match and hosts also match their subdomains.
+    """
+    selector = bulk.make_selector({"error"}, ["example.org"], r"\.iso$", "2-")
+
+    def download(status, uri):
+        return {"gid": "1", "status": status, "files": [{"uris": [{"uri": uri}]}]}
+
+    assert selector.matches(2, download("error", "http://cdn.example.org/a.iso"))
+    assert not selector.matches(1, download("error", "http://example.org/a.iso"))
+    assert not selector.matches(2, download("active", "http://example.org/a.iso"))
+    assert not selector.matches(2, download("error", "http://notexample.org/a.iso"))
+    assert not selector.matches(2, download("error", "http://example.org/a.zip"))
+    with pytest.raises(ValueError, match="Invalid pattern"):
+        bulk.make_selector(match="(")
+
+
+def test_bulk_remove_by_status(fake_aria2, fake_settings):
+    """
+    Tests that downloads selected by status are removed in multicall batches.
+    """
+    keep = fake_aria2.aria2.add("http://example.com/ok")
+    errors = [fake_aria2.aria2.add(f"http://example.com/{i}", status="error") for i in range(5)]
+    ctl = controller.AsyncController(rpc.connect(fake_settings))
+
+    selected = controller.run(bulk.select(ctl, bulk.make_selector({"error"}), bulk.ACTIONS["remove"]))
+    report = bulk.apply_action(ctl.client, bulk.ACTIONS["remove"], [d for _, d in selected], batch_size=2)
+
+    assert [row for row, _ in selected] == [2, 3, 4, 5, 6]
+    assert report.done == 5
+    assert report.requests == 3
+    assert list(fake_aria2.aria2.downloads) == [keep]
+    assert not set(errors) & set(fake_aria2.aria2.downloads)
+
+
+def test_select_skips_rows_and_applies_action_statuses(fake_aria2, fake_settings):
+    """
+    Tests that pause only selects active or waiting downloads within the row ranges.
+    """
+    gids = [fake_aria2.aria2.add(f"http://example.com/{i}") for i in range(6)]
+    fake_aria2.aria2.downloads[gids[3]]["status"] = "paused"
+    ctl = controller.AsyncController(rpc.connect(fake_settings))
+
+    selected = controller.run(bulk.select(ctl, bulk.make_selector(rows="3-5"), bulk.ACTIONS["pause"]))
+
+    assert [(row, d["gid"]) for row, d in selected] == [(3, gids[2]), (5, gids[4])]
+
+
+def test_bulk_action_reaches_group_owners(group_settings, fake_group):
+    """
+    Tests that a bulk action over a group sends each call to the instance holding the download.
+    """
+    group = controller.ControllerGroup(pool.connect(group_settings))
+    first = fake_group[0].aria2.add("http://a.example/1")
+    second = fake_group[1].aria2.add("http://b.example/1")
+
+    selected = controller.run(bulk.select(group, bulk.make_selector(), bulk.ACTIONS["pause"]))
+    report = bulk.apply_action(group.client, bulk.ACTIONS["pause"], [d for _, d in selected])
+
+    assert report.failures == []
+    assert fake_group[0].aria2.downloads[first]["status"] == "paused"
+    assert fake_group[1].aria2.downloads[second]["status"] == "paused"
@@ -0,0 +1,379 @@
+import os
+import subprocess
+import sys
+from unittest.mock import MagicMock, patch
+
+import pytest
+from typer.testing import CliRunner
+from pydownloader import cli
+
+runner = CliRunner()
+
+# Import-time budgets (milliseconds of cumulative `-X importtime` for modules
+# loaded on top of the bare interpreter). `add` needs aria2p, `status` does not.
+STATUS_IMPORT_BUDGET_MS = 150
+ADD_IMPORT_BUDGET_MS = 400
+
+CONFIG_CONTENT = """
+[settings]
+dest_folder = /downloads
+connections = 8
+max_download_speed = 10M
+rpc_host = 127.0.0.1
+rpc_port = 1
+
+[schedules]
+"""
+
+
+def _imported_modules(*args, env=None):
+    """Returns {top-level module: cumulative import time in ms} for a command."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args], capture_output=True, text=True, env=env
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            modules[name.strip()] = int(cumulative) / 1000
+    return modules
+
+
+@pytest.fixture
+def cli_env(tmp_path):
+    """An environment with an isolated home directory holding a config file."""
+    (tmp_path / "config.ini").write_text(CONFIG_CONTENT)
+    env = dict(os.environ, HOME=str(tmp_path), XDG_CACHE_HOME=str(tmp_path / "cache"))
+    return env
+
+
+def _command_import_ms(command, env):
+    baseline = _imported_modules("-c", "pass", env=env)
+    modules = _imported_modules("-m", "pydownloader", *command, env=env)
+    return modules, sum(ms for name, ms in modules.items() if name not in baseline)
+
+
+def test_status_import_budget(cli_env):
+    """
+    Tests that `status` stays within its startup budget and loads no heavy deps.
+    """
+    modules, total_ms = _command_import_ms(["status"], cli_env)
+    for heavy in ("rich", "aria2p", "psutil", "requests"):
+        assert heavy not in modules
+    assert total_ms < STATUS_IMPORT_BUDGET_MS
+
+
+def test_add_import_budget(cli_env):
+    """
+    Tests that `add` stays within its startup budget and does not load rich.
+    """
+    modules, total_ms = _command_import_ms(["add", "http://example.com/file"], cli_env)
+    assert "aria2p" in modules
+    assert "rich" not in modules
+    assert total_ms < ADD_IMPORT_BUDGET_MS
+
+
+@patch("pydownloader.daemon.get_status", return_value=("Running", 12345))
+def test_status_command(mock_get_status):
+    """
+    Tests that `status` reports the daemon state and PID.
+    """
+    result = runner.invoke(cli.app, ["status"])
+    assert result.exit_code == 0
+    assert "Running (PID 12345)" in result.output
+
+
+@patch("pydownloader.daemon.start", return_value=[0.05])
+@patch("pydownloader.daemon.host_facts")
+def test_start_explain(mock_host_facts, mock_start, tmp_path):
+    """
+    Tests that `start --explain` shows the tuned options before starting.
+    """
+    from configparser import ConfigParser
+    from pydownloader import daemon
+
+    config = ConfigParser()
+    config.read_string(CONFIG_CONTENT + "[aria2]\ndisk-cache = 64M\n")
+    config.set("settings", "session_dir", str(tmp_path))
+    mock_host_facts.return_value = daemon.HostFacts("xfs", 4 * 1024 ** 3, 2, True)
+    with patch("pydownloader.config.load_config", return_value=config):
+        result = runner.invoke(cli.app, ["start", "--explain"])
+
+    assert result.exit_code == 0
+    assert "Host: xfs file system, 4.0 GiB available, 2 CPUs" in result.output
+    assert "--file-allocation" in result.output and "falloc" in result.output
+    assert "64M" in result.output and "set in [aria2]" in result.output
+    assert "Daemon started" in result.output
+    mock_start.assert_called_once()
+
+
+@patch("pydownloader.rpc.connect")
+@patch("pydownloader.config.load_settings")
+def test_add_command(mock_load_settings, mock_connect):
+    """
+    Tests that `add` sends the URL to the daemon.
+    """
+    mock_load_settings.return_value = MagicMock(username="", password="", instances=1, nodes=())
+    mock_connect.return_value.add_uri.return_value = "0000000000000001"
+
+    result = runner.invoke(cli.app, ["add", "http://example.com/file"])
+
+    assert result.exit_code == 0
+    mock_connect.return_value.add_uri.assert_called_once_with(["http://example.com/file"], options={})
+    assert "0000000000000001" in result.output
+
+
+@patch("pydownloader.config.load_settings", side_effect=FileNotFoundError("no config"))
+def test_missing_config_fails_cleanly(mock_load_settings):
+    """
+    Tests that a missing configuration is reported without a traceback.
+    """
+    result = runner.invoke(cli.app, ["add", "http://example.com/file"])
+    assert result.exit_code == 1
+    assert "no config" in result.output
+
+
+@pytest.mark.parametrize("setting", ["instances = two", "instances = 0", "save_session_interval = soon"])
+@patch("pydownloader.daemon.start")
+def test_start_rejects_invalid_config(mock_start, setting, tmp_path, monkeypatch):
+    """
+    Tests that start reports a malformed value like the other commands, before starting anything.
+    """
+    (tmp_path / "config.ini").write_text(CONFIG_CONTENT.replace("[schedules]", f"{setting}\n\n[schedules]"))
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+
+    result = runner.invoke(cli.app, ["start"])
+
+    assert result.exit_code == 1
+    assert "Invalid configuration" in result.output
+    mock_start.assert_not_called()
+
+
+@pytest.fixture
+def cli_settings(fake_settings):
+    """Points the CLI at the fake aria2c server."""
+    with patch("pydownloader.config.load_settings", return_value=fake_settings):
+        yield fake_settings
+
+
+@patch("pydownloader.scheduler.run_once", side_effect=ConnectionRefusedError("refused"))
+def test_scheduler_unreachable_fails_cleanly(mock_run_once, cli_settings):
+    """
+    Tests that a one-shot scheduler run reports an unreachable aria2c without a traceback.
+    """
+    result = runner.invoke(cli.app, ["scheduler"])
+    assert result.exit_code == 1
+    assert "could not reach aria2c: refused" in result.output
+
+
+def test_list_command(fake_aria2, cli_settings):
+    """
+    Tests that `list` renders icons, percentages and URLs for every download.
+    """
+    fake_aria2.aria2.add("http://example.com/active", status="active", total=200, completed=100)
+    fake_aria2.aria2.add("http://example.com/done", status="complete", total=10, completed=10)
+
+    result = runner.invoke(cli.app, ["list"])
+
+    assert result.exit_code == 0
+    assert "50%" in result.output
+    assert "✅" in result.output
+    assert "http://example.com/active" in result.output
+
+
+def test_remove_command(fake_aria2, cli_settings):
+    """
+    Tests that `remove` removes the download shown at the given row.
+    """
+    fake_aria2.aria2.add("http://example.com/1", status="active")
+    gid = fake_aria2.aria2.add("http://example.com/2", status="waiting")
+
+    result = runner.invoke(cli.app, ["remove", "2"])
+
+    assert result.exit_code == 0
+    assert fake_aria2.aria2.downloads[gid]["status"] == "removed"
+
+
+def test_move_command(fake_aria2, cli_settings):
+    """
+    Tests that `move` repositions a waiting download by row number.
+    """
+    fake_aria2.aria2.add("http://example.com/active", status="active")
+    gids = [fake_aria2.aria2.add(f"http://example.com/{i}") for i in range(3)]
+
+    result = runner.invoke(cli.app, ["move", "4", "2"])
+
+    assert result.exit_code == 0
+    waiting = [g for g in fake_aria2.aria2.order if fake_aria2.aria2.downloads[g]["status"] == "waiting"]
+    assert waiting == [gids[2], gids[0], gids[1]]
+
+
+def test_remove_uses_list_snapshot(fake_aria2, cli_settings):
+    """
+    Tests that `remove` acts on the download shown by `list`, even if the queue changed since.
+    """
+    first = fake_aria2.aria2.add("http://example.com/1")
+    second = fake_aria2.aria2.add("http://example.com/2")
+    assert runner.invoke(cli.app, ["list"]).exit_code == 0
+    # A new download now sits at row 2
+    fake_aria2.aria2.order.insert(0, fake_aria2.aria2.add("http://example.com/new"))
+    fake_aria2.aria2.order.pop()
+
+    result = runner.invoke(cli.app, ["remove", "2"])
+
+    assert result.exit_code == 0
+    assert fake_aria2.aria2.downloads[second]["status"] == "removed"
+    assert fake_aria2.aria2.downloads[first]["status"] == "waiting"
+
+
+def test_move_uses_list_snapshot(fake_aria2, cli_settings):
+    """
+    Tests that `move` resolves rows from the snapshot and rejects stale rows.
+    """
+    fake_aria2.aria2.add("http://example.com/active", status="active")
+    gids = [fake_aria2.aria2.add(f"http://example.com/{i}") for i in range(3)]
+    assert runner.invoke(cli.app, ["list"]).exit_code == 0
+    calls = fake_aria2.aria2.calls
+
+    result = runner.invoke(cli.app, ["move", "4", "2"])
+
+    assert result.exit_code == 0
+    waiting = [g for g in fake_aria2.aria2.order if fake_aria2.aria2.downloads[g]["status"] == "waiting"]
+    assert waiting == [gids[2], gids[0], gids[1]]
+    # getSessionInfo, two tellStatus and changePosition: no queue listing
+    assert fake_aria2.aria2.calls - calls == 4
+
+    del fake_aria2.aria2.downloads[gids[1]]
+    result = runner.invoke(cli.app, ["move", "3", "2"])
+    assert result.exit_code == 1
+    assert "no longer in the queue" in result.output
+
+
+def test_list_command_pages_and_filters(fake_aria2, cli_settings):
+    """
+    Tests that `list --page/--limit/--status` shows the requested slice.
+    """
+    for i in range(10):
+        fake_aria2.aria2.add(f"http://example.com/{i}", status="error" if i % 2 else "waiting")
+
+    result = runner.invoke(cli.app, ["list", "--status", "error", "--limit", "2", "--page", "2"])
+
+    assert result.exit_code == 0
+    assert "http://example.com/5" in result.output
+    assert "http://example.com/7" in result.output
+    assert "http://example.com/3" not in result.output
+    assert "http://example.com/4" not in result.output
+
+
+def test_reorder_command(fake_aria2, cli_settings, tmp_path):
+    """
+    Tests that `reorder --file` puts the listed GIDs first and reports the requests saved.
+    """
+    gids = [fake_aria2.aria2.add(f"http://example.com/{i}") for i in range(4)]
+    gid_file = tmp_path / "gids.txt"
+    gid_file.write_text(f"# urgent\n{gids[3]}\n\n{gids[2]}\n")
+
+    result = runner.invoke(cli.app, ["reorder", "--file", str(gid_file)])
+
+    assert result.exit_code == 0
+    assert fake_aria2.aria2.order == [gids[3], gids[2], gids[0], gids[1]]
+    assert "Reordered 4 downloads with 2 moves in 2 requests" in result.output
+
+
+def test_reorder_needs_one_order(cli_settings):
+    """
+    Tests that `reorder` requires exactly one of --by and --file.
+    """
+    result = runner.invoke(cli.app, ["reorder"])
+
+    assert result.exit_code != 0
+
+
+def test_remove_by_host_dry_run(fake_aria2, cli_settings):
+    """
+    Tests that a dry run previews the selected downloads without removing them.
+    """
+    gid = fake_aria2.aria2.add("http://example.org/a")
+    fake_aria2.aria2.add("http://other.net/b")
+
+    result = runner.invoke(cli.app, ["remove", "--host", "example.org", "--dry-run"])
+
+    assert result.exit_code == 0
+    assert "Would remove 1 downloads." in result.output
+    assert "http://example.org/a" in result.output
+    assert fake_aria2.aria2.downloads[gid]["status"] == "waiting"
+
+
+def test_pause_and_unpause_by_match(fake_aria2, cli_settings):
+    """
+    Tests that `pause --match` and `unpause --match` act on every matching download.
+    """
+    isos = [fake_aria2.aria2.add(f"http://example.org/{i}.iso") for i in range(3)]
+    other = fake_aria2.aria2.add("http://example.org/a.zip")
+
+    result = runner.invoke(cli.app, ["pause", "--match", r"\.iso$"])
+
+    assert result.exit_code == 0
+    assert "Paused 3 downloads in 1 requests, 0 failed." in result.output
+    assert [fake_aria2.aria2.downloads[g]["status"] for g in isos] == ["paused"] * 3
+    assert fake_aria2.aria2.downloads[other]["status"] == "waiting"
+
+    result = runner.invoke(cli.app, ["unpause", "1"])
+
+    assert result.exit_code == 0
+    assert fake_aria2.aria2.downloads[isos[0]]["status"] == "waiting"
+
+
+def test_remove_rejects_row_and_filters(cli_settings):
+    """
+    Tests that a row number cannot be combined with filters.
+    """
+    result = runner.invoke(cli.app, ["remove", "1", "--status", "error"])
+
+    assert result.exit_code == 1
+
+
+def test_purge_and_list_all(fake_aria2, cli_settings):
+    """
+    Tests that `purge --all` archives stopped results and `list --all` still shows them after the queue.
+    """
+    fake_aria2.aria2.add("http://example.com/waiting")
+    done = fake_aria2.aria2.add("http://example.com/done", status="complete", total=10, completed=10)
+
+    result = runner.invoke(cli.app, ["purge", "--all"])
+
+    assert result.exit_code == 0
+    assert "Archived 1 stopped results" in result.output
+    assert done not in fake_aria2.aria2.downloads
+
+    assert "http://example.com/done" not in runner.invoke(cli.app, ["list"]).output
+    result = runner.invoke(cli.app, ["list", "--all"])
+
+    assert result.exit_code == 0
+    assert "http://example.com/waiting" in result.output
+    assert "http://example.com/done" in result.output
+
+
+def test_history_command(fake_aria2, cli_settings):
+    """
+    Tests that `history` lists archived downloads by filter and aggregates them per host.
+    """
+    fake_aria2.aria2.add("http://one.example/a", status="complete", total=10, completed=10)
+    fake_aria2.aria2.add("http://two.example/b", status="error", total=20)
+    assert runner.invoke(cli.app, ["purge", "--all"]).exit_code == 0
+
+    result = runner.invoke(cli.app, ["history", "--status", "error", "--since", "1d"])
+
+    assert result.exit_code == 0
+    assert "http://two.example/b" in result.output
+    assert "http://one.example/a" not in result.output
+
+    result = runner.invoke(cli.app, ["history", "--stats"])
+
+    assert result.exit_code == 0
+    assert "one.example" in result.output and "100%" in result.output
+
+    assert runner.invoke(cli.app, ["history", "--since", "someday"]).exit_code == 1
@@ -1,5 +1,7 @@
 import pytest
 from configparser import ConfigParser
+from pathlib import Path
+from unittest.mock import patch
 from pydownloader import config
 
 # A sample valid configuration for our tests
@@ -80,3 +82,171 @@ def test_missing_rpc_port(tmp_path):
     with pytest.raises(ValueError, match="Missing required key 'rpc_port' in section 'settings'"):
         config.load_config(search_paths=[tmp_path])
 
+
+def test_load_settings(tmp_path):
+    """
+    Tests that settings are converted to typed values once at load time.
+    """
+    config_file = tmp_path / "config.ini"
+    config_file.write_text(VALID_CONFIG_CONTENT)
+
+    settings = config.load_settings(search_paths=[tmp_path])
+
+    assert settings.dest_folder == Path("/downloads")
+    assert settings.connections == 8
+    assert settings.max_download_speed == 10 * 1024 * 1024
+    assert settings.rpc_port == 6800
+    assert settings.rpc_host == "localhost"
+    assert settings.log_file is None
+    assert settings.schedule.intervals[1] == (9 * 60, 2 * 1024 * 1024)
+
+def test_settings_are_read_only(tmp_path):
+    """
+    Tests that a Settings object cannot be modified or extended.
+    """
+    config_file = tmp_path / "config.ini"
+    config_file.write_text(VALID_CONFIG_CONTENT)
+    settings = config.load_settings(search_paths=[tmp_path])
+
+    with pytest.raises(AttributeError):
+        settings.connections = 4
+    with pytest.raises(AttributeError):
+        settings.extra = True
+    assert not hasattr(settings, "__dict__")
+
+def test_settings_report_all_errors(tmp_path):
+    """
+    Tests that every malformed value is reported in a single ConfigError.
+    """
+    invalid_content = """
+[settings]
+dest_folder = /downloads
+connections = many
+max_download_speed = fast
+rpc_port = 99999
+
+[schedules]
+s1 = 09:00-17:00-2M
+s2 = 25:00-06:00-1M
+"""
+    config_file = tmp_path / "config.ini"
+    config_file.write_text(invalid_content)
+
+    with pytest.raises(config.ConfigError) as excinfo:
+        config.load_settings(search_paths=[tmp_path])
+
+    errors = excinfo.value.errors
+    assert len(errors) == 4
+    assert any("max_download_speed" in e for e in errors)
+    assert any("'s2'" in e for e in errors)
+    assert any("connections" in e for e in errors)
+    assert any("rpc_port" in e for e in errors)
+
+def test_settings_cache_hit(tmp_path, monkeypatch):
+    """
+    Tests that an unchanged config file is served from the on-disk cache.
+    """
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    config_file = tmp_path / "config.ini"
+    config_file.write_text(VALID_CONFIG_CONTENT)
+
+    first = config.load_settings(search_paths=[tmp_path])
+    with patch.object(config, "_parse_values") as mock_parse:
+        cached = config.load_settings(search_paths=[tmp_path])
+
+    mock_parse.assert_not_called()
+    assert repr(cached) == repr(first)
+    assert cached.schedule.intervals == first.schedule.intervals
+    cache_files = list((tmp_path / "cache" / "pydownloader").iterdir())
+    assert len(cache_files) == 1
+    assert cache_files[0].stat().st_mode & 0o777 == 0o600
+
+def test_settings_cache_invalidated_on_change(tmp_path, monkeypatch):
+    """
+    Tests that editing the config file invalidates the cached snapshot.
+    """
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    config_file = tmp_path / "config.ini"
+    config_file.write_text(VALID_CONFIG_CONTENT)
+    config.load_settings(search_paths=[tmp_path])
+
+    config_file.write_text(VALID_CONFIG_CONTENT.replace("connections = 8", "connections = 12"))
+
+    assert config.load_settings(search_paths=[tmp_path]).connections == 12
+
+def test_settings_cache_resolves_defaults_per_run(tmp_path, monkeypatch):
+    """
+    Tests that blank paths follow the working directory and environment of each run, not the cached one.
+    """
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    config_file = tmp_path / "config.ini"
+    config_file.write_text(VALID_CONFIG_CONTENT.replace("dest_folder = /downloads", "dest_folder ="))
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+
+    monkeypatch.chdir(tmp_path / "a")
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path / "a"))
+    first = config.load_settings(search_paths=[tmp_path])
+    monkeypatch.chdir(tmp_path / "b")
+    monkeypatch.setenv("XDG_STATE_HOME", str(tmp_path / "b"))
+    with patch.object(config, "_parse_values") as mock_parse:
+        cached = config.load_settings(search_paths=[tmp_path])
+
+    mock_parse.assert_not_called()
+    assert first.dest_folder == tmp_path / "a"
+    assert cached.dest_folder == tmp_path / "b"
+    assert cached.session_dir == tmp_path / "b" / "pydownloader"
+    assert cached.history_file == tmp_path / "b" / "pydownloader" / "history.sqlite3"
+
+def test_settings_cache_ignores_corrupt_file(tmp_path, monkeypatch):
+    """
+    Tests that a corrupt cache file falls back to parsing the config.
+    """
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    config_file = tmp_path / "config.ini"
+    config_file.write_text(VALID_CONFIG_CONTENT)
+    config.load_settings(search_paths=[tmp_path])
+    for cache_file in (tmp_path / "cache" / "pydownloader").iterdir():
+        cache_file.write_bytes(b"\x00garbage")
+
+    assert config.load_settings(search_paths=[tmp_path]).connections == 8
+
+def test_settings_priority(tmp_path, monkeypatch):
+    """
+    Tests that process priority settings are validated and survive the cache.
+    """
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    config_file = tmp_path / "config.ini"
+    config_file.write_text(VALID_CONFIG_CONTENT.replace("rpc_port = 6800", "rpc_port = 6800\nnice = 10\ncpu_affinity = 0-1"))
+
+    first = config.load_settings(search_paths=[tmp_path])
+    cached = config.load_settings(search_paths=[tmp_path])
+    assert first.priority == cached.priority
+    assert cached.priority.nice == 10 and cached.priority.cpu_affinity == (0, 1)
+
+    config_file.write_text(VALID_CONFIG_CONTENT.replace("rpc_port = 6800", "rpc_port = 6800\nmemory_max = 1G"))
+    with pytest.raises(config.ConfigError, match="cgroup"):
+        config.load_settings(search_paths=[tmp_path], use_cache=False)
+
+
+def test_settings_purge_policy(tmp_path):
+    """
+    Tests that the purge policy is parsed, survives the cache and must fit under max_download_result.
+    """
+    config_file = tmp_path / "config.ini"
+    config_file.write_text(
+        VALID_CONFIG_CONTENT.replace(
+            "rpc_port = 6800", "rpc_port = 6800\nkeep_results = 10\narchive_after = 3600\narchive_on_complete = yes"
+        )
+    )
+
+    first = config.load_settings(search_paths=[tmp_path])
+    cached = config.load_settings(search_paths=[tmp_path])
+    assert first.purge == cached.purge == (10, 3600, True)
+    assert cached.history_file.name == "history.sqlite3"
+
+    config_file.write_text(
+        VALID_CONFIG_CONTENT.replace("rpc_port = 6800", "rpc_port = 6800\nkeep_results = 50\nmax_download_result = 50")
+    )
+    with pytest.raises(config.ConfigError, match="keep_results"):
+        config.load_settings(search_paths=[tmp_path], use_cache=False)
@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from pydownloader import controller, rpc
+
+
+class SlowClient:
+    """A client whose calls block for a while and record peak concurrency."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.running = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def _call(self, result):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        return result
+
+    def tell_active(self, keys=None):
+        return self._call([{"gid": "a", "status": "active"}])
+
+    def tell_waiting(self, offset, num, keys=None):
+        return self._call([{"gid": "w", "status": "waiting"}])
+
+    def tell_stopped(self, offset, num, keys=None):
+        return self._call([{"gid": "s", "status": "complete"}])
+
+    def remove(self, gid):
+        if gid == "bad":
+            raise ValueError("not found")
+        return self._call(gid)
+
+
+def test_list_downloads_fans_out():
+    """
+    Tests that the three list calls run concurrently, not one after another.
+    """
+    client = SlowClient(delay=0.1)
+    started = time.perf_counter()
+    downloads = controller.run(controller.AsyncController(client).list_downloads())
+    elapsed = time.perf_counter() - started
+
+    assert [d["gid"] for d in downloads] == ["a", "w", "s"]
+    assert client.peak == 3
+    assert elapsed < 0.25
+
+
+def test_concurrency_is_bounded():
+    """
+    Tests that the semaphore caps the number of calls in flight.
+    """
+    client = SlowClient(delay=0.02)
+    ctl = controller.AsyncController(client, concurrency=2)
+    results = controller.run(ctl.map("remove", [str(i) for i in range(8)] + ["bad"]))
+
+    assert client.peak == 2
+    assert results[:8] == [str(i) for i in range(8)]
+    assert isinstance(results[8], ValueError)
+
+
+def test_call_timeout():
+    """
+    Tests that a call exceeding the timeout raises asyncio.TimeoutError.
+    """
+    ctl = controller.AsyncController(SlowClient(delay=0.5), timeout=0.05)
+    with pytest.raises(asyncio.TimeoutError):
+        controller.run(ctl.call("tell_active"))
+
+
+def test_fan_out_multiple_daemons(fake_aria2, fake_settings):
+    """
+    Tests that one coroutine can drive several daemons and isolate failures.
+    """
+    fake_aria2.aria2.add("http://example.com/1", status="active")
+    broken = MagicMock()
+    broken.tell_active.side_effect = ConnectionError("down")
+    controllers = [
+        controller.AsyncController(rpc.connect(fake_settings), name="local"),
+        controller.AsyncController(broken, name="broken"),
+    ]
+
+    results = controller.run(controller.fan_out(controllers, "list_downloads"))
+
+    assert [d["status"] for d in results["local"]] == ["active"]
+    assert isinstance(results["broken"], ConnectionError)
+
+
+def test_remove_stopped_download_forgets_result():
+    """
+    Tests that removing a finished download removes its result instead.
+    """
+    client = MagicMock()
+    ctl = controller.AsyncController(client)
+    controller.run(ctl.remove({"gid": "a", "status": "complete"}))
+    controller.run(ctl.remove({"gid": "b", "status": "waiting"}))
+    client.remove_download_result.assert_called_once_with("a")
+    client.remove.assert_called_once_with("b")
+
+
+def test_resolve_row():
+    """
+    Tests that rows are 1-based and out-of-range rows are rejected.
+    """
+    downloads = [{"gid": "a"}, {"gid": "b"}]
+    assert controller.resolve_row(downloads, 2) == (1, {"gid": "b"})
+    with pytest.raises(ValueError, match="Row 3 does not exist"):
+        controller.resolve_row(downloads, 3)
+
+
+def _collect_rows(ctl, **kwargs):
+    async def collect():
+        return [batch async for batch in ctl.iter_rows(**kwargs)]
+
+    return controller.run(collect())
+
+
+@pytest.fixture
+def big_queue(fake_aria2):
+    """Two active, 300 waiting (every third paused) and 50 stopped downloads."""
+    aria2 = fake_aria2.aria2
+    for i in range(2):
+        aria2.add(f"http://example.com/active/{i}", status="active")
+    for i in range(300):
+        aria2.add(f"http://example.com/waiting/{i}", status="paused" if i % 3 == 0 else "waiting")
+    for i in range(50):
+        aria2.add(f"http://example.com/stopped/{i}", status="error" if i % 2 else "complete")
+    return aria2
+
+
+def test_iter_rows_pages_without_fetching_skipped_rows(big_queue, fake_settings):
+    """
+    Tests that a page deep in the queue keeps global row numbers and only
+    fetches the rows it shows.
+    """
+    client = rpc.connect(fake_settings)
+    ctl = controller.AsyncController(client)
+    big_queue.calls = 0
+
+    batches = _collect_rows(ctl, offset=100, limit=10, window=50)
+
+    rows = [row for batch in batches for row, _ in batch]
+    assert rows == list(range(101, 111))
+    # getGlobalStat plus a single 10-item tellWaiting window
+    assert big_queue.calls == 2
+
+
+def test_iter_rows_windows_bound_memory(big_queue, fake_settings):
+    """
+    Tests that the full listing is streamed in windows of bounded size.
+    """
+    ctl = controller.AsyncController(rpc.connect(fake_settings))
+    batches = _collect_rows(ctl, window=40)
+
+    assert max(len(batch) for batch in batches) <= 40
+    rows = [row for batch in batches for row, _ in batch]
+    assert rows == list(range(1, 353))
+
+
+def test_iter_rows_status_filter(big_queue, fake_settings):
+    """
+    Tests that filtered rows keep the row numbers of the unfiltered list.
+    """
+    ctl = controller.AsyncController(rpc.connect(fake_settings))
+    batches = _collect_rows(ctl, statuses={"paused"}, offset=1, limit=2, window=7)
+
+    rows = [(row, d["status"]) for batch in batches for row, d in batch]
+    # Paused downloads are every third waiting one, starting at row 3
+    assert rows == [(6, "paused"), (9, "paused")]
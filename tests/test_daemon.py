@@ -16,16 +16,21 @@ def mock_config():
     config.set("settings", "rpc_secret", "secret_token")
     return config
 
+@patch("pydownloader.daemon.process_start_time", return_value=None)
+@patch("pydownloader.daemon.prepare_session", return_value=0)
+@patch("pydownloader.daemon.find_listener_pid", return_value=12345)
+@patch("pydownloader.daemon.wait_until_ready", return_value=0.05)
 @patch("subprocess.Popen")
-@patch("builtins.open", new_callable=mock_open)
-def test_start_daemon_success(mock_file_open, mock_popen, mock_config, tmp_path):
+def test_start_daemon_success(
+    mock_popen, mock_wait, mock_find_pid, mock_prepare, mock_start_time, mock_config, tmp_path
+):
     """
     Tests that the start function constructs the correct aria2c command
     and writes a PID file.
     """
-    # Mock the Popen process to have a specific PID
+    # The launched process forks, so the daemon PID is the RPC listener's
     mock_process = MagicMock()
-    mock_process.pid = 12345
+    mock_process.pid = 12344
     mock_popen.return_value = mock_process
 
     pid_file_path = tmp_path / "daemon.pid"
@@ -45,13 +50,13 @@ def test_start_daemon_success(mock_file_open, mock_popen, mock_config, tmp_path)
     assert "--daemon=true" in command
 
     # Verify that the PID file was written to with the correct PID
-    mock_file_open.assert_called_once_with(pid_file_path, "w")
-    mock_file_open().write.assert_called_once_with("12345")
+    assert pid_file_path.read_text() == "12345"
 
+@patch("pydownloader.daemon.pid_alive", return_value=True)
 @patch("os.kill")
 @patch("os.remove")
 @patch("builtins.open", new_callable=mock_open, read_data="12345")
-def test_stop_daemon_success(mock_file_open, mock_os_remove, mock_os_kill, tmp_path):
+def test_stop_daemon_success(mock_file_open, mock_os_remove, mock_os_kill, mock_pid_alive, tmp_path):
     """
     Tests that the stop function reads the PID, kills the process,
     and removes the PID file.
@@ -75,9 +80,9 @@ def test_stop_daemon_no_pid_file(tmp_path):
     daemon.stop(tmp_path / "nonexistent.pid")
 
 @patch("os.path.exists", return_value=True)
-@patch("psutil.pid_exists", return_value=True)
+@patch("pydownloader.daemon.pid_alive", return_value=True)
 @patch("builtins.open", new_callable=mock_open, read_data="12345")
-def test_get_status_running(mock_file_open, mock_pid_exists, mock_path_exists, tmp_path):
+def test_get_status_running(mock_file_open, mock_pid_alive, mock_path_exists, tmp_path):
     """
     Tests the status check when the daemon is running.
     """
@@ -97,13 +102,380 @@ def test_get_status_stopped(mock_path_exists, tmp_path):
     assert pid is None
 
 @patch("os.path.exists", return_value=True)
-@patch("psutil.pid_exists", return_value=False)
+@patch("pydownloader.daemon.pid_alive", return_value=False)
 @patch("builtins.open", new_callable=mock_open, read_data="12345")
-def test_get_status_stale_pid(mock_file_open, mock_pid_exists, mock_path_exists, tmp_path):
+def test_get_status_stale_pid(mock_file_open, mock_pid_alive, mock_path_exists, tmp_path):
     """
     Tests the status check when the PID file is stale (process is not running).
     """
     pid_file_path = tmp_path / "daemon.pid"
     status, pid = daemon.get_status(pid_file_path)
     assert status == "Stopped (Stale PID)"
-    assert pid is None
\ No newline at end of file
+    assert pid is None
+
+def test_wait_until_ready_against_rpc(fake_aria2):
+    """
+    Tests that readiness is detected through aria2.getVersion and timed.
+    """
+    elapsed = daemon.wait_until_ready(fake_aria2.port, "secret_token", timeout=2)
+    assert 0 <= elapsed < 2
+
+
+def test_wait_until_ready_backs_off_then_times_out(fake_aria2):
+    """
+    Tests that probes back off exponentially and give up at the deadline.
+    """
+    port = fake_aria2.port
+    fake_aria2.stop()
+    now = [0.0]
+    delays = []
+
+    def sleep(seconds):
+        delays.append(seconds)
+        now[0] += seconds
+
+    with pytest.raises(TimeoutError):
+        daemon.wait_until_ready(port, timeout=1.5, clock=lambda: now[0], sleep=sleep)
+    assert delays[:4] == [0.01, 0.02, 0.04, 0.08]
+    assert max(delays) == 0.5
+    assert sum(delays) <= 1.5
+
+
+def test_wait_until_ready_rejects_wrong_secret(fake_aria2):
+    """
+    Tests that a daemon refusing the secret fails at once instead of timing out.
+    """
+    with pytest.raises(ValueError, match="Unauthorized"):
+        daemon.wait_until_ready(fake_aria2.port, "wrong", timeout=5)
+
+
+def test_wait_until_ready_stops_when_aria2c_fails(fake_aria2):
+    """
+    Tests that an aria2c that exited with an error is reported without waiting.
+    """
+    port = fake_aria2.port
+    fake_aria2.stop()
+    process = MagicMock(returncode=1)
+    process.poll.return_value = 1
+    with pytest.raises(RuntimeError, match="status 1"):
+        daemon.wait_until_ready(port, timeout=60, process=process)
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/net/tcp"), reason="needs Linux /proc")
+def test_find_listener_pid(fake_aria2):
+    """
+    Tests that the owner of a listening RPC socket is found through /proc.
+    """
+    assert daemon.find_listener_pid(fake_aria2.port) == os.getpid()
+
+
+def test_build_command_session_flags(mock_config, tmp_path):
+    """
+    Tests that each instance loads and autosaves its own session file.
+    """
+    mock_config.set("settings", "session_dir", str(tmp_path))
+    mock_config.set("settings", "save_session_interval", "30")
+    command = daemon.build_command(mock_config, 2)
+    session = tmp_path / "session-2.txt"
+    assert f"--input-file={session}" in command
+    assert f"--save-session={session}" in command
+    assert "--save-session-interval=30" in command
+    assert f"--max-download-result={daemon.DEFAULT_MAX_DOWNLOAD_RESULT}" in command
+
+
+def test_prepare_session(tmp_path):
+    """
+    Tests that a missing session is created and an existing one is backed up.
+    """
+    session = tmp_path / "state" / "session-0.txt"
+    assert daemon.prepare_session(session) == 0
+    assert session.read_text() == ""
+
+    session.write_text("http://a/1\n gid=1\n dir=/dl\nhttp://b/2\thttp://c/2\n gid=2\n")
+    assert daemon.prepare_session(session) == 2
+    assert (tmp_path / "state" / "session-0.txt.bak").read_text() == session.read_text()
+    assert sorted(p.name for p in session.parent.iterdir()) == ["session-0.txt", "session-0.txt.bak"]
+
+
+@patch("pydownloader.daemon.pid_alive", return_value=True)
+@patch("os.kill")
+def test_stop_saves_session_first(mock_os_kill, mock_pid_alive, fake_aria2, mock_config, tmp_path):
+    """
+    Tests that stop asks the daemon to save its session before signalling it.
+    """
+    mock_config.set("settings", "rpc_port", str(fake_aria2.port))
+    pid_file = tmp_path / "daemon.pid"
+    pid_file.write_text("12345")
+
+    results = daemon.stop(pid_file, config=mock_config)
+
+    assert fake_aria2.aria2.sessions_saved == 1
+    # The process is gone once aria2.shutdown returns, so no signal is needed
+    assert results[0][:2] == (12345, "shutdown")
+    mock_os_kill.assert_not_called()
+    assert not pid_file.exists()
+
+
+STUBBORN = "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); print('ready', flush=True); time.sleep(60)"
+
+
+@patch("pydownloader.daemon._ESCALATION_TIMEOUT", 0.2)
+def test_stop_escalates_to_sigkill(fake_aria2, mock_config, tmp_path):
+    """
+    Tests that a daemon ignoring shutdown and SIGTERM is force-stopped, then killed.
+    """
+    import sys
+
+    process = subprocess.Popen([sys.executable, "-c", STUBBORN], stdout=subprocess.PIPE)
+    process.stdout.readline()
+    mock_config.set("settings", "rpc_port", str(fake_aria2.port))
+    pid_file = tmp_path / "daemon.pid"
+    daemon.write_pid_file(pid_file, [process.pid])
+
+    (result,) = daemon.stop(pid_file, config=mock_config, timeout=0.2)
+
+    assert result.pid == process.pid
+    assert result.method == "SIGKILL"
+    # Three waits of 0.2s each before SIGKILL
+    assert 0.6 <= result.seconds < 5
+    assert process.wait(timeout=5) == -9
+    assert fake_aria2.aria2.sessions_saved == 1
+
+
+def test_stop_with_sigterm_without_config(tmp_path):
+    """
+    Tests that without a configuration the daemon is stopped with SIGTERM, promptly.
+    """
+    process = subprocess.Popen(["sleep", "60"])
+    pid_file = tmp_path / "daemon.pid"
+    daemon.write_pid_file(pid_file, [process.pid])
+
+    (result,) = daemon.stop(pid_file)
+
+    assert result.method == "SIGTERM"
+    assert result.seconds < 1
+    process.wait(timeout=5)
+
+
+def test_wait_for_exit_times_out(tmp_path):
+    """
+    Tests that waiting on a live process returns it after the timeout.
+    """
+    process = subprocess.Popen(["sleep", "60"])
+    try:
+        assert daemon.wait_for_exit([process.pid], 0.1) == [process.pid]
+    finally:
+        process.kill()
+        process.wait()
+    assert daemon.wait_for_exit([process.pid], 1) == []
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="needs Linux /proc")
+def test_pid_reuse_is_detected(tmp_path):
+    """
+    Tests that a recorded PID only counts as alive with its own start time.
+    """
+    pid_file = tmp_path / "daemon.pid"
+    daemon.write_pid_file(pid_file, [os.getpid()])
+    start_time = daemon.process_start_time(os.getpid())
+    assert pid_file.read_text() == f"{os.getpid()} {start_time}"
+    assert daemon.get_group_status(pid_file) == [(os.getpid(), True)]
+
+    # The same PID with another start time belongs to a different process
+    pid_file.write_text(f"{os.getpid()} {start_time + 1}")
+    assert daemon.get_status(pid_file) == ("Stopped (Stale PID)", None)
+    # Without a start time, the executable has to be aria2c
+    pid_file.write_text(str(os.getpid()))
+    assert daemon.get_status(pid_file) == ("Stopped (Stale PID)", None)
+
+
+@patch("os.kill")
+def test_stop_skips_reused_pid(mock_os_kill, tmp_path):
+    """
+    Tests that stop never signals a process that took over a daemon's PID.
+    """
+    pid_file = tmp_path / "daemon.pid"
+    pid_file.write_text(f"{os.getpid()} 1")
+    assert daemon.stop(pid_file) == []
+    mock_os_kill.assert_not_called()
+    assert not pid_file.exists()
+
+    # Without a start time, a process that is not aria2c is not signalled either
+    pid_file.write_text(str(os.getpid()))
+    assert daemon.stop(pid_file) == []
+    mock_os_kill.assert_not_called()
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="needs Linux /proc")
+@patch("pydownloader.daemon._ESCALATION_TIMEOUT", 0.2)
+def test_stop_keeps_ports_after_dead_instance(mock_config, tmp_path):
+    """
+    Tests that a dead first instance does not shift the ports of the others.
+    """
+    process = subprocess.Popen(["sleep", "60"])
+    pid_file = tmp_path / "daemon.pid"
+    start_time = daemon.process_start_time(os.getpid())
+    pid_file.write_text(f"{os.getpid()} {start_time + 1}\n{process.pid} {daemon.process_start_time(process.pid)}")
+
+    with patch("pydownloader.daemon.call") as mock_call:
+        (result,) = daemon.stop(pid_file, config=mock_config, timeout=0.2)
+
+    assert result.pid == process.pid
+    assert {args[0] for args, _ in mock_call.call_args_list} == {6801}
+    process.wait(timeout=5)
+
+
+FAKE_SUPERVISOR = """
+import os, signal, sys, time
+def stop(signum, frame):
+    time.sleep(0.3)
+    os.kill(int(sys.argv[1]), signal.SIGKILL)
+    os.remove(sys.argv[2])
+    sys.exit(0)
+signal.signal(signal.SIGTERM, stop)
+print("ready", flush=True)
+time.sleep(60)
+"""
+
+
+def test_stop_waits_for_supervisor(tmp_path):
+    """
+    Tests that stop lets the supervisor stop its own daemons and tolerates it removing the PID file.
+    """
+    import sys
+
+    child = subprocess.Popen(["sleep", "60"])
+    pid_file = tmp_path / "daemon.pid"
+    daemon.write_pid_file(pid_file, [child.pid])
+    watchdog = subprocess.Popen(
+        [sys.executable, "-c", FAKE_SUPERVISOR, str(child.pid), str(pid_file)], stdout=subprocess.PIPE
+    )
+    watchdog.stdout.readline()
+    daemon.write_pid_file(daemon.supervisor_pid_file(pid_file), [watchdog.pid])
+
+    assert daemon.stop(pid_file) == []
+    assert watchdog.wait(timeout=5) == 0
+    assert child.wait(timeout=5) == -9
+    assert not pid_file.exists()
+    assert not daemon.supervisor_pid_file(pid_file).exists()
+
+
+@patch("pydownloader.daemon.prepare_session", return_value=0)
+@patch("pydownloader.daemon.wait_until_ready", side_effect=[0.05, TimeoutError("not ready")])
+def test_start_stops_started_daemons_on_failure(mock_wait, mock_prepare, mock_config, tmp_path):
+    """
+    Tests that a daemon failing to start stops the ones already started and writes no PID file.
+    """
+    mock_config.set("settings", "instances", "2")
+    ready = subprocess.Popen(["sleep", "60"])
+    launchers = [MagicMock(pid=12344, returncode=0), MagicMock(pid=12345, returncode=-15)]
+    for launcher in launchers:
+        launcher.poll.return_value = 0
+    pid_file = tmp_path / "daemon.pid"
+
+    with patch("subprocess.Popen", side_effect=launchers):
+        with patch("pydownloader.daemon.find_listener_pid", side_effect=[ready.pid, None]):
+            with pytest.raises(TimeoutError):
+                daemon.start(mock_config, pid_file)
+
+    assert ready.wait(timeout=5) == -15
+    assert not pid_file.exists()
+
+
+@patch("pydownloader.daemon.prepare_session", return_value=0)
+@patch("pydownloader.daemon.find_listener_pid", return_value=None)
+@patch("pydownloader.daemon.wait_until_ready", return_value=0.05)
+@patch("subprocess.Popen")
+def test_start_needs_daemon_pid(mock_popen, mock_wait, mock_find_pid, mock_prepare, mock_config, tmp_path):
+    """
+    Tests that start never records the PID of a launcher that has already exited.
+    """
+    mock_popen.return_value = MagicMock(pid=12344, returncode=0)
+    mock_popen.return_value.poll.return_value = 0
+    pid_file = tmp_path / "daemon.pid"
+
+    with pytest.raises(RuntimeError, match="port 6800"):
+        daemon.start(mock_config, pid_file)
+    assert not pid_file.exists()
+
+
+@patch("subprocess.Popen")
+def test_start_refuses_when_running(mock_popen, mock_config, tmp_path):
+    """
+    Tests that start does not spawn a second set of daemons.
+    """
+    pid_file = tmp_path / "daemon.pid"
+    daemon.write_pid_file(pid_file, [os.getpid()])
+    with patch("pydownloader.daemon.pid_alive", return_value=True):
+        with pytest.raises(RuntimeError, match="already running"):
+            daemon.start(mock_config, pid_file)
+    mock_popen.assert_not_called()
+
+
+def test_pid_lock_serializes_starts(tmp_path):
+    """
+    Tests that the PID file lock is held across processes until released.
+    """
+    import sys
+
+    pid_file = tmp_path / "daemon.pid"
+    script = (
+        "import sys; from pathlib import Path; from pydownloader import daemon\n"
+        "with daemon.pid_lock(Path(sys.argv[1])): print('locked', flush=True)"
+    )
+    with daemon.pid_lock(pid_file):
+        other = subprocess.Popen([sys.executable, "-c", script, str(pid_file)], stdout=subprocess.PIPE, text=True)
+        with pytest.raises(subprocess.TimeoutExpired):
+            other.communicate(timeout=0.3)
+    assert other.communicate(timeout=5)[0] == "locked\n"
+
+
+EXT4_HOST = daemon.HostFacts(fs_type="ext4", available_memory=8 * 1024 ** 3, cpus=4, nameservers=True)
+
+
+def test_tune_profile(mock_config):
+    """
+    Tests that the profile follows the config and the host facts.
+    """
+    mock_config.set("settings", "connections", "8")
+    profile = daemon.tune(mock_config, EXT4_HOST)
+    assert profile["max-connection-per-server"].value == "8"
+    assert profile["split"].value == "8"
+    assert profile["max-concurrent-downloads"].value == "8"
+    assert profile["disk-cache"].value == "128M"
+    assert profile["file-allocation"].value == "falloc"
+    assert profile["async-dns"].value == "true"
+
+    small = daemon.HostFacts(fs_type="vfat", available_memory=0, cpus=1, nameservers=False)
+    mock_config.set("settings", "instances", "2")
+    profile = daemon.tune(mock_config, small)
+    assert profile["max-concurrent-downloads"].value == "5"
+    assert profile["disk-cache"].value == "16M"
+    assert profile["file-allocation"].value == "none"
+    assert profile["async-dns"].value == "false"
+
+
+def test_tune_overrides(mock_config):
+    """
+    Tests that [aria2] overrides tuned values but not the options pydownloader sets.
+    """
+    mock_config.read_string("[aria2]\ndisk-cache = 32M\nlowest-speed-limit = 10K\n")
+    profile = daemon.tune(mock_config, EXT4_HOST)
+    assert profile["disk-cache"] == daemon.TunedOption("32M", "set in [aria2]")
+    command = daemon.build_command(mock_config, profile=profile)
+    assert "--disk-cache=32M" in command
+    assert "--lowest-speed-limit=10K" in command
+    assert "--split=16" in command
+
+    mock_config.set("aria2", "rpc-listen-port", "7000")
+    with pytest.raises(ValueError, match="rpc-listen-port"):
+        daemon.tune(mock_config, EXT4_HOST)
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/mounts"), reason="needs Linux /proc")
+def test_filesystem_type_of_missing_folder(tmp_path):
+    """
+    Tests that a download folder that does not exist yet uses its parent's mount.
+    """
+    assert daemon.filesystem_type(str(tmp_path / "not" / "yet")) == daemon.filesystem_type(str(tmp_path))
+    assert daemon.filesystem_type("/") != ""
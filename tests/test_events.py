@@ -0,0 +1,178 @@
+import json
+import logging
+from unittest.mock import MagicMock
+
+import websocket
+from pydownloader import events, rpc
+from pydownloader.events import Event
+
+
+def notification(method, gid):
+    return json.dumps({"jsonrpc": "2.0", "method": method, "params": [{"gid": gid}]})
+
+
+class FakeSocket:
+    """A WebSocket that replays messages, then drops the connection."""
+
+    def __init__(self, messages, on_close=None):
+        self.messages = list(messages)
+        self.on_close = on_close
+
+    def recv(self):
+        if not self.messages:
+            raise websocket.WebSocketConnectionClosedException("closed")
+        message = self.messages.pop(0)
+        if isinstance(message, Exception):
+            raise message
+        return message
+
+    def close(self):
+        if self.on_close:
+            self.on_close()
+
+
+def test_bus_dispatches_by_type():
+    """
+    Tests that subscribers receive only their event type, or all with ALL.
+    """
+    bus = events.EventBus()
+    complete, everything = [], []
+    bus.subscribe(events.DOWNLOAD_COMPLETE, complete.append)
+    bus.subscribe(events.ALL, everything.append)
+
+    bus.publish(Event(events.DOWNLOAD_START, "a"))
+    bus.publish(Event(events.DOWNLOAD_COMPLETE, "a"))
+
+    assert complete == [Event(events.DOWNLOAD_COMPLETE, "a")]
+    assert len(everything) == 2
+
+
+def test_bus_isolates_failing_subscriber():
+    """
+    Tests that an exception in one subscriber does not block the others.
+    """
+    bus = events.EventBus()
+    received = []
+    bus.subscribe(events.ALL, MagicMock(side_effect=RuntimeError("boom")))
+    bus.subscribe(events.ALL, received.append)
+    bus.publish(Event(events.DOWNLOAD_ERROR, "a"))
+    assert received == [Event(events.DOWNLOAD_ERROR, "a")]
+
+
+def test_listener_publishes_notifications():
+    """
+    Tests that WebSocket notifications are published without any polling.
+    """
+    bus = events.EventBus()
+    received = []
+    bus.subscribe(events.ALL, received.append)
+    client = MagicMock()
+    listener = events.NotificationListener("ws://x/jsonrpc", bus, client=client)
+
+    listener.handle_message(notification(events.DOWNLOAD_START, "a"))
+    listener.handle_message(json.dumps({"id": 1, "result": "OK"}))
+    listener.handle_message(notification(events.DOWNLOAD_COMPLETE, "a"))
+
+    assert received == [Event(events.DOWNLOAD_START, "a"), Event(events.DOWNLOAD_COMPLETE, "a")]
+    assert listener.statuses == {"a": "complete"}
+    client.tell_active.assert_not_called()
+
+
+def test_listener_recovers_missed_events_after_reconnect(fake_aria2, fake_settings):
+    """
+    Tests that changes made while disconnected are published after reconnecting.
+    """
+    aria2 = fake_aria2.aria2
+    first = aria2.add("http://example.com/1", status="active")
+    second = aria2.add("http://example.com/2", status="waiting")
+    bus = events.EventBus()
+    received = []
+    bus.subscribe(events.ALL, received.append)
+
+    def finish_while_disconnected():
+        aria2.downloads[first]["status"] = "complete"
+        aria2.downloads[second]["status"] = "active"
+
+    sockets = [
+        FakeSocket([notification(events.DOWNLOAD_START, first)], on_close=finish_while_disconnected),
+        FakeSocket([]),
+    ]
+
+    def connect(url, timeout):
+        if not sockets:
+            listener._stopped.set()
+            raise ConnectionRefusedError()
+        return sockets.pop(0)
+
+    listener = events.NotificationListener(
+        "ws://x/jsonrpc", bus, client=rpc.connect(fake_settings), connect=connect
+    )
+    listener.run()
+
+    assert received == [
+        Event(events.DOWNLOAD_START, first),
+        Event(events.DOWNLOAD_START, second, synthetic=True),
+        Event(events.DOWNLOAD_COMPLETE, first, synthetic=True),
+    ]
+
+
+def test_iter_downloads_pages(fake_aria2, fake_settings):
+    """
+    Tests that waiting and stopped downloads are fetched in windows.
+    """
+    for i in range(25):
+        fake_aria2.aria2.add(f"http://example.com/{i}", status="waiting" if i % 2 else "complete")
+    downloads = list(events.iter_downloads(rpc.connect(fake_settings), ["gid"], window=4))
+    assert len(downloads) == 25
+    assert set(downloads[0]) == {"gid"}
+
+
+def test_log_events(caplog):
+    """
+    Tests that the logging subscriber records completions and failures.
+    """
+    bus = events.EventBus()
+    events.log_events(bus)
+    with caplog.at_level(logging.INFO):
+        bus.publish(Event(events.DOWNLOAD_COMPLETE, "a"))
+        bus.publish(Event(events.DOWNLOAD_ERROR, "b"))
+    assert "Download finished: a" in caplog.text
+    assert "Download failed: b" in caplog.text
+
+
+def test_listener_survives_bad_messages_and_failed_polls(caplog):
+    """
+    Tests that malformed notifications and a failing reconnect poll are logged without stopping the listener.
+    """
+    from aria2p import ClientException
+
+    bus = events.EventBus()
+    received = []
+    bus.subscribe(events.ALL, received.append)
+    client = MagicMock()
+    client.tell_active.side_effect = [ClientException(1, "busy"), []]
+    client.tell_waiting.return_value = client.tell_stopped.return_value = []
+    sockets = [
+        FakeSocket([]),
+        FakeSocket(
+            [
+                "{not json",
+                json.dumps({"method": events.DOWNLOAD_START, "params": [{}]}),
+                notification(events.DOWNLOAD_COMPLETE, "a"),
+            ]
+        ),
+    ]
+
+    def connect(url, timeout):
+        if not sockets:
+            listener._stopped.set()
+            raise ConnectionRefusedError()
+        return sockets.pop(0)
+
+    listener = events.NotificationListener("ws://x/jsonrpc", bus, client=client, connect=connect, max_backoff=0.01)
+    with caplog.at_level(logging.WARNING, logger="pydownloader.events"):
+        listener.run()
+
+    assert received == [Event(events.DOWNLOAD_COMPLETE, "a")]
+    assert "Could not poll" in caplog.text
+    assert caplog.text.count("Ignoring malformed notification") == 2
@@ -0,0 +1,165 @@
+from configparser import ConfigParser
+from unittest.mock import patch
+
+import pytest
+from typer.testing import CliRunner
+
+from pydownloader import cli, controller, fleet
+from pydownloader.config import parse_settings
+from tests.fake_aria2 import FakeAria2Server
+
+runner = CliRunner()
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def nodes():
+    """Runs three fake aria2c servers standing in for remote nodes."""
+    servers = [FakeAria2Server(secret="secret_token").start() for _ in range(3)]
+    yield servers
+    for server in servers:
+        server.stop()
+
+
+def fleet_settings(servers, extra=("", "", "")):
+    config = ConfigParser()
+    config.read_dict(
+        {
+            "settings": {
+                "dest_folder": "/downloads",
+                "connections": "8",
+                "max_download_speed": "0",
+                "rpc_port": "6800",
+                "rpc_secret": "secret_token",
+            },
+            "schedules": {},
+            "nodes": {
+                f"node{i}": f"127.0.0.1:{server.port} {fields}".strip()
+                for i, (server, fields) in enumerate(zip(servers, extra))
+            },
+        }
+    )
+    return parse_settings(config)
+
+
+def test_parse_node():
+    """
+    Tests that a node entry is parsed with defaults and optional fields.
+    """
+    node = fleet.parse_node("nas", "nas.lan secret=abc bandwidth=10M disk=1G", "default")
+    assert node == fleet.Node("nas", "http://nas.lan:6800", "abc", 10 * MB, 1024 * MB)
+    assert fleet.parse_node("vps", "https://vps:7000", "tok").secret == "tok"
+    assert fleet.ws_url(fleet.parse_node("vps", "https://vps:7000")) == "wss://vps:7000/jsonrpc"
+
+
+@pytest.mark.parametrize("value", ["", "ftp://host:6800", "host:port", "host colour=red"])
+def test_parse_node_invalid(value):
+    """
+    Tests that malformed node entries raise a ValueError.
+    """
+    with pytest.raises(ValueError):
+        fleet.parse_node("bad", value)
+
+
+def test_invalid_node_is_a_config_error(nodes):
+    """
+    Tests that a bad [nodes] entry is reported with its name.
+    """
+    with pytest.raises(ValueError, match="'node1' in section 'nodes'"):
+        fleet_settings(nodes, extra=("", "speed=fast", ""))
+
+
+def test_placement_prefers_spare_bandwidth(nodes):
+    """
+    Tests that adds go to the node with the most spare bandwidth and spread out.
+    """
+    busy = nodes[0].aria2.add("http://x/busy", status="active")
+    nodes[0].aria2.downloads[busy]["downloadSpeed"] = str(9 * MB)
+    settings = fleet_settings(nodes, extra=("bandwidth=10M", "bandwidth=10M", "bandwidth=4M"))
+    pool = fleet.connect(settings)
+
+    pool.add_uri(["http://example.com/1"])
+    assert [len(server.aria2.downloads) for server in nodes] == [1, 1, 0]
+
+    # The burst is spread by local accounting instead of piling onto node1
+    for i in range(2, 5):
+        pool.add_uri([f"http://example.com/{i}"])
+    assert [len(server.aria2.downloads) for server in nodes] == [1, 3, 1]
+
+
+def test_placement_skips_full_disk_and_down_nodes(nodes):
+    """
+    Tests that unhealthy nodes and nodes without disk to spare get no downloads.
+    """
+    nodes[0].aria2.add("http://x/big", total=2 * MB)
+    settings = fleet_settings(nodes, extra=("bandwidth=10M disk=1M", "bandwidth=1M", "bandwidth=10M"))
+    nodes[2].stop()
+    pool = fleet.connect(settings)
+
+    pool.add_uri(["http://example.com/1"])
+
+    assert len(nodes[1].aria2.downloads) == 1
+    assert [s.healthy for s in pool.stats] == [True, True, False]
+    assert pool.stats[0].spare_disk == -MB
+
+
+def test_no_healthy_node(nodes):
+    """
+    Tests that placement fails cleanly when every node is down.
+    """
+    settings = fleet_settings(nodes)
+    for server in nodes:
+        server.stop()
+    with pytest.raises(ValueError, match="No healthy node"):
+        fleet.connect(settings).add_uri(["http://example.com/1"])
+
+
+def test_resample_after_interval(nodes):
+    """
+    Tests that nodes are sampled again once the sample is older than the interval.
+    """
+    now = [0.0]
+    pool = fleet.Fleet(
+        list(fleet_settings(nodes).nodes),
+        fleet.connect(fleet_settings(nodes)).clients,
+        sample_interval=10,
+        clock=lambda: now[0],
+    )
+    pool.add_uri(["http://example.com/1"])
+    calls = [server.aria2.calls for server in nodes]
+    pool.add_uri(["http://example.com/2"])
+    assert sum(server.aria2.calls for server in nodes) == sum(calls) + 1
+    now[0] = 10
+    pool.add_uri(["http://example.com/3"])
+    assert sum(server.aria2.calls for server in nodes) > sum(calls) + 2
+
+
+def test_fleet_list_merges_healthy_nodes(nodes):
+    """
+    Tests that the fleet-wide listing covers every reachable node.
+    """
+    for i, server in enumerate(nodes):
+        server.aria2.add(f"http://example.com/from-{i}", status="active")
+    settings = fleet_settings(nodes)
+    nodes[1].stop()
+    pool = fleet.connect(settings)
+    group = controller.ControllerGroup(pool.healthy())
+    downloads = controller.run(group.list_downloads())
+    assert [d["files"][0]["uris"][0]["uri"] for d in downloads] == [
+        "http://example.com/from-0",
+        "http://example.com/from-2",
+    ]
+
+
+def test_status_fleet_command(nodes):
+    """
+    Tests that `status --fleet` reports each node and fails if one is down.
+    """
+    settings = fleet_settings(nodes, extra=("bandwidth=10M", "", ""))
+    nodes[2].stop()
+    with patch("pydownloader.config.load_settings", return_value=settings):
+        result = runner.invoke(cli.app, ["status", "--fleet"])
+    assert result.exit_code == 1
+    assert "node0: up" in result.output and "10.0 MiB/s spare" in result.output
+    assert "node2: DOWN" in result.output
+    assert "2 of 3 nodes healthy." in result.output
@@ -0,0 +1,178 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from pydownloader import events, history, rpc
+
+
+def _stopped(fake, count, status="complete"):
+    return [fake.aria2.add(f"http://example.com/{i}", status=status, total=10, completed=10) for i in range(count)]
+
+
+def test_store_round_trip(tmp_path):
+    """
+    Tests that archived downloads read back as status dicts, numbered in archive order.
+    """
+    download = {
+        "gid": "0123456789abcdef",
+        "status": "error",
+        "totalLength": "100",
+        "completedLength": "40",
+        "errorCode": "3",
+        "files": [{"path": "/downloads/a", "uris": [{"uri": "http://a/1"}, {"uri": "http://b/1"}]}],
+    }
+    with history.HistoryStore(tmp_path / "history.sqlite3") as store:
+        store.add([download, dict(download, gid="fedcba9876543210", status="complete")])
+        # Archiving again replaces the earlier record
+        store.add([download])
+
+        rows = [row for page in store.iter_rows(5, statuses={"error"}) for row in page]
+
+        assert store.count() == 2
+    assert [row for row, _ in rows] == [6]
+    restored = rows[0][1]
+    assert restored["gid"] == download["gid"]
+    assert restored["errorCode"] == "3"
+    assert [uri["uri"] for uri in restored["files"][0]["uris"]] == ["http://a/1", "http://b/1"]
+
+
+def test_purge_keeps_newest_results(fake_aria2, fake_settings, tmp_path):
+    """
+    Tests that a purge pass archives the oldest results beyond `keep` and removes them from aria2c.
+    """
+    gids = _stopped(fake_aria2, 5)
+    waiting = fake_aria2.aria2.add("http://example.com/waiting")
+    store = history.HistoryStore(tmp_path / "history.sqlite3")
+    purger = history.Purger(rpc.connect(fake_settings), store, history.PurgePolicy(keep=2), batch_size=2)
+
+    assert purger.run_once() == 3
+    assert purger.run_once() == 0
+
+    assert list(fake_aria2.aria2.downloads) == gids[3:] + [waiting]
+    assert [d["gid"] for page in store.iter_rows() for _, d in page] == gids[:3]
+
+
+def test_purge_by_age(fake_aria2, fake_settings, tmp_path):
+    """
+    Tests that results are archived once they have been seen stopped for longer than the maximum age.
+    """
+    first = _stopped(fake_aria2, 1)
+    clock = MagicMock(return_value=1000.0)
+    store = history.HistoryStore(tmp_path / "history.sqlite3")
+    purger = history.Purger(rpc.connect(fake_settings), store, history.PurgePolicy(keep=10, max_age=60), clock=clock)
+
+    assert purger.run_once() == 0
+    second = _stopped(fake_aria2, 1)
+    clock.return_value = 1060.0
+
+    assert purger.run_once() == 1
+    assert list(fake_aria2.aria2.downloads) == second
+    assert store.count() == 1 and first[0] not in fake_aria2.aria2.downloads
+
+
+def test_archive_on_complete(fake_aria2, fake_settings, tmp_path):
+    """
+    Tests that stopped downloads are collected from events and archived together with their duration.
+    """
+    gids = _stopped(fake_aria2, 2, status="error")
+    clock = MagicMock(return_value=100.0)
+    store = history.HistoryStore(tmp_path / "history.sqlite3")
+    policy = history.PurgePolicy(on_complete=True)
+    purger = history.Purger(rpc.connect(fake_settings), store, policy, batch_size=2, clock=clock)
+
+    purger.on_event(events.Event(events.DOWNLOAD_START, gids[0]))
+    clock.return_value = 110.0
+    purger.on_event(events.Event(events.DOWNLOAD_ERROR, gids[0]))
+    assert set(gids) <= set(fake_aria2.aria2.downloads)
+    # The second stop fills the batch, which is archived at once
+    purger.on_event(events.Event(events.DOWNLOAD_ERROR, gids[1], synthetic=True))
+
+    assert not set(gids) & set(fake_aria2.aria2.downloads)
+    entries = {entry.gid: entry for entry in store.search()}
+    assert entries[gids[0]].duration == 10.0 and entries[gids[0]].speed == 1.0
+    assert entries[gids[1]].duration is None
+    assert purger.flush() == 0
+
+
+def _entry(gid, host, status, size, finished, duration=None):
+    return (
+        {
+            "gid": gid,
+            "status": status,
+            "totalLength": str(size),
+            "completedLength": str(size if status == "complete" else 0),
+            "files": [{"path": f"/downloads/{gid}", "uris": [{"uri": f"http://{host}/{gid}"}]}],
+        },
+        (finished - duration if duration else None, finished),
+    )
+
+
+def _fill(store):
+    entries = [
+        _entry("a", "one.example", "complete", 1000, 100.0, duration=10.0),
+        _entry("b", "one.example", "error", 50, 200.0),
+        _entry("c", "two.example", "complete", 3000, 300.0, duration=1.0),
+        _entry("d", "one.example", "complete", 500, 400.0, duration=5.0),
+    ]
+    store.add([download for download, _ in entries], 500.0, {d["gid"]: t for d, t in entries})
+
+
+def test_search_filters(tmp_path):
+    """
+    Tests that history searches filter by time, host, status and size, newest first.
+    """
+    with history.HistoryStore(tmp_path / "history.sqlite3") as store:
+        _fill(store)
+
+        assert [e.gid for e in store.search()] == ["d", "c", "b", "a"]
+        assert [e.gid for e in store.search(limit=1)] == ["d"]
+        assert [e.gid for e in store.search(history.HistoryQuery(since=150.0, until=400.0))] == ["c", "b"]
+        assert [e.gid for e in store.search(history.HistoryQuery(hosts=("one.example",)))] == ["d", "b", "a"]
+        assert [e.gid for e in store.search(history.HistoryQuery(statuses=("error",)))] == ["b"]
+        assert [e.gid for e in store.search(history.HistoryQuery(min_size=500, max_size=1000))] == ["d", "a"]
+        entry = store.search(history.HistoryQuery(hosts=("two.example",)))[0]
+        assert entry.uris == ("http://two.example/c",) and entry.path == "/downloads/c"
+        assert entry.duration == 1.0 and entry.speed == 3000.0
+
+
+def test_host_stats(tmp_path):
+    """
+    Tests that per-host aggregates give the failure rate and the throughput of timed downloads.
+    """
+    with history.HistoryStore(tmp_path / "history.sqlite3") as store:
+        _fill(store)
+
+        stats = {s.host: s for s in store.host_stats()}
+        since = {s.host: s for s in store.host_stats(history.HistoryQuery(since=150.0))}
+
+    assert stats["one.example"].downloads == 3
+    assert stats["one.example"].failure_rate == 1 / 3
+    assert stats["one.example"].throughput == 1500 / 15.0
+    assert stats["two.example"].failure_rate == 0.0
+    assert since["one.example"].downloads == 2
+
+
+def test_store_rejects_newer_schema(tmp_path):
+    """
+    Tests that a store written by a newer version is refused with a ValueError.
+    """
+    import sqlite3
+
+    path = tmp_path / "history.sqlite3"
+    db = sqlite3.connect(str(path))
+    db.execute(f"PRAGMA user_version = {history.SCHEMA_VERSION + 1}")
+    db.close()
+
+    with pytest.raises(ValueError, match="newer version"):
+        history.HistoryStore(path)
+
+
+def test_parse_time():
+    """
+    Tests that times are read as ISO dates or as ages.
+    """
+    assert history.parse_time("7d", now=1_000_000.0) == 1_000_000.0 - 7 * 86400
+    assert history.parse_time("90M", now=10_000.0) == 10_000.0 - 5400
+    assert history.parse_time("2026-10-01") < history.parse_time("2026-10-01 08:30")
+    with pytest.raises(ValueError, match="Invalid time"):
+        history.parse_time("yesterday")
@@ -0,0 +1,198 @@
+from configparser import ConfigParser
+from unittest.mock import patch
+
+from typer.testing import CliRunner
+
+from pydownloader import bulk, cli, controller, daemon, pool
+from pydownloader.utils import parse_speed
+
+runner = CliRunner()
+
+
+def test_hash_ring_is_stable_and_spreads_hosts():
+    """
+    Tests that a host always maps to the same node and that hosts use all nodes.
+    """
+    ring = pool.HashRing(4)
+    hosts = [f"mirror{i}.example.com" for i in range(200)]
+    nodes = [ring.node_for(host) for host in hosts]
+    assert nodes == [pool.HashRing(4).node_for(host) for host in hosts]
+    assert set(nodes) == {0, 1, 2, 3}
+
+
+def test_split_limit():
+    """
+    Tests that a limit is split evenly, adds up, and never becomes unlimited.
+    """
+    assert pool.split_limit(0, 2) == [0, 0]
+    assert pool.split_limit(4096, 2) == [2048, 2048]
+    assert pool.split_limit(4097, 3) == [1365, 1365, 1367]
+    assert pool.split_limit(1024, 2) == [1024, 1024]
+
+
+def test_build_command_per_instance():
+    """
+    Tests that instances get consecutive ports and separate directories.
+    """
+    config = ConfigParser()
+    config.read_dict({"settings": {"dest_folder": "/dl", "rpc_port": "6800", "instances": "2"}})
+    command = daemon.build_command(config, 1)
+    assert "--rpc-listen-port=6801" in command
+    assert "--dir=/dl/instance-1" in command
+
+
+def test_host_sharding_keeps_a_host_on_one_instance(group_settings, fake_group):
+    """
+    Tests that every URL of a host is added to the same instance.
+    """
+    client = pool.connect(group_settings)
+    for i in range(5):
+        client.add_uri([f"http://a.example.com/{i}"])
+        client.add_uri([f"http://b.example.org/{i}"])
+    counts = sorted(len(server.aria2.downloads) for server in fake_group)
+    assert sum(counts) == 10
+    assert counts in ([0, 10], [5, 5])
+    assert len(client.owners) == 10
+
+
+def test_load_sharding_balances(group_settings, fake_group):
+    """
+    Tests that least-loaded sharding fills the emptier instance first.
+    """
+    for i in range(3):
+        fake_group[0].aria2.add(f"http://x/{i}")
+    client = pool.DaemonPool(pool.connect(group_settings).clients, shard_by="load")
+    report = bulk.add_urls(client, ((i, f"http://same.host/{i}") for i in range(5)), batch_size=2, max_in_flight=1)
+    assert report.added == 5
+    assert [len(server.aria2.downloads) for server in fake_group] == [4, 4]
+
+
+def test_speed_limit_split_evenly(group_settings, fake_group):
+    """
+    Tests that a global limit is divided evenly, even when one instance is idle.
+    """
+    for i in range(3):
+        fake_group[0].aria2.add(f"http://x/{i}", status="active")
+
+    pool.connect(group_settings).change_global_option({pool.SPEED_LIMIT: "4M"})
+
+    limits = [parse_speed(server.aria2.options[pool.SPEED_LIMIT]) for server in fake_group]
+    assert limits == [2 * 1024 * 1024, 2 * 1024 * 1024]
+
+
+def test_session_id_changes_when_any_instance_restarts(group_settings, fake_group):
+    """
+    Tests that the group session ID covers every instance.
+    """
+    client = pool.connect(group_settings)
+    before = client.get_session_info()["sessionId"]
+    fake_group[1].aria2.session_id = "1" * 40
+    assert client.get_session_info()["sessionId"] != before
+
+
+def test_merged_rows_number_across_instances(group_settings, fake_group):
+    """
+    Tests that rows list active, waiting and stopped downloads of all instances.
+    """
+    a = fake_group[0].aria2
+    b = fake_group[1].aria2
+    a.add("http://a/active", status="active")
+    a.add("http://a/waiting")
+    b.add("http://b/active", status="active")
+    b.add("http://b/done", status="complete", completed=1000)
+    group = controller.ControllerGroup(pool.connect(group_settings))
+
+    async def collect(**kwargs):
+        return [(row, d["files"][0]["uris"][0]["uri"]) async for rows in group.iter_rows(**kwargs) for row, d in rows]
+
+    assert controller.run(collect()) == [
+        (1, "http://a/active"),
+        (2, "http://b/active"),
+        (3, "http://a/waiting"),
+        (4, "http://b/done"),
+    ]
+    assert controller.run(collect(offset=1, limit=2)) == [(2, "http://b/active"), (3, "http://a/waiting")]
+    assert [d["gid"] for d in controller.run(group.list_downloads())] == [
+        a.order[0],
+        b.order[0],
+        a.order[1],
+        b.order[1],
+    ]
+
+
+def test_group_remove_and_move_reach_the_owner(group_settings, fake_group):
+    """
+    Tests that remove and move are sent to the instance holding the download.
+    """
+    a = fake_group[0].aria2
+    b = fake_group[1].aria2
+    a.add("http://a/0")
+    first = b.add("http://b/0")
+    second = b.add("http://b/1")
+    group = controller.ControllerGroup(pool.connect(group_settings))
+    controller.run(group.list_downloads())
+
+    # Position 0 of the merged waiting queue belongs to instance 0; clamp to b's part
+    assert controller.run(group.move(second, 0)) == 1
+    assert b.order == [second, first]
+
+    controller.run(group.remove({"gid": first, "status": "waiting"}))
+    assert b.downloads[first]["status"] == "removed"
+    assert a.downloads[a.order[0]]["status"] == "waiting"
+
+
+def test_multicall_routes_by_gid(group_settings, fake_group):
+    """
+    Tests that a multicall is split per owner and unknown GIDs fail alone.
+    """
+    b = fake_group[1].aria2
+    gid = b.add("http://b/0", status="active")
+    b.downloads[gid]["downloadSpeed"] = "100"
+    client = pool.connect(group_settings)
+    client.owners[gid] = 1
+
+    status, unknown, stat = client.multicall2(
+        [("aria2.tellStatus", [gid, ["status"]]), ("aria2.tellStatus", ["ffff", ["status"]]), ("aria2.getGlobalStat", [])]
+    )
+    assert status == [{"status": "active"}]
+    assert bulk.fault_message(unknown)
+    assert stat[0]["numActive"] == "1"
+    assert stat[0]["downloadSpeed"] == "100"
+
+
+def test_list_command_shows_merged_queue(group_settings, fake_group):
+    """
+    Tests that `list` shows the downloads of every instance.
+    """
+    fake_group[0].aria2.add("http://a.example.com/first")
+    fake_group[1].aria2.add("http://b.example.com/second")
+    with patch("pydownloader.config.load_settings", return_value=group_settings):
+        result = runner.invoke(cli.app, ["list"])
+    assert result.exit_code == 0
+    assert "first" in result.output and "second" in result.output
+
+
+def test_remove_command_uses_snapshot_owner(group_settings, fake_group):
+    """
+    Tests that a row from `list` is removed on its instance in a new process.
+    """
+    fake_group[0].aria2.add("http://a.example.com/first")
+    second = fake_group[1].aria2.add("http://b.example.com/second")
+    with patch("pydownloader.config.load_settings", return_value=group_settings):
+        assert runner.invoke(cli.app, ["list"]).exit_code == 0
+        # Each command builds a new pool, which only knows GIDs from the snapshot
+        result = runner.invoke(cli.app, ["remove", "2"])
+    assert result.exit_code == 0
+    assert fake_group[1].aria2.downloads[second]["status"] == "removed"
+
+
+def test_group_status(tmp_path):
+    """
+    Tests that the status of a group reports partially running daemons.
+    """
+    pid_file = tmp_path / "pids"
+    pid_file.write_text("111\n222")
+    alive = {111: True, 222: False}
+    with patch("pydownloader.daemon.pid_alive", side_effect=lambda pid, *args: alive[pid]):
+        assert daemon.get_group_status(pid_file) == [(111, True), (222, False)]
+        assert daemon.get_status(pid_file) == ("Degraded", 111)
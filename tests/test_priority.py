@@ -0,0 +1,96 @@
+import os
+import subprocess
+from unittest.mock import patch
+
+import pytest
+from pydownloader import priority
+from pydownloader.priority import ProcessPriority
+
+needs_proc = pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="needs Linux /proc")
+
+
+@pytest.fixture
+def sleeper():
+    """A child process to apply priorities to."""
+    process = subprocess.Popen(["sleep", "60"])
+    yield process.pid
+    process.kill()
+    process.wait()
+
+
+def _nice(pid):
+    stat = open(f"/proc/{pid}/stat", "rb").read()
+    # Field 19 of /proc/<pid>/stat, counting from the one after the command name
+    return int(stat[stat.rfind(b")") + 2 :].split()[16])
+
+
+def test_parse_priority():
+    """
+    Tests that priority settings are validated and normalised.
+    """
+    parsed = priority.parse_priority(
+        {"nice": "10", "io_class": "Best-Effort:7", "cpu_affinity": "0-2,5", "cgroup": "dl", "io_max": "wbps=1M,rbps=max"}
+    )
+    assert parsed == ProcessPriority(
+        nice=10, io_class="best-effort:7", cpu_affinity=(0, 1, 2, 5), cgroup="dl", io_max="wbps=1048576 rbps=max"
+    )
+    assert priority.parse_io_class("idle") == (3, 0)
+    assert priority.parse_priority({"nice": " "}, parsed) == parsed
+
+
+@pytest.mark.parametrize(
+    "values",
+    [{"nice": "20"}, {"io_class": "lazy"}, {"io_class": "idle:9"}, {"cpu_affinity": "3-1"}, {"io_max": "bps=1M"}],
+)
+def test_parse_priority_invalid(values):
+    """
+    Tests that malformed priority settings raise a ValueError.
+    """
+    with pytest.raises(ValueError):
+        priority.parse_priority(values)
+
+
+@needs_proc
+def test_apply_to_process(sleeper):
+    """
+    Tests that nice level, I/O class and CPU affinity are visible in /proc.
+    """
+    cpu = min(os.sched_getaffinity(0))
+    limits = ProcessPriority(nice=5, io_class="idle", cpu_affinity=(cpu,))
+
+    assert priority.apply(sleeper, limits) == []
+
+    assert _nice(sleeper) == 5
+    assert os.sched_getaffinity(sleeper) == {cpu}
+    assert priority.get_io_priority(sleeper) == (priority.IO_CLASSES["idle"], 0)
+
+
+@needs_proc
+def test_apply_reports_failures(sleeper):
+    """
+    Tests that a control that cannot be applied is reported, not raised.
+    """
+    with patch("os.setpriority", side_effect=PermissionError("not permitted")):
+        failures = priority.apply(sleeper, ProcessPriority(nice=-5, cpu_affinity=tuple(os.sched_getaffinity(0))))
+    assert failures == ["nice: not permitted"]
+
+
+def test_apply_places_in_cgroup(tmp_path, sleeper):
+    """
+    Tests that the cgroup is created with its limits and the process moved into it.
+    """
+    cgroup = tmp_path / "pydownloader"
+    limits = ProcessPriority(cgroup=str(cgroup), memory_max="536870912", io_max="wbps=1048576")
+    with patch("pydownloader.priority.block_device", return_value="8:0"):
+        assert priority.apply(sleeper, limits) == []
+    assert (cgroup / "memory.max").read_text() == "536870912\n"
+    assert (cgroup / "io.max").read_text() == "8:0 wbps=1048576\n"
+    assert (cgroup / "cgroup.procs").read_text() == f"{sleeper}\n"
+
+
+def test_with_neutral():
+    """
+    Tests that settings changed by a window are reset outside of it.
+    """
+    base = ProcessPriority(nice=5)
+    assert priority.with_neutral(base, {"nice", "io_class"}) == ProcessPriority(nice=5, io_class="none")
@@ -0,0 +1,100 @@
+import random
+
+import pytest
+
+from pydownloader import reorder, rpc
+
+
+def _apply(queue, moves):
+    queue = list(queue)
+    for gid, position in moves:
+        queue.remove(gid)
+        queue.insert(position, gid)
+    return queue
+
+
+def test_longest_increasing_subsequence():
+    """
+    Tests that a longest strictly increasing subsequence is found.
+    """
+    values = [3, 1, 4, 1, 5, 9, 2, 6]
+
+    indices = reorder.longest_increasing_subsequence(values)
+
+    assert len(indices) == 4
+    assert indices == sorted(indices)
+    assert all(values[a] < values[b] for a, b in zip(indices, indices[1:]))
+    assert reorder.longest_increasing_subsequence([]) == []
+
+
+def test_plan_moves_is_minimal():
+    """
+    Tests that the planned moves produce the target order and move only downloads outside the LIS.
+    """
+    rng = random.Random(7)
+    for size in (0, 1, 2, 10, 200):
+        current = [f"{i:016x}" for i in range(size)]
+        target = current[:]
+        rng.shuffle(target)
+        rank = {gid: i for i, gid in enumerate(target)}
+
+        moves = reorder.plan_moves(current, target)
+
+        assert _apply(current, moves) == target
+        kept = len(reorder.longest_increasing_subsequence([rank[g] for g in current]))
+        assert len(moves) == size - kept
+
+    # Partial orders move chains of downloads behind the same kept one
+    for trial in range(50):
+        current = [f"{i:016x}" for i in range(30)]
+        target = reorder.target_order(current, rng.sample(current, rng.randint(1, 10)))
+        assert _apply(current, reorder.plan_moves(current, target)) == target
+
+
+def test_target_order():
+    """
+    Tests that listed GIDs lead the queue and unknown or repeated ones are ignored.
+    """
+    assert reorder.target_order(["a", "b", "c", "d"], ["c", "x", "a", "c"]) == ["c", "a", "b", "d"]
+
+
+def test_reorder_by_size(fake_aria2, fake_settings):
+    """
+    Tests that sorting by size reorders the fake daemon's queue in batched requests.
+    """
+    fake_aria2.aria2.add("http://example.com/active", status="active")
+    sizes = [60, 10, 50, 20, 40, 30]
+    gids = {fake_aria2.aria2.add(f"http://example.com/{size}", total=size): size for size in sizes}
+
+    report = reorder.reorder(rpc.connect(fake_settings), by="size", batch_size=2)
+
+    waiting = [g for g in fake_aria2.aria2.order if fake_aria2.aria2.downloads[g]["status"] == "waiting"]
+    assert [gids[g] for g in waiting] == sorted(sizes)
+    assert report.failures == []
+    assert report.items == 6
+    assert report.moves == 3
+    assert report.requests == 3
+    assert report.saved == 4
+
+
+def test_reorder_first_dry_run(fake_aria2, fake_settings):
+    """
+    Tests that a dry run counts the moves for a partial GID order without sending them.
+    """
+    gids = [fake_aria2.aria2.add(f"http://example.com/{i}") for i in range(5)]
+    before = list(fake_aria2.aria2.order)
+
+    report = reorder.reorder(rpc.connect(fake_settings), first=[gids[4], gids[3]], dry_run=True)
+
+    assert fake_aria2.aria2.order == before
+    assert report.moves == 2
+    # One tellWaiting, plus the multicall the moves would need
+    assert report.requests == 2
+
+
+def test_reorder_unknown_key(fake_aria2, fake_settings):
+    """
+    Tests that an unknown sort key is rejected.
+    """
+    with pytest.raises(ValueError, match="Unknown sort key"):
+        reorder.reorder(rpc.connect(fake_settings), by="name")
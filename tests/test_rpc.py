@@ -0,0 +1,64 @@
+from unittest.mock import MagicMock
+
+import pytest
+from pydownloader import rpc
+from tests.fake_aria2 import FakeAria2Server
+
+
+def test_pooled_client_reuses_connection(fake_aria2, fake_settings):
+    """
+    Tests that consecutive calls share one keep-alive connection.
+    """
+    client = rpc.connect(fake_settings)
+    for _ in range(20):
+        assert client.get_version()["version"] == "1.37.0"
+    assert fake_aria2.connections == 1
+
+
+def test_unpooled_client_opens_connection_per_call(fake_aria2, fake_settings):
+    """
+    Tests the baseline: the plain aria2p client connects for every call.
+    """
+    client = rpc.connect(fake_settings, pooled=False)
+    for _ in range(5):
+        client.get_version()
+    assert fake_aria2.connections == 5
+
+
+def test_pool_reconnects_after_restart(fake_settings, fake_aria2):
+    """
+    Tests that a daemon restart is survived by reconnecting transparently.
+    """
+    client = rpc.connect(fake_settings)
+    client.get_version()
+    port = fake_aria2.port
+    fake_aria2.stop()
+
+    restarted = FakeAria2Server(secret="secret_token", port=port).start()
+    try:
+        assert client.get_session_info()["sessionId"]
+        assert restarted.connections == 1
+    finally:
+        restarted.stop()
+
+
+def test_pool_reports_unreachable_daemon():
+    """
+    Tests that a closed port raises an RPCConnectionError (an OSError).
+    """
+    pool = rpc.ConnectionPool("http://127.0.0.1:1/jsonrpc", timeout=1)
+    with pytest.raises(rpc.RPCConnectionError):
+        pool.post(b"{}")
+    assert issubclass(rpc.RPCConnectionError, OSError)
+
+
+def test_pool_limits_idle_connections():
+    """
+    Tests that connections beyond the pool size are closed on release.
+    """
+    pool = rpc.ConnectionPool("http://127.0.0.1:6800/jsonrpc", size=1)
+    first, second = MagicMock(), MagicMock()
+    pool._release(first)
+    pool._release(second)
+    second.close.assert_called_once()
+    assert pool._acquire() == (first, True)
@@ -0,0 +1,53 @@
+import pytest
+from pydownloader import controller, rpc, snapshot
+from pydownloader.snapshot import RowSnapshot, StaleSnapshotError
+
+
+def test_snapshot_roundtrip():
+    """
+    Tests that a saved snapshot resolves the rows it was given, and only those.
+    """
+    shown = RowSnapshot("http://localhost:6800", "abc", active=1)
+    shown.add(1, {"gid": "0000000000000001", "status": "active"})
+    shown.add(7, {"gid": "0000000000000007", "status": "paused"}, owner=2)
+    snapshot.save(shown)
+
+    loaded = snapshot.load("http://localhost:6800")
+    assert len(loaded) == 2
+    assert (loaded.session, loaded.active) == ("abc", 1)
+    assert loaded.lookup(7) == ("0000000000000007", "paused", 2)
+    assert loaded.lookup(2) is None
+    assert snapshot.load("http://localhost:6801") is None
+
+
+def test_revalidate_only_queries_shown_rows(fake_aria2, fake_settings):
+    """
+    Tests that resolving rows costs one tellStatus per row, whatever the queue size.
+    """
+    gids = [fake_aria2.aria2.add(f"http://example.com/{i}") for i in range(50)]
+    client = rpc.connect(fake_settings)
+    shown = RowSnapshot(str(client.server), fake_aria2.aria2.session_id, active=0)
+    for row, gid in enumerate(gids, 1):
+        shown.add(row, {"gid": gid, "status": "waiting"})
+    ctl = controller.AsyncController(client)
+
+    calls = fake_aria2.aria2.calls
+    current = controller.run(snapshot.revalidate(ctl, shown, [3, 40]))
+    assert fake_aria2.aria2.calls - calls == 2
+    assert current[40] == {"gid": gids[39], "status": "waiting"}
+
+    del fake_aria2.aria2.downloads[gids[2]]
+    with pytest.raises(StaleSnapshotError, match="Row 3"):
+        controller.run(snapshot.revalidate(ctl, shown, [3]))
+
+
+def test_check_session(fake_aria2, fake_settings):
+    """
+    Tests that a snapshot taken before a restart is reported as stale.
+    """
+    client = rpc.connect(fake_settings)
+    shown = RowSnapshot(str(client.server), fake_aria2.aria2.session_id, active=0)
+    snapshot.check_session(shown, client)
+    fake_aria2.aria2.session_id = "1" * 40
+    with pytest.raises(StaleSnapshotError, match="restarted"):
+        snapshot.check_session(shown, client)
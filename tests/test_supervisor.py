@@ -0,0 +1,128 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from configparser import ConfigParser
+from pathlib import Path
+
+import pytest
+
+from pydownloader import daemon, supervisor
+
+ROOT = Path(__file__).resolve().parents[1]
+# A stand-in for aria2c: serves the fake RPC on a port, then exits with a status
+FAKE_DAEMON = """
+import sys, time
+from tests.fake_aria2 import FakeAria2Server
+FakeAria2Server(secret="secret_token", port=int(sys.argv[1])).start()
+time.sleep(float(sys.argv[2]))
+sys.exit(int(sys.argv[3]))
+"""
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = ConfigParser()
+    config.read_dict(
+        {
+            "settings": {
+                "dest_folder": str(tmp_path),
+                "rpc_port": str(free_port()),
+                "rpc_secret": "secret_token",
+                "session_dir": str(tmp_path),
+            }
+        }
+    )
+    return config
+
+
+def fake_spawner(config, lifetime, status=1):
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    port = config.getint("settings", "rpc_port")
+
+    def spawn(index):
+        return subprocess.Popen(
+            [sys.executable, "-c", FAKE_DAEMON, str(port + index), str(lifetime), str(status)], env=env
+        )
+
+    return spawn
+
+
+def test_crash_loop_backs_off_and_restores(config, tmp_path):
+    """
+    Tests that a crashing daemon is restarted with growing delays and restored.
+    """
+    delays, restored = [], []
+    pid_file = tmp_path / "daemon.pid"
+    watchdog = supervisor.Supervisor(
+        config,
+        pid_file,
+        on_restart=restored.append,
+        min_backoff=0.01,
+        spawn=fake_spawner(config, lifetime=0.1),
+        sleep=delays.append,
+    )
+
+    watchdog.run(max_restarts=3)
+
+    assert delays == [0.01, 0.02, 0.04]
+    assert restored == [0, 0, 0]
+    assert watchdog.restarts == 3
+    assert not pid_file.exists()
+    assert not daemon.supervisor_pid_file(pid_file).exists()
+
+
+def test_stable_daemon_resets_backoff(config, tmp_path):
+    """
+    Tests that a daemon that ran long enough is restarted after the minimum delay.
+    """
+    delays = []
+    watchdog = supervisor.Supervisor(
+        config,
+        tmp_path / "daemon.pid",
+        min_backoff=0.01,
+        stable_after=0.0,
+        spawn=fake_spawner(config, lifetime=0.1),
+        sleep=delays.append,
+    )
+    watchdog.run(max_restarts=3)
+    assert delays == [0.01, 0.01, 0.01]
+
+
+def test_terminate_stops_without_restart(config, tmp_path):
+    """
+    Tests that a stopped supervisor terminates its daemons and does not restart them.
+    """
+    pid_file = tmp_path / "daemon.pid"
+    watchdog = supervisor.Supervisor(config, pid_file, spawn=fake_spawner(config, lifetime=60))
+    thread = threading.Thread(target=watchdog.run)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not pid_file.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pid = daemon.read_pids(pid_file)[0]
+    assert daemon.read_pids(daemon.supervisor_pid_file(pid_file)) == [os.getpid()]
+
+    watchdog.terminate()
+    thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert watchdog.restarts == 0
+    assert not os.path.exists(f"/proc/{pid}")
+
+
+def test_foreground_command(config):
+    """
+    Tests that supervised daemons stay in the foreground.
+    """
+    command = daemon.build_command(config, foreground=True)
+    assert "--daemon=false" in command
+    assert "--daemon=true" not in command
@@ -0,0 +1,59 @@
+import gzip
+import io
+import lzma
+
+import pytest
+from pydownloader import utils
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("0", 0), ("500K", 512000), ("2M", 2097152), ("1g", 1073741824), ("1234", 1234)],
+)
+def test_parse_speed(value, expected):
+    """
+    Tests that aria2c-style speeds are converted to bytes per second.
+    """
+    assert utils.parse_speed(value) == expected
+
+
+@pytest.mark.parametrize("value", ["", "fast", "2.5M", "-1K"])
+def test_parse_speed_invalid(value):
+    """
+    Tests that invalid speeds raise a ValueError.
+    """
+    with pytest.raises(ValueError):
+        utils.parse_speed(value)
+
+
+def test_format_speed_round_trip():
+    """
+    Tests that formatted speeds parse back to the same value.
+    """
+    for speed in (0, 1000, 512000, 2097152):
+        assert utils.parse_speed(utils.format_speed(speed)) == speed
+    assert utils.format_speed(2097152) == "2M"
+
+
+LIST_CONTENT = "http://a.example/1\n\n# comment\nhttp://b.example/2\n"
+
+
+@pytest.mark.parametrize("opener", [open, gzip.open, lzma.open])
+def test_iter_url_list(tmp_path, opener):
+    """
+    Tests that plain, gzip and xz lists are streamed with their line numbers.
+    """
+    path = tmp_path / "urls.txt"
+    with opener(path, "wt") as f:
+        f.write(LIST_CONTENT)
+
+    assert list(utils.iter_url_list(path)) == [(1, "http://a.example/1"), (4, "http://b.example/2")]
+
+
+def test_iter_url_list_stdin(monkeypatch):
+    """
+    Tests that "-" reads the list from standard input.
+    """
+    stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(LIST_CONTENT.encode())))
+    monkeypatch.setattr("sys.stdin", stdin)
+    assert [url for _, url in utils.iter_url_list("-")] == ["http://a.example/1", "http://b.example/2"]
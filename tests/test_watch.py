@@ -0,0 +1,92 @@
+from unittest.mock import MagicMock, patch
+
+from pydownloader import events, rpc, watch
+
+
+def _model(fake_aria2, fake_settings, count=3):
+    gids = [fake_aria2.aria2.add(f"http://example.com/{i}", status="active") for i in range(count)]
+    rows = [(i + 1, dict(fake_aria2.aria2.downloads[gid])) for i, gid in enumerate(gids)]
+    return gids, watch.WatchModel(rpc.connect(fake_settings), rows)
+
+
+def test_poll_is_one_request_regardless_of_queue_size(fake_aria2, fake_settings):
+    """
+    Tests that a refresh costs one multicall for the visible rows only.
+    """
+    gids, model = _model(fake_aria2, fake_settings)
+    for i in range(1000):
+        fake_aria2.aria2.add(f"http://example.com/queued/{i}")
+    connections_before = fake_aria2.connections
+    calls_before = fake_aria2.aria2.calls
+
+    model.poll()
+
+    # Three tellStatus calls and one getGlobalStat, inside a single request
+    assert fake_aria2.aria2.calls - calls_before == 4
+    assert fake_aria2.connections - connections_before <= 1
+    assert model.global_stat["numWaiting"] == "1000"
+
+
+def test_poll_reports_only_changed_rows(fake_aria2, fake_settings):
+    """
+    Tests that only rows whose values changed are invalidated.
+    """
+    gids, model = _model(fake_aria2, fake_settings)
+    model.poll()
+    cached = model.cells(gids[0])
+
+    fake_aria2.aria2.downloads[gids[1]]["completedLength"] = "500"
+    fake_aria2.aria2.downloads[gids[2]]["status"] = "complete"
+
+    assert model.poll() == {gids[1], gids[2]}
+    assert model.cells(gids[0]) is cached
+    assert model.cells(gids[1])[1] == "50%"
+    assert model.cells(gids[2])[0] == "✅"
+
+
+def test_poll_marks_purged_rows_removed(fake_aria2, fake_settings):
+    """
+    Tests that a row whose download disappeared is shown as removed.
+    """
+    gids, model = _model(fake_aria2, fake_settings, count=1)
+    fake_aria2.aria2.downloads[gids[0]]["status"] = "complete"
+    fake_aria2.aria2.rpc_purgeDownloadResult()
+    assert model.poll() == {gids[0]}
+    assert model.downloads[gids[0]]["status"] == "removed"
+
+
+def test_watch_rerenders_only_on_change():
+    """
+    Tests that the live display is only updated when something changed.
+    """
+    model = MagicMock()
+    model.global_stat = {}
+    model.poll.side_effect = [set(), set(), {"a"}]
+    with patch("rich.live.Live") as live:
+        watch.watch(model, refresh=0, iterations=2, sleep=lambda _: None)
+    assert live.return_value.__enter__.return_value.update.call_count == 1
+
+
+def test_subscribed_poll_fetches_active_rows(fake_aria2, fake_settings):
+    """
+    Tests that with notifications, statuses come from events and only active rows are refetched.
+    """
+    gids, model = _model(fake_aria2, fake_settings)
+    bus = events.EventBus()
+    model.subscribe(bus)
+    model.poll()
+
+    fake_aria2.aria2.downloads[gids[0]]["status"] = "complete"
+    bus.publish(events.Event(events.DOWNLOAD_COMPLETE, gids[0]))
+    calls_before = fake_aria2.aria2.calls
+
+    assert gids[0] in model.poll()
+    assert model.cells(gids[0])[0] == "✅"
+    # Two active rows and getGlobalStat
+    assert fake_aria2.aria2.calls - calls_before == 3
+
+    # Unnotified changes are still picked up by the periodic full refresh
+    fake_aria2.aria2.downloads[gids[0]]["completedLength"] = "500"
+    for _ in range(watch.FULL_POLL_EVERY - 2):
+        assert gids[0] not in model.poll()
+    assert gids[0] in model.poll()